@@ -0,0 +1,342 @@
+import os
+import sys
+import copy
+import time
+import django
+
+# --- Standard Django setup ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, 'scheduler'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scheduler.settings')
+django.setup()
+
+from ortools.sat.python import cp_model
+from scheduler.core.models import Team
+from scheduler.core.auto_scheduler import (
+    load_problem,
+    build_model,
+    build_time_model,
+    assign_rooms,
+    precheck,
+    _build_phase,
+    _precompute_blocked,
+    _quality_terms,
+    _solve_model,
+)
+
+# Seeded by create_test_users.py from real_data.py
+TEAM_NAME = "SI Leaders Spring 2026"
+
+
+def build_model_scan(problem, partial):
+    """
+    The original model builder, kept here as the "before" reference: every
+    constraint re-scans days × starts × rooms × workers × roles and checks
+    `key in shifts`.
+    """
+    model  = cp_model.CpModel()
+    shifts = {}
+    target_days = problem.target_days
+    start_times = problem.start_times
+    rooms       = list(problem.rooms.items())
+    duration    = problem.duration
+
+    blocked = precompute_blocked_sets(problem)
+
+    for d in target_days:
+        for t in start_times:
+            for rm_id, _ in rooms:
+                room_open = any(
+                    s <= t and t + duration <= e
+                    for s, e in problem.room_windows.get((rm_id, d), [])
+                )
+                if not room_open:
+                    continue
+                for w_id, r_ids in problem.worker_roles.items():
+                    if (w_id, d, t) in blocked:
+                        continue
+                    for r_id in r_ids:
+                        shifts[(d, t, rm_id, w_id, r_id)] = model.NewBoolVar(
+                            f"shift_{d}_{t}_{rm_id}_{w_id}_{r_id}"
+                        )
+
+    for w_id, r_ids in problem.worker_roles.items():
+        for r_id in r_ids:
+            shift_sum = sum(
+                shifts[(d, t, rm_id, w_id, r_id)]
+                for d in target_days
+                for t in start_times
+                for rm_id, _ in rooms
+                if (d, t, rm_id, w_id, r_id) in shifts
+            )
+            if partial:
+                model.Add(shift_sum <= problem.weekly_quota)
+            else:
+                model.Add(shift_sum == problem.weekly_quota)
+        for d in target_days:
+            model.Add(
+                sum(
+                    shifts[(d, t, rm_id, w_id, r_id)]
+                    for t in start_times
+                    for rm_id, _ in rooms
+                    for r_id in r_ids
+                    if (d, t, rm_id, w_id, r_id) in shifts
+                ) <= problem.daily_max
+            )
+
+    for d in target_days:
+        for i, t in enumerate(start_times):
+            window = problem.overlap_starts(i)
+            for w_id, r_ids in problem.worker_roles.items():
+                active = [
+                    shifts[(d, pt, rm_id, w_id, r_id)]
+                    for pt in window
+                    for rm_id, _ in rooms
+                    for r_id in r_ids
+                    if (d, pt, rm_id, w_id, r_id) in shifts
+                ]
+                if active:
+                    model.Add(sum(active) <= 1)
+            for rm_id, capacity in rooms:
+                active = [
+                    shifts[(d, pt, rm_id, w_id, r_id)]
+                    for pt in window
+                    for w_id, r_ids in problem.worker_roles.items()
+                    for r_id in r_ids
+                    if (d, pt, rm_id, w_id, r_id) in shifts
+                ]
+                if active:
+                    model.Add(sum(active) <= capacity)
+            for r_id, w_ids in problem.role_workers.items():
+                active = [
+                    shifts[(d, pt, rm_id, w_id, r_id)]
+                    for pt in window
+                    for rm_id, _ in rooms
+                    for w_id in w_ids
+                    if (d, pt, rm_id, w_id, r_id) in shifts
+                ]
+                if active:
+                    model.Add(sum(active) <= problem.max_concurrent)
+
+    quality_terms = [
+        shifts[(d, t, rm_id, w_id, r_id)] * problem.scores[(d, t, w_id, r_id)]
+        for d in target_days
+        for t in start_times
+        for rm_id, _ in rooms
+        for w_id, r_ids in problem.worker_roles.items()
+        for r_id in r_ids
+        if (d, t, rm_id, w_id, r_id) in shifts
+    ]
+    if partial:
+        volume_weight = max(problem.scores.values()) + 1
+        model.Maximize(sum(shifts[k] * volume_weight for k in shifts) + sum(quality_terms))
+    else:
+        model.Maximize(sum(quality_terms))
+
+    return model, shifts
+
+
+def precompute_blocked_sets(problem):
+    """
+    The original blocked-slot precompute, kept as the "before" reference:
+    Python loops over every busy range × start time and every obstruction
+    × start × role worker, filling a set of (worker, day, start).
+    """
+    blocked = set()
+    for (w_id, day), busies in problem.busy.items():
+        if day not in problem.target_days:
+            continue
+        for b_start, b_end in busies:
+            for t in problem.start_times:
+                if t < b_end and (t + problem.duration) > b_start:
+                    blocked.add((w_id, day, t))
+
+    for r_id, obs_days, b_start, b_end in problem.obstructions:
+        for d in obs_days:
+            if d not in problem.target_days:
+                continue
+            for t in problem.start_times:
+                if t < b_end and (t + problem.duration) > b_start:
+                    for w_id in problem.role_workers.get(r_id, []):
+                        blocked.add((w_id, d, t))
+    return blocked
+
+
+def scaled_problem(problem, copies):
+    """
+    `problem` with every worker (and their busy ranges, preferences and
+    role memberships) repeated `copies` times under fresh ids.
+    """
+    big = copy.copy(problem)
+    big.worker_roles, big.busy, big.preferred = {}, {}, {}
+    big.role_workers = {r_id: [] for r_id in problem.role_workers}
+    offset = max(problem.worker_roles) + 1
+    for n in range(copies):
+        for w_id, r_ids in problem.worker_roles.items():
+            new_id = w_id + n * offset
+            big.worker_roles[new_id] = list(r_ids)
+            for r_id in r_ids:
+                big.role_workers[r_id].append(new_id)
+        for (w_id, day), ranges in problem.busy.items():
+            big.busy[(w_id + n * offset, day)] = ranges
+    return big
+
+
+def measure_precompute(problem):
+    t0 = time.perf_counter()
+    precompute_blocked_sets(problem)
+    before = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    _precompute_blocked(problem)
+    after = time.perf_counter() - t0
+    print(
+        f"  {len(problem.worker_roles):>5} workers, {sum(map(len, problem.busy.values())):>6} busy ranges:"
+        f"  sets {before * 1000:8.1f} ms   arrays {after * 1000:7.1f} ms"
+    )
+
+
+def measure(label, builder, problem, partial):
+    t0 = time.perf_counter()
+    model, shifts = builder(problem, partial)
+    elapsed = time.perf_counter() - t0
+    proto = model.Proto()
+    print(
+        f"  {label:<8} build {elapsed * 1000:8.1f} ms   "
+        f"vars {len(proto.variables):>6}   constraints {len(proto.constraints):>6}"
+    )
+    return elapsed
+
+
+def first_feasible(label, problem, builder, timeout=60.0):
+    """
+    Builds a strict model and solves it to the first feasible solution,
+    running stage 2 (room assignment) when the model has no room dimension.
+    """
+    t0 = time.perf_counter()
+    model, variables = builder(problem, False)
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = timeout
+    solver.parameters.stop_after_first_solution = True
+    status = solver.Solve(model)
+
+    placed = None
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        chosen = [key for key, var in variables.items() if solver.Value(var) == 1]
+        if builder is build_time_model:
+            rooms = assign_rooms(problem, chosen)
+            placed = len(rooms) if rooms is not None else None
+        else:
+            placed = len(chosen)
+
+    elapsed = time.perf_counter() - t0
+    print(
+        f"  {label:<10} vars {len(model.Proto().variables):>6}   "
+        f"{solver.StatusName(status):<10} shifts {placed}   wall {elapsed:6.2f} s"
+    )
+
+
+def per_room(problem):
+    """
+    `problem` with every room in a class of its own, i.e. the model before
+    interchangeable rooms were pooled.
+    """
+    split = copy.copy(problem)
+    split.room_classes = {rm_id: [rm_id] for rm_id in problem.rooms}
+    split.room_class   = {rm_id: rm_id for rm_id in problem.rooms}
+    return split
+
+
+def solve_best(label, problem, builder, timeout=60.0):
+    """
+    Builds a strict model and solves it as far as `timeout` allows.
+    """
+    t0 = time.perf_counter()
+    model, _ = builder(problem, False)
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = timeout
+    status = solver.Solve(model)
+    elapsed = time.perf_counter() - t0
+    objective = solver.ObjectiveValue() if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+    print(
+        f"  {label:<10} vars {len(model.Proto().variables):>6}   "
+        f"{solver.StatusName(status):<10} objective {objective}   wall {elapsed:6.2f} s"
+    )
+
+
+def partial_objectives(problem, timeout=60.0):
+    """
+    Phase 3 on `problem` with each partial objective, same total budget:
+    one weighted objective, and sessions-then-quality in two solves.
+    """
+    caps = {i["user_id"]: i["available"] for i in precheck(problem) if i["kind"] == "worker"}
+    for objective in ("weighted", "lexicographic"):
+        variant = copy.copy(problem)
+        variant.quota_caps = caps
+        variant.partial_objective = objective
+
+        phase = _build_phase(variant, partial=True, two_stage=False)
+        phase_log = []
+        _, solver = _solve_model(variant, phase, timeout, objective, phase_log)
+        obj_vars, obj_coeffs = _quality_terms(variant, phase.variables)
+        sessions = sum(solver.Value(var) for var in obj_vars)
+        quality  = sum(c * solver.Value(var) for var, c in zip(obj_vars, obj_coeffs))
+        steps = "   ".join(
+            f"{entry['status']} {entry['solve_seconds']:.2f} s" for entry in phase_log
+        )
+        print(f"  {objective:<14} sessions {sessions}   quality {quality:>6}   {steps}")
+
+
+def run_benchmark():
+    team = Team.objects.filter(name=TEAM_NAME).first()
+    if team is None:
+        print(f"Team '{TEAM_NAME}' not found. Run create_test_users.py first.")
+        return
+
+    t0 = time.perf_counter()
+    problem = load_problem(team)
+    print(f"load_problem: {(time.perf_counter() - t0) * 1000:.1f} ms "
+          f"({len(problem.worker_roles)} workers, {len(problem.rooms)} rooms, "
+          f"{len(problem.start_times)} start times)")
+
+    print("\nBlocked-slot precompute:")
+    for copies in (1, 10):
+        measure_precompute(scaled_problem(problem, copies))
+
+    for partial in (False, True):
+        print(f"\n{'Partial' if partial else 'Strict'} model:")
+        before = measure("before", build_model_scan, problem, partial)
+        after  = measure("after", build_model, problem, partial)
+        print(f"  speedup  {before / after:.1f}x")
+
+    print(f"\nStrict solve to first feasible ({len(problem.rooms)} rooms):")
+    first_feasible("single", problem, build_model)
+    first_feasible("two-stage", problem, build_time_model)
+
+    interval_problem = copy.copy(problem)
+    interval_problem.backend = "interval"
+    print("\nLinear windows vs interval variables (strict model):")
+    measure("linear", build_model, problem, False)
+    measure("interval", build_model, interval_problem, False)
+    first_feasible("linear", problem, build_model)
+    first_feasible("interval", interval_problem, build_model)
+    first_feasible("2s-linear", problem, build_time_model)
+    first_feasible("2s-interv", interval_problem, build_time_model)
+
+    split_problem = per_room(problem)
+    print(f"\nPer-room vs room classes ({len(problem.rooms)} rooms, "
+          f"{len(problem.room_classes)} classes, strict model):")
+    measure("rooms", build_model, split_problem, False)
+    measure("classes", build_model, problem, False)
+    first_feasible("rooms", split_problem, build_model)
+    first_feasible("classes", problem, build_model)
+    solve_best("rooms", split_problem, build_model)
+    solve_best("classes", problem, build_model)
+
+    long_config = {"duration": 120, "daily_max": 1, "max_concurrent": 1}
+    long_problem = load_problem(team, config=long_config)
+    print(f"\nPartial objective, {long_config} (strict infeasible):")
+    partial_objectives(long_problem)
+
+
+if __name__ == "__main__":
+    run_benchmark()
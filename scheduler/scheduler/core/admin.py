@@ -3,6 +3,7 @@ from .models import UnavailabilityRange, Team, Role, Shift, Room, RoomAvailabili
 from .models import ObstructionDay, FixedObstruction
 from .models import UserRolePreference, PreferredTime
 from .models import AttendeePreference, AttendeeResponseLink
+from .models import AutoScheduleJob, SolveRun, CachedSolution
 
 admin.site.register(UnavailabilityRange)
 admin.site.register(Team)
@@ -17,3 +18,15 @@ admin.site.register(UserRolePreference)
 admin.site.register(PreferredTime)
 admin.site.register(AttendeePreference)
 admin.site.register(AttendeeResponseLink)
+admin.site.register(AutoScheduleJob)
+admin.site.register(CachedSolution)
+
+
+@admin.register(SolveRun)
+class SolveRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "created_at", "team", "source", "status", "workers", "rooms",
+        "weekly_quota", "interval", "shortfall_count", "total_seconds",
+    )
+    list_filter = ("status", "source", "team")
+    date_hierarchy = "created_at"
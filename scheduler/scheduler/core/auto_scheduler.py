@@ -1,3 +1,19 @@
+import copy
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+import numpy as np
+from django.conf import settings
+from django.db import connection, connections
+from ortools.graph.python import max_flow
 from ortools.sat.python import cp_model
 from .models import (
     TeamRoleAssignment,
@@ -6,60 +22,273 @@ from .models import (
     Room,
     RoomAvailability,
     PreferredTime,
+    Shift,
 )
+from . import solution_cache
 
+logger = logging.getLogger(__name__)
 
-def generate_schedule(
-    team,
-    roles=None,
-    target_days=["sun", "mon", "tue", "wed", "thu", "fri"],
-    timeout=30.0,
-    config=None,
+DEFAULT_CONFIG = {
+    "duration": 50,
+    "interval": 30,
+    "weekly_quota": 3,
+    "daily_max": 1,
+    "max_concurrent": 1,
+    "two_stage": False,
+    "backend": "linear",
+    "race_phases": False,
+    "partial_objective": "weighted",
+    "greedy_only": False,
+    # seed CP-SAT with greedy_schedule() when there is no base schedule
+    "greedy_hint": True,
+    # solve on this coarser grid first, then refine near its solution
+    "coarse_interval": None,
+    "refine_radius": None,
+    # CP-SAT parameters; None = server default, capped in _new_solver()
+    "num_workers": None,
+    "random_seed": None,
+    "max_deterministic_time": None,
+    "log_search_progress": False,
+}
+
+# A built phase model: `extract(problem, solver, variables)` turns a solved
+# model into result dicts, or returns None if the solution can't be used.
+PhaseModel = namedtuple("PhaseModel", "model variables partial extract build_seconds")
+
+
+class SchedulingProblem:
+    """
+    Everything the model builder needs for one auto-schedule run, flattened
+    into plain Python data (ids, minute ranges, lookup dicts).
+
+    Built once by load_problem() and shared by every solve phase, so the
+    database is only queried up front and the blocked-slot / scoring work
+    is never repeated between phases.
+    """
+
+    def __init__(self, config, target_days):
+        self.duration       = config.get("duration", 50)
+        self.interval       = config.get("interval", 30)
+        self.weekly_quota   = config.get("weekly_quota", 3)
+        self.daily_max      = config.get("daily_max", 1)
+        self.max_concurrent = config.get("max_concurrent", 1)
+        # times first against pooled room capacity, rooms second
+        self.two_stage      = config.get("two_stage", False)
+        # "linear": sums over overlap windows; "interval": NoOverlap/Cumulative
+        self.backend        = config.get("backend", "linear")
+        # strict and partial solved at once in separate processes
+        self.race_phases    = config.get("race_phases", False)
+        # Phase 3 objective: "weighted" (sessions outweigh any score) or
+        # "lexicographic" (sessions, then quality; see _solve_model)
+        self.partial_objective = config.get("partial_objective", "weighted")
+        # greedy_schedule() instead of CP-SAT / as CP-SAT's starting point
+        self.greedy_only    = config.get("greedy_only", False)
+        self.greedy_hint    = config.get("greedy_hint", DEFAULT_CONFIG["greedy_hint"])
+        # coarse-to-fine (see _refine_from_coarse); radius in minutes,
+        # defaulting to one coarse step
+        self.coarse_interval = config.get("coarse_interval")
+        self.refine_radius   = config.get("refine_radius")
+
+        # CP-SAT parameters (see _new_solver)
+        self.num_workers            = config.get("num_workers")
+        self.random_seed            = config.get("random_seed")
+        self.max_deterministic_time = config.get("max_deterministic_time")
+        self.log_search_progress    = config.get("log_search_progress", False)
+
+        self.target_days = list(target_days)
+        # Filled by _precompute_grid() from room availability: sorted union
+        # of every day's candidate starts, and day → indexes into it
+        self.start_times = []
+        self.day_slots   = {}
+
+        # room_id → capacity, in query order
+        self.rooms = {}
+        # (room_id, day) → [(open_start, open_end), ...]
+        self.room_windows = {}
+
+        self.worker_roles  = {}
+        self.role_workers  = {}
+        self.user_name_map = {}
+        self.role_name_map = {}
+
+        # (user_id, day) → [(start, end), ...]
+        self.busy = {}
+        self.preferred = {}
+        # [(role_id, [day, ...], start, end), ...]
+        self.obstructions = []
+
+        # (day, start, room_id, user_id, role_id) keys taken from an existing
+        # schedule, used as solution hints when re-optimising
+        self.hints = set()
+        # True when the hints are a base schedule's shifts rather than a
+        # greedy or coarse solution; only then is presolve cut for them
+        self.warm_start = False
+
+        # user_id → most sessions (across all their roles) the pre-check
+        # found possible, for workers who can't reach the quota; set by
+        # solve_problem() so the strict solve can still run for everyone else
+        self.quota_caps = {}
+
+        # Derived by _precompute_blocked() / _precompute_room_classes() /
+        # _precompute_scores(). Array axes follow worker_ids / room_ids,
+        # target_days, start_times.
+        self.worker_ids   = []
+        self.room_ids     = []
+        self.blocked      = None   # bool (worker, day, slot): can't take it
+        self.room_blocked = None   # bool (room, day, slot): not open throughout
+        self.open_rooms   = {}     # (day, start) → [room_id] open throughout
+        self.room_classes = {}     # representative room_id → [room_id] open at the same slots
+        self.room_class   = {}     # room_id → its class representative
+        self.scores       = {}
+
+    def day_times(self, day):
+        """
+        Candidate start times on `day`, ascending.
+        """
+        return [self.start_times[i] for i in self.day_slots.get(day, ())]
+
+    def overlap_starts(self, index):
+        """
+        Start times whose shift is still running at start_times[index],
+        including start_times[index] itself.
+        """
+        t = self.start_times[index]
+        window = [t]
+        for j in range(index - 1, -1, -1):
+            prev_t = self.start_times[j]
+            if prev_t + self.duration > t:
+                window.append(prev_t)
+            else:
+                # start_times is sorted, so nothing earlier can overlap either
+                break
+        return window
+
+    def with_interval(self, interval):
+        """
+        A copy of this problem on a different start-time grid, with blocked
+        slots and scores recomputed for it.
+        """
+        regridded = copy.copy(self)
+        regridded.interval = interval
+        regridded.scores   = {}
+        _precompute_grid(regridded)
+        _precompute_blocked(regridded)
+        _precompute_room_classes(regridded)
+        _precompute_scores(regridded)
+        return regridded
+
+    def restrict(self, role_ids, room_ids):
+        """
+        A copy of this problem limited to the given roles (and the workers
+        assigned to them) and rooms. Used to solve independent components
+        separately; every derived lookup is filtered rather than recomputed.
+        """
+        role_ids = set(role_ids)
+        room_ids = set(room_ids)
+        worker_ids = {
+            w_id
+            for r_id in role_ids
+            for w_id in self.role_workers.get(r_id, [])
+        }
+
+        sub = copy.copy(self)
+        sub.worker_roles  = {w: [r for r in rs if r in role_ids] for w, rs in self.worker_roles.items() if w in worker_ids}
+        sub.role_workers  = {r: ws for r, ws in self.role_workers.items() if r in role_ids}
+        sub.user_name_map = {w: n for w, n in self.user_name_map.items() if w in worker_ids}
+        sub.role_name_map = {r: n for r, n in self.role_name_map.items() if r in role_ids}
+
+        sub.rooms        = {rm: cap for rm, cap in self.rooms.items() if rm in room_ids}
+        sub.room_windows = {k: v for k, v in self.room_windows.items() if k[0] in room_ids}
+
+        sub.busy         = {k: v for k, v in self.busy.items() if k[0] in worker_ids}
+        sub.preferred    = {k: v for k, v in self.preferred.items() if k[0] in worker_ids}
+        sub.obstructions = [o for o in self.obstructions if o[0] in role_ids]
+        sub.hints        = {k for k in self.hints if k[3] in worker_ids and k[4] in role_ids}
+
+        worker_rows = [i for i, w_id in enumerate(self.worker_ids) if w_id in worker_ids]
+        room_rows   = [i for i, rm_id in enumerate(self.room_ids) if rm_id in room_ids]
+        sub.worker_ids   = [self.worker_ids[i] for i in worker_rows]
+        sub.room_ids     = [self.room_ids[i] for i in room_rows]
+        sub.blocked      = self.blocked[worker_rows]
+        sub.room_blocked = self.room_blocked[room_rows]
+        sub.open_rooms   = _open_rooms(sub)
+        _precompute_room_classes(sub)
+        sub.scores = {k: v for k, v in self.scores.items() if k[2] in worker_ids and k[3] in role_ids}
+        return sub
+
+
+# ----------------------------------------------------------------------
+# DATA LOADING
+# ----------------------------------------------------------------------
+def load_problem(
+    team, roles=None, target_days=None, config=None, base_schedule_id=None, diagnostics=None
 ):
     """
-    Attempts to generate a full schedule. Falls back gracefully through three phases:
+    Fetches assignments, rooms, busy ranges, obstructions and preferences for
+    `team` and returns a SchedulingProblem with blocked slots and scores
+    already computed.
 
-    Phase 1 — Strict solve (original timeout):
-        Workers must meet exact weekly_quota. Fails fast if impossible.
+    If base_schedule_id is given, that schedule's shifts for the workers and
+    roles being scheduled are loaded as solution hints.
 
-    Phase 2 — Extended solve (2x timeout, strict constraints):
-        Only runs if Phase 1 timed out (UNKNOWN). Skipped for INFEASIBLE.
+    If a `diagnostics` dict is given, fetch / precompute timings, the fetch
+    query count and the problem size are recorded in it.
+    """
+    if diagnostics is None:
+        diagnostics = {}
 
-    Phase 3 — Partial solve (2x timeout, relaxed quota):
-        Runs if Phases 1+2 both failed. Quota becomes an upper bound instead of
-        a hard equality. The objective maximises total sessions scheduled first,
-        then quality. Returns a list of shortfalls describing what couldn't be filled.
+    started = time.perf_counter()
+    queries = _QueryCounter()
+    with connection.execute_wrapper(queries):
+        problem = _fetch_problem(team, roles, target_days, config, base_schedule_id)
+    diagnostics["fetch"] = {"seconds": time.perf_counter() - started, "queries": queries.count}
 
-    Returns:
-        tuple(list[dict], list[dict]):
-            - results:    scheduled shifts (same schema as before)
-            - shortfalls: empty list on full success; otherwise one entry per
-                          worker/role that was under-quota, e.g.:
-                          {"user_name": "Alice", "role_name": "CHEM 151",
-                           "assigned": 1, "quota": 3}
+    started = time.perf_counter()
+    _precompute_grid(problem)
+    _precompute_blocked(problem)
+    _precompute_room_classes(problem)
+    _precompute_scores(problem)
+    diagnostics["precompute"] = {"seconds": time.perf_counter() - started}
+
+    diagnostics["problem"] = {
+        "workers": len(problem.worker_roles),
+        "roles": len(problem.role_workers),
+        "rooms": len(problem.rooms),
+        "room_classes": len(problem.room_classes),
+        "days": len(problem.target_days),
+        "start_times": len(problem.start_times),
+        "blocked_fraction": float(problem.blocked.mean()) if problem.blocked.size else 0.0,
+        "hints": len(problem.hints),
+    }
+    return problem
+
+
+class _QueryCounter:
     """
+    connection.execute_wrapper() hook that counts queries, so fetch
+    diagnostics work without DEBUG's connection.queries.
+    """
+
+    def __init__(self):
+        self.count = 0
 
-    # ------------------------------------------------------------------
-    # 1. CONFIG
-    # ------------------------------------------------------------------
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _fetch_problem(team, roles, target_days, config, base_schedule_id):
+    """
+    The database half of load_problem(): a SchedulingProblem with its raw
+    data filled in and nothing derived yet.
+    """
+    if target_days is None:
+        target_days = ["sun", "mon", "tue", "wed", "thu", "fri"]
     if config is None:
-        config = {
-            "duration": 50,
-            "interval": 30,
-            "weekly_quota": 3,
-            "daily_max": 1,
-            "max_concurrent": 1,
-        }
+        config = DEFAULT_CONFIG
 
-    duration      = config.get("duration", 50)
-    interval      = config.get("interval", 30)
-    weekly_quota  = config.get("weekly_quota", 3)
-    daily_max     = config.get("daily_max", 1)
-    max_concurrent = config.get("max_concurrent", 1)
+    problem = SchedulingProblem(config, target_days)
 
-    # ------------------------------------------------------------------
-    # 2. FETCH DATA
-    # ------------------------------------------------------------------
     if roles is None:
         assignments = TeamRoleAssignment.objects.filter(team=team).select_related("role", "user")
     else:
@@ -71,385 +300,1761 @@ def generate_schedule(
             team=team, role__in=roles
         ).select_related("role", "user")
 
-    rooms       = list(Room.objects.filter(team=team))
-    start_times = list(range(480, 1050, interval))
-
-    worker_roles = {}
-    role_workers = {}
-    # Also keep a lookup: user_id → display name, role_id → role name (for shortfalls)
-    user_name_map = {}
-    role_name_map = {}
-
     for a in assignments:
         w_id = a.user.id
         r_id = a.role.id
-        worker_roles.setdefault(w_id, []).append(r_id)
-        role_workers.setdefault(r_id, []).append(w_id)
-        user_name_map[w_id] = a.user.get_full_name() or a.user.username
-        role_name_map[r_id] = a.role.name
-
-    worker_ids     = list(worker_roles.keys())
-    active_role_ids = list(role_workers.keys())
-
-    def time_to_mins(tm):
-        return tm.hour * 60 + tm.minute
-
-    # ------------------------------------------------------------------
-    # 3. PRE-INDEX LOOKUPS
-    # ------------------------------------------------------------------
-    room_avails   = RoomAvailability.objects.filter(room__in=rooms)
-    room_avail_map = {}
-    for ra in room_avails:
-        room_avail_map.setdefault((ra.room_id, ra.day), []).append(ra)
-
-    busy_times = UnavailabilityRange.objects.filter(team=team, user_id__in=worker_ids)
-    busy_map   = {}
-    for busy in busy_times:
-        busy_map.setdefault((busy.user_id, busy.day), []).append(busy)
+        problem.worker_roles.setdefault(w_id, []).append(r_id)
+        problem.role_workers.setdefault(r_id, []).append(w_id)
+        problem.user_name_map[w_id] = a.user.get_full_name() or a.user.username
+        problem.role_name_map[r_id] = a.role.name
+
+    worker_ids      = list(problem.worker_roles.keys())
+    active_role_ids = list(problem.role_workers.keys())
+
+    rooms = list(Room.objects.filter(team=team))
+    for rm in rooms:
+        problem.rooms[rm.id] = rm.capacity
+
+    # times are read from the integer minute columns, no per-row conversion
+    windows = RoomAvailability.objects.filter(room__in=rooms).values_list(
+        "room_id", "day", "start_min", "end_min"
+    )
+    for room_id, day, start, end in windows:
+        problem.room_windows.setdefault((room_id, day), []).append((start, end))
+
+    busy_ranges = UnavailabilityRange.objects.filter(team=team, user_id__in=worker_ids).values_list(
+        "user_id", "day", "start_min", "end_min"
+    )
+    for user_id, day, start, end in busy_ranges:
+        problem.busy.setdefault((user_id, day), []).append((start, end))
 
     fixed_obs = FixedObstruction.objects.filter(
         team=team, role_id__in=active_role_ids
     ).prefetch_related("days")
+    for obs in fixed_obs:
+        problem.obstructions.append((
+            obs.role_id,
+            [d.day for d in obs.days.all()],
+            obs.start_min,
+            obs.end_min,
+        ))
+
+    preferred = PreferredTime.objects.filter(team=team, user_id__in=worker_ids).values_list(
+        "user_id", "day", "start_min", "end_min"
+    )
+    for user_id, day, start, end in preferred:
+        problem.preferred.setdefault((user_id, day), []).append((start, end))
+
+    if base_schedule_id is not None:
+        base_shifts = Shift.objects.filter(
+            schedule_id=base_schedule_id,
+            user_id__in=worker_ids,
+            role_id__in=active_role_ids,
+        ).values_list("day", "start_min", "room_id", "user_id", "role_id")
+        problem.hints.update(base_shifts)
+        problem.warm_start = True
+
+    return problem
 
-    preferred_times = PreferredTime.objects.filter(team=team, user_id__in=worker_ids)
-    pref_map        = {}
-    for pref in preferred_times:
-        pref_map.setdefault((pref.user_id, pref.day), []).append(pref)
 
-    # ------------------------------------------------------------------
-    # 4. PRE-COMPUTE BLOCKED SLOTS
-    # ------------------------------------------------------------------
-    blocked = set()
+# ----------------------------------------------------------------------
+# PRE-COMPUTATION
+# ----------------------------------------------------------------------
+def _precompute_grid(problem):
+    """
+    Candidate start times per day, from the rooms' availability: one grid
+    per day, every `interval` from the day's earliest opening (so 8:00,
+    8:45, 9:30, ... for a day opening at 8:00 with 45), clipped to each open
+    window while the shift still fits in it. Anchoring at the day's opening
+    rather than at midnight keeps its first slot when the interval doesn't
+    divide the opening time; anchoring per day rather than per window keeps
+    windows that open at odd minutes from making the grid finer than
+    `interval` (a window opening between grid points starts at the next one).
+    problem.start_times is the sorted union over days, the slot axis of the
+    blocked arrays, and problem.day_slots maps each day to its own starts'
+    indexes in it.
+    """
+    interval = problem.interval
+    duration = problem.duration
+
+    day_windows = {d: [] for d in problem.target_days}
+    for (rm_id, day), windows in problem.room_windows.items():
+        if day in day_windows and rm_id in problem.rooms:
+            day_windows[day].extend(windows)
 
-    for (w_id, day), busies in busy_map.items():
-        if day not in target_days:
+    day_starts = {d: set() for d in problem.target_days}
+    for day, windows in day_windows.items():
+        if not windows:
             continue
-        for busy in busies:
-            b_start = time_to_mins(busy.start_time)
-            b_end   = time_to_mins(busy.end_time)
-            for t in start_times:
-                if t < b_end and (t + duration) > b_start:
-                    blocked.add((w_id, day, t))
+        anchor = min(open_start for open_start, _ in windows)
+        for open_start, open_end in windows:
+            first = anchor + -(-(open_start - anchor) // interval) * interval
+            day_starts[day].update(range(first, open_end - duration + 1, interval))
 
-    for obs in fixed_obs:
-        obs_days = [d.day for d in obs.days.all()]
-        b_start  = time_to_mins(obs.start_time)
-        b_end    = time_to_mins(obs.end_time)
-        r_id     = obs.role_id
+    problem.start_times = sorted(set().union(*day_starts.values()))
+    index = {t: i for i, t in enumerate(problem.start_times)}
+    problem.day_slots = {d: [index[t] for t in sorted(starts)] for d, starts in day_starts.items()}
+
+
+def _slot_masks(problem, ranges):
+    """
+    One row per (start, end) minute range: True for every start time whose
+    shift would overlap it.
+    """
+    starts = np.array(problem.start_times)
+    ranges = np.array(ranges, dtype=int).reshape(-1, 2)
+    return (
+        (starts[None, :] < ranges[:, 1:2])
+        & (starts[None, :] + problem.duration > ranges[:, 0:1])
+    )
+
+
+def _precompute_blocked(problem):
+    """
+    Fills problem.blocked (worker × day × slot the worker can't take),
+    problem.room_blocked (room × day × slot the room isn't open for the
+    whole shift) and problem.open_rooms.
+
+    Each busy range / obstruction / availability window becomes one row of
+    a vectorised slot mask, OR-ed into place with np.logical_or.at.
+    """
+    day_index = {d: i for i, d in enumerate(problem.target_days)}
+    problem.worker_ids = list(problem.worker_roles)
+    problem.room_ids   = list(problem.rooms)
+    worker_index = {w_id: i for i, w_id in enumerate(problem.worker_ids)}
+    room_index   = {rm_id: i for i, rm_id in enumerate(problem.room_ids)}
+    n_days  = len(problem.target_days)
+    n_slots = len(problem.start_times)
+
+    # Worker busy ranges and role obstructions → (worker row, day col, range)
+    rows, cols, ranges = [], [], []
+    for (w_id, day), busies in problem.busy.items():
+        if day not in day_index or w_id not in worker_index:
+            continue
+        for b_range in busies:
+            rows.append(worker_index[w_id])
+            cols.append(day_index[day])
+            ranges.append(b_range)
+    for r_id, obs_days, b_start, b_end in problem.obstructions:
         for d in obs_days:
-            if d not in target_days:
+            if d not in day_index:
                 continue
-            for t in start_times:
-                if t < b_end and (t + duration) > b_start:
-                    for w_id in role_workers.get(r_id, []):
-                        blocked.add((w_id, d, t))
+            for w_id in problem.role_workers.get(r_id, []):
+                rows.append(worker_index[w_id])
+                cols.append(day_index[d])
+                ranges.append((b_start, b_end))
+
+    problem.blocked = np.zeros((len(problem.worker_ids), n_days, n_slots), dtype=bool)
+    if ranges:
+        np.logical_or.at(problem.blocked, (rows, cols), _slot_masks(problem, ranges))
+
+    # Room windows → open where the whole shift fits inside one window
+    rows, cols, windows = [], [], []
+    for (rm_id, day), room_windows in problem.room_windows.items():
+        if day not in day_index or rm_id not in room_index:
+            continue
+        for window in room_windows:
+            rows.append(room_index[rm_id])
+            cols.append(day_index[day])
+            windows.append(window)
+
+    room_open = np.zeros((len(problem.room_ids), n_days, n_slots), dtype=bool)
+    if windows:
+        starts  = np.array(problem.start_times)
+        windows = np.array(windows, dtype=int)
+        fits = (
+            (starts[None, :] >= windows[:, 0:1])
+            & (starts[None, :] + problem.duration <= windows[:, 1:2])
+        )
+        np.logical_or.at(room_open, (rows, cols), fits)
+    # only a day's own starts: the union can hold starts another day's
+    # windows are anchored at
+    on_day = np.zeros((n_days, n_slots), dtype=bool)
+    for d_i, day in enumerate(problem.target_days):
+        on_day[d_i, problem.day_slots.get(day, [])] = True
+    room_open &= on_day[None, :, :]
+    problem.room_blocked = ~room_open
+
+    problem.open_rooms = _open_rooms(problem)
+
+
+def _open_rooms(problem):
+    """
+    (day, start) → [room_id, ...] open for the whole shift, read from
+    problem.room_blocked. Slots with no open room are left out.
+    """
+    open_rooms = {}
+    for rm_row, d_i, s_i in zip(*np.nonzero(~problem.room_blocked)):
+        key = (problem.target_days[d_i], problem.start_times[s_i])
+        open_rooms.setdefault(key, []).append(problem.room_ids[rm_row])
+    return open_rooms
+
+
+def _precompute_room_classes(problem):
+    """
+    Groups rooms that are open at exactly the same (day, slot)s into
+    classes. Any shift that fits one room of a class fits all of them, so
+    the model can treat a class as one room with their summed capacity, and
+    _assign_class_rooms() picks the concrete rooms afterwards. Capacities
+    within a class needn't match.
+    """
+    problem.room_classes = {}
+    problem.room_class   = {}
+    by_pattern = {}
+    for rm_row, rm_id in enumerate(problem.room_ids):
+        pattern = problem.room_blocked[rm_row].tobytes()
+        rep = by_pattern.setdefault(pattern, rm_id)
+        problem.room_classes.setdefault(rep, []).append(rm_id)
+        problem.room_class[rm_id] = rep
+
+
+def _precompute_scores(problem):
+    """
+    Quality score for every (day, start, worker, role): earlier is slightly
+    better, with bonuses next to lectures, next to the worker's other
+    on-campus commitments, and inside preferred times.
+    """
+    duration    = problem.duration
+    interval    = problem.interval
+    target_days = problem.target_days
+    scores      = problem.scores
 
-    room_blocked = set()
     for d in target_days:
-        for t in start_times:
-            shift_end  = t + duration
-            all_closed = True
-            for rm in rooms:
-                daily_avails = room_avail_map.get((rm.id, d), [])
-                for avail in daily_avails:
-                    open_start = time_to_mins(avail.start_time)
-                    open_end   = time_to_mins(avail.end_time)
-                    if t >= open_start and shift_end <= open_end:
-                        all_closed = False
-                        break
-                if not all_closed:
-                    break
-            if all_closed:
-                room_blocked.add((d, t))
+        for t in problem.day_times(d):
+            for w_id, r_ids in problem.worker_roles.items():
+                for r_id in r_ids:
+                    scores[(d, t, w_id, r_id)] = 100 - ((t - 480) // interval)
 
-    # ------------------------------------------------------------------
-    # 5. SHARED MODEL BUILDER
-    # ------------------------------------------------------------------
-    def _build_model(partial: bool):
-        """
-        Constructs the CP-SAT model.
+    # Lecture bonus
+    for r_id, obs_days, o_start, o_end in problem.obstructions:
+        for d in obs_days:
+            if d in target_days:
+                for t in problem.day_times(d):
+                    shift_end = t + duration
+                    if 0 <= (o_start - shift_end) <= 60 or 0 <= (t - o_end) <= 60:
+                        for w_id in problem.role_workers.get(r_id, []):
+                            scores[(d, t, w_id, r_id)] += 500
 
-        partial=False → weekly_quota is a hard equality (full schedule).
-        partial=True  → weekly_quota is an upper bound; objective is
-                        (sessions assigned × large weight) + quality score,
-                        so the solver fills as many slots as possible first.
-        """
-        model  = cp_model.CpModel()
-        shifts = {}
+    # Campus bonus
+    for (w_id, day), busies in problem.busy.items():
+        if day not in target_days or w_id not in problem.worker_roles:
+            continue
+        for b_start, b_end in busies:
+            for t in problem.day_times(day):
+                shift_end = t + duration
+                if 0 <= (b_start - shift_end) <= 60 or 0 <= (t - b_end) <= 60:
+                    for r_id in problem.worker_roles[w_id]:
+                        scores[(day, t, w_id, r_id)] += 200
 
-        # --- Variables ---
-        for d in target_days:
-            for t in start_times:
-                if (d, t) in room_blocked:
+    # Preference bonus
+    for (w_id, day), prefs in problem.preferred.items():
+        if day not in target_days or w_id not in problem.worker_roles:
+            continue
+        for p_start, p_end in prefs:
+            for t in problem.day_times(day):
+                shift_end = t + duration
+                if t >= p_start and shift_end <= p_end:
+                    for r_id in problem.worker_roles[w_id]:
+                        scores[(day, t, w_id, r_id)] += 300
+
+
+# ----------------------------------------------------------------------
+# GREEDY HEURISTIC
+# ----------------------------------------------------------------------
+def greedy_schedule(problem):
+    """
+    A fast constructive schedule that satisfies every hard constraint of
+    build_model() but not necessarily the full quota.
+
+    Works in rounds: each round gives every (worker, role) still under
+    weekly_quota one more shift, most constrained workers (fewest free
+    slots) first, at their highest-scoring start that keeps the worker,
+    room and role limits and daily_max, in the first open room with
+    capacity left. Overlap is counted per start time exactly like the
+    model's windows: a shift at start p occupies every start in
+    [p, p + duration).
+
+    Returns a list of (day, start, room_id, user_id, role_id) keys.
+    """
+    start_times = problem.start_times
+    duration    = problem.duration
+
+    # start index → indexes of the starts a shift beginning there occupies
+    covers = [
+        [j for j in range(i, len(start_times)) if start_times[j] < t + duration]
+        for i, t in enumerate(start_times)
+    ]
+
+    # (w_id, r_id) → [(score, d_i, s_i)], best first
+    candidates = {}
+    free_slots = {}
+    for w_row, w_id in enumerate(problem.worker_ids):
+        free = [
+            (d_i, s_i)
+            for d_i, s_i in zip(*np.nonzero(~problem.blocked[w_row]))
+            if (problem.target_days[d_i], start_times[s_i]) in problem.open_rooms
+        ]
+        free_slots[w_id] = len(free)
+        for r_id in problem.worker_roles[w_id]:
+            candidates[(w_id, r_id)] = sorted(
+                (
+                    (-problem.scores[(problem.target_days[d_i], start_times[s_i], w_id, r_id)], d_i, s_i)
+                    for d_i, s_i in free
+                ),
+            )
+
+    worker_load = {}   # (w_id, d_i, s_i)  → shifts running
+    room_load   = {}   # (rm_id, d_i, s_i) → shifts running
+    role_load   = {}   # (r_id, d_i, s_i)  → shifts running
+    daily       = {}   # (w_id, d_i)       → shifts that day
+    assigned    = {}   # (w_id, r_id)      → shifts so far
+
+    def fits(loads, key, d_i, s_i, limit):
+        return all(loads.get((key, d_i, j), 0) < limit for j in covers[s_i])
+
+    def occupy(loads, key, d_i, s_i):
+        for j in covers[s_i]:
+            loads[(key, d_i, j)] = loads.get((key, d_i, j), 0) + 1
+
+    keys  = []
+    order = sorted(candidates, key=lambda pair: (free_slots[pair[0]], pair))
+    for _ in range(problem.weekly_quota):
+        placed_any = False
+        for w_id, r_id in order:
+            if assigned.get((w_id, r_id), 0) >= problem.weekly_quota:
+                continue
+            for _, d_i, s_i in candidates[(w_id, r_id)]:
+                if daily.get((w_id, d_i), 0) >= problem.daily_max:
                     continue
-                for rm in rooms:
-                    shift_end    = t + duration
-                    daily_avails = room_avail_map.get((rm.id, d), [])
-                    room_open    = any(
-                        time_to_mins(avail.start_time) <= t
-                        and shift_end <= time_to_mins(avail.end_time)
-                        for avail in daily_avails
-                    )
-                    if not room_open:
-                        continue
-                    for w_id, r_ids in worker_roles.items():
-                        if (w_id, d, t) in blocked:
-                            continue
-                        for r_id in r_ids:
-                            shifts[(d, t, rm.id, w_id, r_id)] = model.NewBoolVar(
-                                f"shift_{d}_{t}_{rm.id}_{w_id}_{r_id}"
-                            )
-
-        # --- Constraint A: Quota ---
-        for w_id, r_ids in worker_roles.items():
-            for r_id in r_ids:
-                shift_sum = sum(
-                    shifts[(d, t, rm.id, w_id, r_id)]
-                    for d in target_days
-                    for t in start_times
-                    for rm in rooms
-                    if (d, t, rm.id, w_id, r_id) in shifts
+                if not fits(worker_load, w_id, d_i, s_i, 1):
+                    continue
+                if not fits(role_load, r_id, d_i, s_i, problem.max_concurrent):
+                    continue
+                d, t = problem.target_days[d_i], start_times[s_i]
+                room = next(
+                    (
+                        rm_id
+                        for rm_id in problem.open_rooms[(d, t)]
+                        if fits(room_load, rm_id, d_i, s_i, problem.rooms[rm_id])
+                    ),
+                    None,
                 )
-                if partial:
-                    model.Add(shift_sum <= weekly_quota)   # relaxed: fill what you can
-                else:
-                    model.Add(shift_sum == weekly_quota)   # strict: must hit quota
-
-            # Daily cap always stays as an upper bound
-            for d in target_days:
-                model.Add(
-                    sum(
-                        shifts[(d, t, rm.id, w_id, r_id)]
-                        for t in start_times
-                        for rm in rooms
-                        for r_id in r_ids
-                        if (d, t, rm.id, w_id, r_id) in shifts
-                    ) <= daily_max
+                if room is None:
+                    continue
+
+                occupy(worker_load, w_id, d_i, s_i)
+                occupy(role_load, r_id, d_i, s_i)
+                occupy(room_load, room, d_i, s_i)
+                daily[(w_id, d_i)] = daily.get((w_id, d_i), 0) + 1
+                assigned[(w_id, r_id)] = assigned.get((w_id, r_id), 0) + 1
+                keys.append((d, t, room, w_id, r_id))
+                placed_any = True
+                break
+        if not placed_any:
+            break
+
+    return keys
+
+
+# ----------------------------------------------------------------------
+# MODEL BUILDER
+# ----------------------------------------------------------------------
+def build_model(problem, partial):
+    """
+    Constructs the CP-SAT model.
+
+    partial=False → weekly_quota is a hard equality (full schedule).
+    partial=True  → weekly_quota is an upper bound; objective is
+                    (sessions assigned × large weight) + quality score,
+                    so the solver fills as many slots as possible first
+                    (or sessions alone, then quality; see _solve_model).
+
+    Every variable is filed into secondary indexes as it is created, so each
+    constraint below is emitted straight from its bucket instead of
+    re-scanning days × starts × rooms × workers × roles.
+
+    The room dimension is over room classes (see _precompute_room_classes):
+    a key's room_id is its class representative, capacity is the class
+    total, and _extract() assigns concrete rooms. Interchangeable rooms
+    would otherwise give the solver many equivalent assignments to explore.
+    """
+    model  = cp_model.CpModel()
+    shifts = {}
+
+    by_worker_role = {}   # (w_id, r_id)      → [var]
+    by_worker_day  = {}   # (w_id, d)         → [var]
+    by_slot_worker = {}   # (d, t, w_id)      → [var]
+    by_slot_room   = {}   # (d, t, rm_id)     → [var]
+    by_slot_role   = {}   # (d, t, r_id)      → [var]
+
+    # --- Variables ---
+    for d_i, d in enumerate(problem.target_days):
+        for s_i in problem.day_slots[d]:
+            t = problem.start_times[s_i]
+            open_here = problem.open_rooms.get((d, t))
+            if not open_here:
+                continue
+            free = np.flatnonzero(~problem.blocked[:, d_i, s_i])
+            for rm_id in open_here:
+                if problem.room_class[rm_id] != rm_id:
+                    continue
+                for w_row in free:
+                    w_id = problem.worker_ids[w_row]
+                    for r_id in problem.worker_roles[w_id]:
+                        var = model.NewBoolVar(f"shift_{d}_{t}_{rm_id}_{w_id}_{r_id}")
+                        shifts[(d, t, rm_id, w_id, r_id)] = var
+                        by_worker_role.setdefault((w_id, r_id), []).append(var)
+                        by_worker_day.setdefault((w_id, d), []).append(var)
+                        by_slot_worker.setdefault((d, t, w_id), []).append(var)
+                        by_slot_room.setdefault((d, t, rm_id), []).append(var)
+                        by_slot_role.setdefault((d, t, r_id), []).append(var)
+
+    # --- Warm start ---
+    # Hint every variable (not just the 1s) so CP-SAT gets a complete
+    # assignment to repair rather than a partial one to extend. Shifts that
+    # no longer fit the grid, rooms or availability simply have no variable.
+    if problem.hints:
+        hinted = _class_keys(problem, problem.hints)
+        for key, var in shifts.items():
+            model.AddHint(var, key in hinted)
+
+    _add_quota_constraints(model, problem, partial, by_worker_role, by_worker_day)
+
+    # --- Constraints B, C, D: overlapping shifts ---
+    intervals = {}
+    # B: no double-booking per worker
+    _add_resource_limits(
+        model, problem, by_slot_worker, dict.fromkeys(problem.worker_roles, 1), intervals
+    )
+    # C: room capacity, pooled per class
+    _add_resource_limits(model, problem, by_slot_room, _class_capacity(problem), intervals)
+    # D: concurrency cap per role
+    _add_resource_limits(
+        model,
+        problem,
+        by_slot_role,
+        dict.fromkeys(problem.role_workers, problem.max_concurrent),
+        intervals,
+    )
+
+    # --- Objective ---
+    _set_objective(model, problem, partial, shifts)
+
+    return model, shifts
+
+
+def _add_quota_constraints(model, problem, partial, by_worker_role, by_worker_day):
+    """
+    Constraint A: weekly quota per (worker, role) and the daily cap per worker.
+
+    A worker in problem.quota_caps keeps weekly_quota as a per-role upper
+    bound; their total across roles must equal the cap (strict) or stay
+    within it (partial).
+    """
+    for w_id, r_ids in problem.worker_roles.items():
+        cap = problem.quota_caps.get(w_id)
+        for r_id in r_ids:
+            shift_sum = cp_model.LinearExpr.Sum(by_worker_role.get((w_id, r_id), []))
+            if partial or cap is not None:
+                model.Add(shift_sum <= problem.weekly_quota)   # relaxed: fill what you can
+            else:
+                model.Add(shift_sum == problem.weekly_quota)   # strict: must hit quota
+
+        if cap is not None:
+            worker_sum = cp_model.LinearExpr.Sum(
+                [var for d in problem.target_days for var in by_worker_day.get((w_id, d), ())]
+            )
+            if partial:
+                model.Add(worker_sum <= cap)
+            else:
+                model.Add(worker_sum == cap)
+
+        # Daily cap always stays as an upper bound
+        for d in problem.target_days:
+            day_vars = by_worker_day.get((w_id, d))
+            if day_vars:
+                model.Add(cp_model.LinearExpr.Sum(day_vars) <= problem.daily_max)
+
+
+def _add_window_limits(model, problem, buckets, limits):
+    """
+    At each start time t, every shift that started in (t - duration, t] is
+    still running, so the sum over that window is what's active at t. For
+    every key in `limits`, caps that sum at limits[key], reading the shifts
+    straight from buckets[(day, start, key)].
+    """
+    for d in problem.target_days:
+        # the most shifts running at once is always reached at some shift's
+        # start, so only the day's own starts need a window
+        for i in problem.day_slots[d]:
+            window = problem.overlap_starts(i)
+            for key, limit in limits.items():
+                active = [
+                    var
+                    for prev_t in window
+                    for var in buckets.get((d, prev_t, key), ())
+                ]
+                if active:
+                    model.Add(cp_model.LinearExpr.Sum(active) <= limit)
+
+
+def _add_resource_limits(model, problem, buckets, limits, intervals):
+    """
+    Caps how many shifts of each resource (worker, room or role) overlap,
+    using the formulation selected by problem.backend. `intervals` caches
+    interval variables so a shift shared by several resources gets one.
+    """
+    if problem.backend == "interval":
+        _add_interval_limits(model, problem, buckets, limits, intervals)
+    else:
+        _add_window_limits(model, problem, buckets, limits)
+
+
+def _add_interval_limits(model, problem, buckets, limits, intervals):
+    """
+    Interval backend for _add_window_limits(): every shift variable becomes
+    an optional fixed-size interval on a week-long timeline (each day offset
+    by 1440 minutes), and each resource gets a single AddNoOverlap (limit 1)
+    or AddCumulative instead of one linear sum per overlap window.
+    """
+    day_offset = {d: i * 1440 for i, d in enumerate(problem.target_days)}
+
+    per_key = {}
+    for (d, t, key), bucket in buckets.items():
+        if key not in limits:
+            continue
+        for var in bucket:
+            interval = intervals.get(var.Index())
+            if interval is None:
+                interval = model.NewOptionalFixedSizeIntervalVar(
+                    day_offset[d] + t, problem.duration, var, f"iv_{var.Name()}"
                 )
+                intervals[var.Index()] = interval
+            per_key.setdefault(key, []).append(interval)
 
-        # --- Constraint B: No double-booking + room capacity ---
-        for d in target_days:
-            for i, t in enumerate(start_times):
-                for w_id, r_ids in worker_roles.items():
-                    active_for_worker = [
-                        shifts[(d, t, rm.id, w_id, r_id)]
-                        for rm in rooms
-                        for r_id in r_ids
-                        if (d, t, rm.id, w_id, r_id) in shifts
-                    ]
-                    for j in range(i - 1, -1, -1):
-                        prev_t = start_times[j]
-                        if prev_t + duration > t:
-                            active_for_worker.extend([
-                                shifts[(d, prev_t, rm.id, w_id, r_id)]
-                                for rm in rooms
-                                for r_id in r_ids
-                                if (d, prev_t, rm.id, w_id, r_id) in shifts
-                            ])
-                        else:
-                            break
-                    if active_for_worker:
-                        model.Add(sum(active_for_worker) <= 1)
-
-                for rm in rooms:
-                    active_in_room = [
-                        shifts[(d, t, rm.id, w_id, r_id)]
-                        for w_id, r_ids in worker_roles.items()
-                        for r_id in r_ids
-                        if (d, t, rm.id, w_id, r_id) in shifts
-                    ]
-                    for j in range(i - 1, -1, -1):
-                        prev_t = start_times[j]
-                        if prev_t + duration > t:
-                            active_in_room.extend([
-                                shifts[(d, prev_t, rm.id, w_id, r_id)]
-                                for w_id, r_ids in worker_roles.items()
-                                for r_id in r_ids
-                                if (d, prev_t, rm.id, w_id, r_id) in shifts
-                            ])
-                        else:
-                            break
-                    if active_in_room:
-                        model.Add(sum(active_in_room) <= rm.capacity)
-
-        # --- Constraint D: Concurrency cap per role ---
-        # --- Constraint D: Concurrency cap per role ---
-        for d in target_days:
-            for i, t in enumerate(start_times):
-                for r_id, w_ids in role_workers.items():
-                    # 1. Find shifts for this role starting exactly at time t
-                    active_for_role = [
-                        shifts[(d, t, rm.id, w_id, r_id)]
-                        for rm in rooms
-                        for w_id in w_ids
-                        if (d, t, rm.id, w_id, r_id) in shifts
-                    ]
-                    
-                    # 2. Look backwards to find shifts that started earlier but overlap with t
-                    for j in range(i - 1, -1, -1):
-                        prev_t = start_times[j]
-                        # If the previous shift's start time + duration crosses into our current time t
-                        if prev_t + duration > t:
-                            active_for_role.extend([
-                                shifts[(d, prev_t, rm.id, w_id, r_id)]
-                                for rm in rooms
-                                for w_id in w_ids
-                                if (d, prev_t, rm.id, w_id, r_id) in shifts
-                            ])
-                        else:
-                            # Since start_times is sorted, if this prev_t doesn't overlap, 
-                            # none of the earlier ones will either.
-                            break 
-
-                    # 3. Enforce that the total active shifts at any minute does not exceed max_concurrent
-                    if active_for_role:
-                        model.Add(sum(active_for_role) <= max_concurrent)
-
-        # --- Scoring ---
-        scores = {}
-        for d in target_days:
-            for t in start_times:
-                for w_id, r_ids in worker_roles.items():
-                    for r_id in r_ids:
-                        scores[(d, t, w_id, r_id)] = 100 - ((t - 480) // interval)
-
-        # Lecture bonus
-        for obs in fixed_obs:
-            obs_days = [d.day for d in obs.days.all()]
-            o_start  = time_to_mins(obs.start_time)
-            o_end    = time_to_mins(obs.end_time)
-            r_id     = obs.role_id
-            for d in obs_days:
-                if d in target_days:
-                    for t in start_times:
-                        shift_end = t + duration
-                        if 0 <= (o_start - shift_end) <= 60 or 0 <= (t - o_end) <= 60:
-                            for w_id in role_workers.get(r_id, []):
-                                scores[(d, t, w_id, r_id)] += 500
-
-        # Campus bonus
-        for (w_id, day), busies in busy_map.items():
-            if day not in target_days or w_id not in worker_roles:
+    for key, key_intervals in per_key.items():
+        limit = limits[key]
+        if limit == 1:
+            model.AddNoOverlap(key_intervals)
+        elif len(key_intervals) > limit:
+            model.AddCumulative(key_intervals, [1] * len(key_intervals), limit)
+
+
+def _set_objective(model, problem, partial, variables):
+    """
+    Maximise Σ score × shift. In partial mode every shift also carries a
+    volume weight larger than any score; with the "lexicographic" partial
+    objective it maximises the number of sessions alone, and _solve_model()
+    maximises quality in a second solve.
+    """
+    obj_vars, obj_coeffs = _quality_terms(problem, variables)
+
+    if partial and problem.partial_objective == "lexicographic":
+        model.Maximize(cp_model.LinearExpr.Sum(obj_vars))
+        return
+
+    if partial:
+        # Primary objective: schedule as many sessions as possible.
+        # Use a large weight so that an extra session always beats any quality gain.
+        volume_weight = max(problem.scores.values(), default=0) + 1
+        obj_coeffs = [c + volume_weight for c in obj_coeffs]
+
+    model.Maximize(cp_model.LinearExpr.WeightedSum(obj_vars, obj_coeffs))
+
+
+def _quality_terms(problem, variables):
+    """
+    ([var], [score]) for shift variables keyed (day, start, [room,] worker, role).
+    """
+    obj_vars   = list(variables.values())
+    obj_coeffs = [problem.scores[(key[0], key[1], key[-2], key[-1])] for key in variables]
+    return obj_vars, obj_coeffs
+
+
+# ----------------------------------------------------------------------
+# TWO-STAGE MODEL (times first, rooms second)
+# ----------------------------------------------------------------------
+def build_time_model(problem, partial):
+    """
+    Stage 1 of the two-stage mode: the same model as build_model() without
+    the room dimension, so there is one variable per (day, start, worker,
+    role) instead of one per open room.
+
+    Per-room capacity is replaced by a pooled limit: at each start time, the
+    shifts still running can't exceed the total capacity of the rooms open
+    for any of their start times. Concrete rooms are chosen afterwards by
+    assign_rooms().
+    """
+    model = cp_model.CpModel()
+    slots = {}
+
+    by_worker_role = {}   # (w_id, r_id)      → [var]
+    by_worker_day  = {}   # (w_id, d)         → [var]
+    by_slot_worker = {}   # (d, t, w_id)      → [var]
+    by_slot_role   = {}   # (d, t, r_id)      → [var]
+    by_slot        = {}   # (d, t, None)      → [var]
+
+    for d_i, d in enumerate(problem.target_days):
+        for s_i in problem.day_slots[d]:
+            t = problem.start_times[s_i]
+            if not problem.open_rooms.get((d, t)):
                 continue
-            for busy in busies:
-                b_start = time_to_mins(busy.start_time)
-                b_end   = time_to_mins(busy.end_time)
-                for t in start_times:
-                    shift_end = t + duration
-                    if 0 <= (b_start - shift_end) <= 60 or 0 <= (t - b_end) <= 60:
-                        for r_id in worker_roles[w_id]:
-                            scores[(day, t, w_id, r_id)] += 200
+            for w_row in np.flatnonzero(~problem.blocked[:, d_i, s_i]):
+                w_id = problem.worker_ids[w_row]
+                for r_id in problem.worker_roles[w_id]:
+                    var = model.NewBoolVar(f"slot_{d}_{t}_{w_id}_{r_id}")
+                    slots[(d, t, w_id, r_id)] = var
+                    by_worker_role.setdefault((w_id, r_id), []).append(var)
+                    by_worker_day.setdefault((w_id, d), []).append(var)
+                    by_slot_worker.setdefault((d, t, w_id), []).append(var)
+                    by_slot_role.setdefault((d, t, r_id), []).append(var)
+                    by_slot.setdefault((d, t, None), []).append(var)
 
-        # Preference bonus
-        for (w_id, day), prefs in pref_map.items():
-            if day not in target_days or w_id not in worker_roles:
+    if problem.hints:
+        hinted = {(d, t, w_id, r_id) for d, t, rm_id, w_id, r_id in problem.hints}
+        for key, var in slots.items():
+            model.AddHint(var, key in hinted)
+
+    _add_quota_constraints(model, problem, partial, by_worker_role, by_worker_day)
+    intervals = {}
+    _add_resource_limits(
+        model, problem, by_slot_worker, dict.fromkeys(problem.worker_roles, 1), intervals
+    )
+    _add_resource_limits(
+        model,
+        problem,
+        by_slot_role,
+        dict.fromkeys(problem.role_workers, problem.max_concurrent),
+        intervals,
+    )
+
+    # Pooled room capacity (always linear: the limit changes with the time
+    # of day, which a single Cumulative can't express)
+    for d in problem.target_days:
+        for i in problem.day_slots[d]:
+            window = problem.overlap_starts(i)
+            active = [var for prev_t in window for var in by_slot.get((d, prev_t, None), ())]
+            if not active:
                 continue
-            for pref in prefs:
-                p_start = time_to_mins(pref.start_time)
-                p_end   = time_to_mins(pref.end_time)
-                for t in start_times:
-                    shift_end = t + duration
-                    if t >= p_start and shift_end <= p_end:
-                        for r_id in worker_roles[w_id]:
-                            scores[(day, t, w_id, r_id)] += 300
-
-        # --- Objective ---
-        quality_terms = [
-            shifts[(d, t, rm.id, w_id, r_id)] * scores[(d, t, w_id, r_id)]
-            for d in target_days
-            for t in start_times
-            for rm in rooms
-            for w_id, r_ids in worker_roles.items()
-            for r_id in r_ids
-            if (d, t, rm.id, w_id, r_id) in shifts
-        ]
+            usable_rooms = {
+                rm_id
+                for prev_t in window
+                for rm_id in problem.open_rooms.get((d, prev_t), ())
+            }
+            model.Add(
+                cp_model.LinearExpr.Sum(active) <= sum(problem.rooms[rm] for rm in usable_rooms)
+            )
 
-        if partial:
-            # Primary objective: schedule as many sessions as possible.
-            # Use a large weight so that an extra session always beats any quality gain.
-            volume_weight = max(s for s in scores.values()) + 1
-            volume_terms  = [
-                shifts[k] * volume_weight
-                for k in shifts
-            ]
-            model.Maximize(sum(volume_terms) + sum(quality_terms))
-        else:
-            model.Maximize(sum(quality_terms))
-
-        return model, shifts
-
-    # ------------------------------------------------------------------
-    # 6. RESULT EXTRACTION
-    # ------------------------------------------------------------------
-    def _extract(solver, shifts):
-        results = []
-        for (d, t, rm_id, w_id, r_id), var in shifts.items():
-            if solver.Value(var) == 1:
-                results.append({
-                    "day": d,
-                    "start_min": t,
-                    "end_min": t + duration,
-                    "room_id": rm_id,
-                    "user_id": w_id,
-                    "role_id": r_id,
-                })
-        return results
-
-    def _compute_shortfalls(results):
-        assigned_counts = {}
-        for r in results:
-            key = (r["user_id"], r["role_id"])
-            assigned_counts[key] = assigned_counts.get(key, 0) + 1
-
-        shortfalls = []
-        for w_id, r_ids in worker_roles.items():
-            for r_id in r_ids:
-                assigned = assigned_counts.get((w_id, r_id), 0)
-                if assigned < weekly_quota:
-                    shortfalls.append({
-                        "user_id":   w_id,
-                        "role_id":   r_id,
-                        "user_name": user_name_map.get(w_id, f"Worker {w_id}"),
-                        "role_name": role_name_map.get(r_id, f"Role {r_id}"),
-                        "assigned":  assigned,
-                        "quota":     weekly_quota,
-                    })
-        return shortfalls
-
-    # ------------------------------------------------------------------
-    # 7. THREE-PHASE SOLVING
-    # ------------------------------------------------------------------
-
-    # --- Phase 1: strict constraints, original timeout ---
-    model, shifts = _build_model(partial=False)
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = timeout
+    _set_objective(model, problem, partial, slots)
+
+    return model, slots
+
+
+def assign_rooms(problem, slot_keys, max_time=10.0):
+    """
+    Stage 2 of the two-stage mode: given fixed (day, start, worker, role)
+    shifts, picks a room for each so that every room is open for the whole
+    shift and never over capacity. A small CP model, since shifts are fixed
+    and only rooms are free. Like build_model() it chooses room classes,
+    and _assign_class_rooms() picks the rooms within them.
+
+    Returns the full (day, start, room, worker, role) keys, or None if the
+    pooled capacity in stage 1 was too optimistic for these shifts.
+    """
+    model   = cp_model.CpModel()
+    choices = {}
+    by_slot_room = {}
+    hinted = _class_keys(problem, problem.hints)
+
+    for key in slot_keys:
+        d, t, w_id, r_id = key
+        options = []
+        for rm_id in problem.open_rooms.get((d, t), ()):
+            if problem.room_class[rm_id] != rm_id:
+                continue
+            var = model.NewBoolVar(f"room_{d}_{t}_{w_id}_{r_id}_{rm_id}")
+            choices[(key, rm_id)] = var
+            options.append(var)
+            by_slot_room.setdefault((d, t, rm_id), []).append(var)
+            if hinted:
+                model.AddHint(var, (d, t, rm_id, w_id, r_id) in hinted)
+        model.AddExactlyOne(options)
+
+    _add_window_limits(model, problem, by_slot_room, _class_capacity(problem))
+
+    # capped like every other solve
+    solver = _new_solver(problem, max_time)
     status = solver.Solve(model)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return None
 
-    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        return _extract(solver, shifts), []
+    return _assign_class_rooms(problem, [
+        (key[0], key[1], rm_id, key[2], key[3])
+        for (key, rm_id), var in choices.items()
+        if solver.Value(var) == 1
+    ])
+
+
+def _extract_two_stage(problem, solver, slots):
+    chosen = [key for key, var in slots.items() if solver.Value(var) == 1]
+    full_keys = assign_rooms(problem, chosen)
+    if full_keys is None:
+        return None
+    return [_result_row(problem, key) for key in full_keys]
+
+
+def _build_phase(problem, partial, two_stage=None):
+    if two_stage is None:
+        two_stage = problem.two_stage
+
+    started = time.perf_counter()
+    if two_stage:
+        model, variables = build_time_model(problem, partial)
+        extract = _extract_two_stage
+    else:
+        model, variables = build_model(problem, partial)
+        extract = _extract
+    return PhaseModel(model, variables, partial, extract, time.perf_counter() - started)
 
-    # --- Phase 2: strict constraints, extended timeout (only if we timed out) ---
-    # INFEASIBLE is provably unsolvable — extra time won't help.
-    if status == cp_model.UNKNOWN:
-        model, shifts = _build_model(partial=False)
-        solver = cp_model.CpSolver()
-        solver.parameters.max_time_in_seconds = timeout * 2
-        status = solver.Solve(model)
 
+def _solve_phase(problem, phase, max_time, name, phase_log, progress=None):
+    """
+    Solves one built phase. Returns (status, results); results is None
+    unless a usable solution was found. If the two-stage room assignment
+    fails, the phase is re-solved as a single model in the same time budget.
+
+    A stats entry (see _phase_stats) is appended to `phase_log` for every
+    model solved. With a `progress` store, improving solutions are published
+    while the solve runs and a stop request ends it early (see PROGRESS).
+    """
+    status, solver = _solve_model(problem, phase, max_time, name, phase_log, progress)
+
+    results = None
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        started = time.perf_counter()
+        results = phase.extract(problem, solver, phase.variables)
+        phase_log[-1]["solve_seconds"] += time.perf_counter() - started
+
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) and results is None:
+        phase = _build_phase(problem, phase.partial, two_stage=False)
+        status, solver = _solve_model(
+            problem, phase, max_time, f"{name} (room fallback)", phase_log
+        )
         if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-            return _extract(solver, shifts), []
+            results = _extract(problem, solver, phase.variables)
 
-    # --- Phase 3: relaxed constraints, maximise sessions scheduled ---
-    model, shifts = _build_model(partial=True)
+    return status, results
+
+
+def _solve_model(problem, phase, max_time, name, phase_log, progress=None):
+    """
+    Solves phase.model and returns (status, solver) for the solution to use.
+
+    With the "lexicographic" partial objective a partial phase takes two
+    solves: the model as built maximises sessions, with half of max_time;
+    then _maximise_quality() keeps at least that many and maximises quality
+    in the rest, starting from the first step's solution. The better of the
+    two by quality is returned (the first if the second finds nothing), with
+    the first step's status, as that is what proves the shortfalls
+    unavoidable.
+    """
+    lexicographic = phase.partial and problem.partial_objective == "lexicographic"
+
+    solver = _new_solver(problem, max_time / 2 if lexicographic else max_time)
+    started = time.perf_counter()
+    status = _solve_with_progress(problem, phase, name, solver, progress)
+    phase_log.append(_phase_stats(name, phase, solver, status, time.perf_counter() - started))
+
+    if not lexicographic or status not in (cp_model.OPTIMAL, cp_model.FEASIBLE) or _stopped(progress):
+        return status, solver
+
+    quality_name = f"{name} (quality)"
+    started = time.perf_counter()
+    hint_quality = _maximise_quality(problem, phase, solver)
+    quality_solver = _new_solver(problem, max_time - phase_log[-1]["solve_seconds"])
+    quality_status = _solve_with_progress(problem, phase, quality_name, quality_solver, progress)
+    phase_log.append(_phase_stats(
+        quality_name, phase._replace(build_seconds=0.0), quality_solver, quality_status,
+        time.perf_counter() - started,
+    ))
+    phase_log[-1]["hint_quality"] = hint_quality
+
+    if (
+        quality_status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+        and quality_solver.ObjectiveValue() >= hint_quality
+    ):
+        return status, quality_solver
+    return status, solver
+
+
+def _maximise_quality(problem, phase, solver):
+    """
+    Turns a solved partial model into its second lexicographic step: at
+    least as many sessions as `solver` found, objective Σ score × shift.
+
+    The first step's solution replaces the model's hints, so the quality
+    step starts from a feasible solution instead of searching for one
+    (unhinted, it could end UNKNOWN on a long run). Returns that
+    solution's quality; _solve_model() keeps it unless this step beats it.
+    """
+    sessions = round(solver.ObjectiveValue())
+    phase.model.Add(cp_model.LinearExpr.Sum(list(phase.variables.values())) >= sessions)
+
+    obj_vars, obj_coeffs = _quality_terms(problem, phase.variables)
+    phase.model.Maximize(cp_model.LinearExpr.WeightedSum(obj_vars, obj_coeffs))
+
+    phase.model.ClearHints()
+    values = [solver.BooleanValue(var) for var in obj_vars]
+    for var, value in zip(obj_vars, values):
+        phase.model.AddHint(var, value)
+    return sum(coeff for coeff, value in zip(obj_coeffs, values) if value)
+
+
+def _phase_stats(name, phase, solver, status, solve_seconds):
+    """
+    Size and outcome of one solved phase model. The presolve figures are
+    CP-SAT's counts for the model it actually searched, after presolve.
+    """
+    proto    = phase.model.Proto()
+    response = solver.ResponseProto()
+    solved   = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+    return {
+        "name": name,
+        "build_seconds": phase.build_seconds,
+        "solve_seconds": solve_seconds,
+        "variables": len(proto.variables),
+        "constraints": len(proto.constraints),
+        "presolve": {
+            "booleans": response.num_booleans,
+            "fixed_booleans": response.num_fixed_booleans,
+            "integers": response.num_integers,
+        },
+        "status": solver.StatusName(status),
+        "objective": solver.ObjectiveValue() if solved else None,
+        "best_bound": solver.BestObjectiveBound() if solved else None,
+        "conflicts": response.num_conflicts,
+        "branches": response.num_branches,
+        "deterministic_time": response.deterministic_time,
+    }
+
+
+# ----------------------------------------------------------------------
+# PROGRESS
+# ----------------------------------------------------------------------
+# A progress store is any object with:
+#   publish(update)       — update: {"phase", "objective", "best_bound",
+#                           "gap", "solutions", "shifts"} for the best
+#                           solution so far
+#   stop_requested()      — True once the caller wants the best-so-far
+#   for_component(index)  — the store to use for one decomposed component
+# jobs.JobProgress backs it with the database.
+
+# Seconds between publishing the latest solution / checking for a stop
+PROGRESS_INTERVAL = 1.0
+
+
+class _SolutionRecorder(cp_model.CpSolverSolutionCallback):
+    """
+    Keeps the variables set in CP-SAT's latest (i.e. best) solution, with its
+    objective and the bound at that moment. Runs on the solver's thread, so
+    it only records; _ProgressWatcher does the publishing.
+    """
+
+    def __init__(self, variables):
+        super().__init__()
+        self._variables = variables
+        self.solutions = 0
+        self.latest = None
+
+    def OnSolutionCallback(self):
+        self.solutions += 1
+        chosen = [key for key, var in self._variables.items() if self.BooleanValue(var)]
+        self.latest = (self.ObjectiveValue(), self.BestObjectiveBound(), chosen, self.solutions)
+
+
+class _ProgressWatcher(threading.Thread):
+    """
+    Every PROGRESS_INTERVAL seconds, publishes the recorder's latest
+    solution if it changed and stops the solver if a stop was requested.
+    """
+
+    def __init__(self, problem, phase, name, solver, recorder, progress):
+        super().__init__(daemon=True)
+        self.problem   = problem
+        self.phase     = phase
+        self.name      = name
+        self.solver    = solver
+        self.recorder  = recorder
+        self.progress  = progress
+        # rooms for two-stage snapshots are picked on one worker, next to
+        # the main solve's
+        self.room_problem = copy.copy(problem)
+        self.room_problem.num_workers = 1
+        self._done      = threading.Event()
+        self._published = None
+
+    def run(self):
+        try:
+            while not self._done.wait(PROGRESS_INTERVAL):
+                self.flush()
+                if self.progress.stop_requested():
+                    self.solver.StopSearch()
+        finally:
+            # this thread's own database connection, if the store opened one
+            connection.close()
+
+    def flush(self):
+        latest = self.recorder.latest
+        if latest is None or latest is self._published:
+            return
+        self._published = latest
+
+        objective, bound, chosen, solutions = latest
+        if self.phase.extract is _extract_two_stage:
+            chosen = assign_rooms(self.room_problem, chosen, max_time=PROGRESS_INTERVAL)
+            if chosen is None:
+                return
+        else:
+            chosen = _assign_class_rooms(self.problem, chosen)
+
+        self.progress.publish({
+            "phase": self.name,
+            "objective": objective,
+            "best_bound": bound,
+            "gap": abs(bound - objective) / max(1.0, abs(objective)),
+            "solutions": solutions,
+            "shifts": [_result_row(self.problem, key) for key in chosen],
+        })
+
+    def finish(self):
+        self._done.set()
+        self.join()
+        self.flush()
+
+
+def _solve_with_progress(problem, phase, name, solver, progress):
+    if progress is None:
+        return solver.Solve(phase.model)
+
+    recorder = _SolutionRecorder(phase.variables)
+    watcher = _ProgressWatcher(problem, phase, name, solver, recorder, progress)
+    watcher.start()
+    try:
+        return solver.Solve(phase.model, recorder)
+    finally:
+        watcher.finish()
+
+
+def _stopped(progress):
+    return progress is not None and progress.stop_requested()
+
+
+# ----------------------------------------------------------------------
+# SOLVER
+# ----------------------------------------------------------------------
+def _new_solver(problem, max_time):
+    """
+    A CpSolver configured for one phase.
+
+    With a warm start from a base schedule the hint is usually already
+    (nearly) feasible, so the expensive parts of presolve (probing,
+    symmetry detection, repeated passes) only delay the moment CP-SAT gets
+    to use it. They are turned down for those runs only; greedy and coarse
+    hints are rougher and keep the full presolve.
+    """
     solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = timeout * 2
-    status = solver.Solve(model)
+    solver.parameters.max_time_in_seconds = max_time
 
-    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        results    = _extract(solver, shifts)
-        shortfalls = _compute_shortfalls(results)
-        return results, shortfalls
+    # Per-run parameters, clamped to the server caps
+    solver.parameters.num_workers = _worker_budget(problem)
+    max_dtime = settings.AUTO_SCHEDULER_MAX_DETERMINISTIC_TIME
+    solver.parameters.max_deterministic_time = min(problem.max_deterministic_time or max_dtime, max_dtime)
+    if problem.random_seed is not None:
+        solver.parameters.random_seed = problem.random_seed
+    if problem.log_search_progress:
+        solver.parameters.log_search_progress = True
+        solver.parameters.log_to_stdout = False
+        solver.log_callback = logger.info
+
+    if problem.warm_start and problem.hints:
+        solver.parameters.cp_model_probing_level = 0
+        solver.parameters.symmetry_level = 0
+        solver.parameters.max_presolve_iterations = 1
+
+    return solver
+
+
+def _worker_budget(problem):
+    """
+    CP-SAT search workers for one solve: the requested number (or the cap),
+    never more than AUTO_SCHEDULER_MAX_WORKERS.
+    """
+    cap = settings.AUTO_SCHEDULER_MAX_WORKERS
+    return max(1, min(problem.num_workers or cap, cap))
+
+
+def _split_workers(problem, processes):
+    """
+    A copy of `problem` whose worker budget is its share when `processes`
+    solves run at once, so parallel components / racers together stay
+    within the cap.
+    """
+    share = copy.copy(problem)
+    share.num_workers = max(1, _worker_budget(problem) // processes)
+    return share
+
+
+# ----------------------------------------------------------------------
+# FEASIBILITY PRE-CHECK
+# ----------------------------------------------------------------------
+def _max_disjoint(starts, duration):
+    """
+    Most non-overlapping shifts that fit on the given sorted start times
+    (earliest-finish greedy, exact because every shift is the same length).
+    """
+    count = 0
+    free_from = None
+    for t in starts:
+        if free_from is None or t >= free_from:
+            count += 1
+            free_from = t + duration
+    return count
+
+
+def _flow_bound(demand, day_caps, worker_day_caps):
+    """
+    Max flow through source → worker (demand) → day (per-worker-day cap) →
+    sink (day cap). An upper bound on how many shifts can be placed.
+    """
+    flow = max_flow.SimpleMaxFlow()
+    source, sink = 0, 1
+    nodes = {}
+
+    def node(key):
+        return nodes.setdefault(key, len(nodes) + 2)
+
+    for w_id, amount in demand.items():
+        flow.add_arc_with_capacity(source, node(("w", w_id)), amount)
+    for (w_id, d), cap in worker_day_caps.items():
+        if w_id in demand and cap > 0:
+            flow.add_arc_with_capacity(node(("w", w_id)), node(("d", d)), cap)
+    for d, cap in day_caps.items():
+        flow.add_arc_with_capacity(node(("d", d)), sink, cap)
+
+    if flow.solve(source, sink) != flow.OPTIMAL:
+        return 0
+    return flow.optimal_flow()
+
+
+def precheck(problem):
+    """
+    Cheap necessary conditions for the strict (exact quota) model, computed
+    from the blocked / room_blocked data alone.
+
+    - worker: fewer feasible sessions (per day: min(daily_max, disjoint free
+      starts)) than weekly_quota × their number of roles. The issue's
+      "available" count becomes the worker's quota cap (see solve_problem),
+      so it doesn't rule out a strict solve for everyone else.
+    - rooms:  total demand exceeds a max-flow bound where each day can host
+      at most Σ capacity × disjoint open starts across rooms
+    - role:   a role's demand exceeds a max-flow bound where each day can
+      host at most max_concurrent × disjoint starts any of its workers has
+
+    Demand counts capped workers at their "available" sessions, so a rooms
+    or role issue proves Phase 1 infeasible even with the caps applied.
+
+    Returns a list of dicts (empty if nothing was proven), each with its
+    "kind", "available" and "needed" sessions and the "shortfall" between
+    them; worker and role issues also name the worker or role.
+    """
+    duration    = problem.duration
+    start_times = problem.start_times
+    issues      = []
+
+    # Per-worker, per-day session capacity
+    slot_open       = ~problem.room_blocked.all(axis=0)
+    worker_day_caps = {}
+    worker_starts   = {}
+    for w_row, w_id in enumerate(problem.worker_ids):
+        for d_i, d in enumerate(problem.target_days):
+            free   = slot_open[d_i] & ~problem.blocked[w_row, d_i]
+            starts = [start_times[s_i] for s_i in np.flatnonzero(free)]
+            worker_starts[(w_id, d)] = starts
+            worker_day_caps[(w_id, d)] = min(problem.daily_max, _max_disjoint(starts, duration))
+
+    demand = {}
+    for w_id, r_ids in problem.worker_roles.items():
+        needed    = problem.weekly_quota * len(r_ids)
+        available = sum(worker_day_caps[(w_id, d)] for d in problem.target_days)
+        demand[w_id] = min(needed, available)
+        if available < needed:
+            issues.append({
+                "kind": "worker",
+                "user_id": w_id,
+                "user_name": problem.user_name_map.get(w_id, f"Worker {w_id}"),
+                "available": available,
+                "needed": needed,
+                "shortfall": needed - available,
+            })
+
+    # Room capacity bound across all roles
+    room_day_caps = {}
+    for d_i, d in enumerate(problem.target_days):
+        room_day_caps[d] = sum(
+            problem.rooms[rm_id] * _max_disjoint(
+                [start_times[s_i] for s_i in np.flatnonzero(~problem.room_blocked[rm_row, d_i])],
+                duration,
+            )
+            for rm_row, rm_id in enumerate(problem.room_ids)
+        )
+    needed = sum(demand.values())
+    capacity = _flow_bound(demand, room_day_caps, worker_day_caps)
+    if capacity < needed:
+        issues.append({
+            "kind": "rooms",
+            "available": capacity,
+            "needed": needed,
+            "shortfall": needed - capacity,
+        })
+
+    # Role concurrency bound
+    for r_id, w_ids in problem.role_workers.items():
+        # a capped worker may split their sessions across roles, so only
+        # what their other roles can't absorb is certain to fall on this one
+        role_demand = {
+            w_id: max(0, demand[w_id] - problem.weekly_quota * (len(problem.worker_roles[w_id]) - 1))
+            for w_id in w_ids
+        }
+        role_day_caps = {
+            d: problem.max_concurrent * _max_disjoint(
+                sorted({t for w_id in w_ids for t in worker_starts[(w_id, d)]}),
+                duration,
+            )
+            for d in problem.target_days
+        }
+        needed = sum(role_demand.values())
+        capacity = _flow_bound(role_demand, role_day_caps, worker_day_caps)
+        if capacity < needed:
+            issues.append({
+                "kind": "role",
+                "role_id": r_id,
+                "role_name": problem.role_name_map.get(r_id, f"Role {r_id}"),
+                "available": capacity,
+                "needed": needed,
+                "shortfall": needed - capacity,
+            })
+
+    return issues
+
+
+# ----------------------------------------------------------------------
+# DECOMPOSITION
+# ----------------------------------------------------------------------
+def find_components(problem):
+    """
+    Splits the problem into independent pieces: connected components of the
+    graph linking each worker to its roles and each contested room to every
+    role that could use it.
+
+    A room is only contested if its capacity can actually bind, i.e. it is
+    smaller than the most shifts that could ever overlap in it (each role
+    contributes at most min(max_concurrent, its worker count)). Rooms that
+    can never fill up don't couple anything, so they are handed to every
+    component with their full capacity.
+
+    Returns a list of (role_ids, room_ids) pairs.
+    """
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def union(a, b):
+        parent[find(a)] = find(b)
+
+    for r_id in problem.role_workers:
+        find(("role", r_id))
+    for w_id, r_ids in problem.worker_roles.items():
+        for r_id in r_ids:
+            union(("worker", w_id), ("role", r_id))
+
+    used_rooms = {rm_id for open_here in problem.open_rooms.values() for rm_id in open_here}
+    max_overlap = sum(
+        min(problem.max_concurrent, len(w_ids))
+        for w_ids in problem.role_workers.values()
+    )
+    shared_rooms    = [rm for rm in used_rooms if problem.rooms[rm] >= max_overlap]
+    contested_rooms = [rm for rm in used_rooms if problem.rooms[rm] < max_overlap]
+
+    for rm_id in contested_rooms:
+        for r_id in problem.role_workers:
+            union(("room", rm_id), ("role", r_id))
+
+    groups = {}
+    for r_id in problem.role_workers:
+        groups.setdefault(find(("role", r_id)), ([], list(shared_rooms)))[0].append(r_id)
+    for rm_id in contested_rooms:
+        root = find(("room", rm_id))
+        if root in groups:
+            groups[root][1].append(rm_id)
+
+    return list(groups.values())
+
+
+def _solve_components(problem, components, timeout, progress=None):
+    """
+    Solves each component in its own process and merges the results and
+    shortfalls. Components share no workers and no contested rooms, so the
+    merged schedule satisfies every constraint of the full problem.
+
+    No more processes run than the worker budget allows, so with each one
+    given a share of at least 1 the total stays within the cap.
+    """
+    max_workers = min(len(components), os.cpu_count() or 1, _worker_budget(problem))
+    subproblems = [
+        _split_workers(problem.restrict(role_ids, room_ids), max_workers)
+        for role_ids, room_ids in components
+    ]
+
+    results, shortfalls, component_log = [], [], []
+    # forked children must not share the parent's database sockets
+    connections.close_all()
+    # django.setup() lets spawned (non-fork) workers import this module
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=django.setup) as pool:
+        futures = [
+            pool.submit(
+                _solve_component, sub, timeout, progress.for_component(i) if progress else None
+            )
+            for i, sub in enumerate(subproblems)
+        ]
+        for future in futures:
+            sub_results, sub_shortfalls, sub_diagnostics = future.result()
+            results.extend(sub_results)
+            shortfalls.extend(sub_shortfalls)
+            component_log.append(sub_diagnostics)
+    return results, shortfalls, component_log
+
+
+def _solve_component(problem, timeout, progress):
+    """
+    solve_problem() for a worker process: the diagnostics dict is returned
+    alongside the results, since it can't be filled in across processes.
+    """
+    diagnostics = {}
+    results, shortfalls = solve_problem(problem, timeout, diagnostics, progress)
+    return results, shortfalls, diagnostics
+
+
+# ----------------------------------------------------------------------
+# COARSE-TO-FINE
+# ----------------------------------------------------------------------
+def _refine_from_coarse(problem, timeout, diagnostics, progress=None):
+    """
+    Solves `problem` on its coarse_interval grid first (all three phases,
+    nothing else changed) and returns the fine problem narrowed to that
+    solution's neighbourhood, with the coarse (results, shortfalls):
+
+    - each worker may only start within refine_radius minutes of one of
+      their coarse shifts, on the same day (workers the coarse solve left
+      under quota keep all their slots);
+    - the coarse shifts become the hints, with warm_start off even when
+      the run started from a base schedule.
+
+    Fine-grid hints would mostly name starts the coarse grid lacks, so the
+    coarse solve keeps only base-schedule hints that lie on its grid, or
+    re-runs the greedy hint on the coarse grid.
+
+    The coarse grid must line up with the fine one (_precompute_grid
+    anchors both the same way and coarse_interval is a multiple of
+    interval), so every coarse shift is still available after narrowing
+    and the refined model is never less feasible than the coarse solution.
+    """
+    coarse = problem.with_interval(problem.coarse_interval)
+    coarse.coarse_interval = None
+    if problem.warm_start:
+        on_grid = {(d, t) for d in coarse.target_days for t in coarse.day_times(d)}
+        coarse.hints = {key for key in problem.hints if (key[0], key[1]) in on_grid}
+    elif problem.greedy_hint:
+        coarse.hints = set(greedy_schedule(coarse))
+    else:
+        coarse.hints = set()
+    coarse_diagnostics = diagnostics["coarse"] = {}
+    coarse_results, coarse_shortfalls = solve_problem(coarse, timeout, coarse_diagnostics, progress)
+
+    radius = problem.refine_radius or problem.coarse_interval
+    worker_row = {w_id: i for i, w_id in enumerate(problem.worker_ids)}
+    day_index  = {d: i for i, d in enumerate(problem.target_days)}
+    starts     = np.array(problem.start_times)
+
+    allowed = np.zeros_like(problem.blocked)
+    placed = {}
+    for row in coarse_results:
+        w_row = worker_row[row["user_id"]]
+        near = np.abs(starts - row["start_min"]) <= radius
+        allowed[w_row, day_index[row["day"]]] |= near
+        placed[row["user_id"]] = placed.get(row["user_id"], 0) + 1
+    for w_id, r_ids in problem.worker_roles.items():
+        if placed.get(w_id, 0) < problem.weekly_quota * len(r_ids):
+            allowed[worker_row[w_id]] = True
+
+    fine = copy.copy(problem)
+    fine.blocked = problem.blocked | ~allowed
+    # coarse hints are rough, whatever the coarse stage was seeded with:
+    # keep the full presolve for them (see _new_solver)
+    fine.warm_start = False
+    fine.hints = {
+        (row["day"], row["start_min"], row["room_id"], row["user_id"], row["role_id"])
+        for row in coarse_results
+    }
+    diagnostics["refine"] = {
+        "radius": radius,
+        "free_fraction": float((~fine.blocked).mean()) if fine.blocked.size else 0.0,
+    }
+    return fine, (coarse_results, coarse_shortfalls)
+
+
+# ----------------------------------------------------------------------
+# PHASE RACING
+# ----------------------------------------------------------------------
+def _race_phases(problem, timeout, phase_log, progress=None):
+    """
+    Solves the strict and partial models at the same time in two processes
+    instead of one after the other. The strict racer gets the sequential
+    Phase 1 + Phase 2 budget (3× timeout), the partial one Phase 3's (2×).
+
+    The outcome is decided as soon as either:
+    - strict finds a solution (it wins), or
+    - partial finds a solution with no shortfalls (equally complete), or
+    - partial proves its solution optimal with shortfalls, which proves
+      strict infeasible.
+    Otherwise it waits for both and falls back to partial. The other
+    process is terminated straight away.
+
+    Both racers report to the same progress component; see _RacerProgress
+    for which one is shown.
+
+    Returns the winning results, or None if neither found a solution.
+    """
+    context = multiprocessing.get_context()
+    outcomes = context.Queue()
+    strict_published, publish_lock = context.Event(), context.Lock()
+    # forked children must not share the parent's database sockets
+    connections.close_all()
+    racers = [
+        context.Process(
+            target=_race_phase,
+            args=(
+                _split_workers(problem, 2),
+                partial,
+                timeout * (2 if partial else 3),
+                outcomes,
+                _RacerProgress(progress, partial, strict_published, publish_lock) if progress else None,
+            ),
+            daemon=True,
+        )
+        for partial in (False, True)
+    ]
+    for racer in racers:
+        racer.start()
+
+    finished = {}
+    try:
+        while len(finished) < len(racers):
+            try:
+                partial, results, proven, racer_log = outcomes.get(timeout=1.0)
+            except queue.Empty:
+                if not any(racer.is_alive() for racer in racers):
+                    # a racer died without reporting
+                    break
+                continue
+
+            finished[partial] = results
+            phase_log.extend(racer_log)
+
+            if results is None:
+                continue
+            if not partial:
+                return results
+            if proven or not _compute_shortfalls(problem, results):
+                return results
+    finally:
+        for racer in racers:
+            if racer.is_alive():
+                racer.terminate()
+            racer.join()
+
+    if finished.get(False) is not None:
+        return finished[False]
+    return finished.get(True)
+
+
+class _RacerProgress:
+    """
+    Progress store for one racer, wrapping the shared one. Only one racer
+    publishes at a time, so the best-so-far shown (and accepted on a stop)
+    doesn't flip between the two models: the partial racer until the
+    strict racer has a solution, then only the strict one, whose result
+    wins the race in any case.
+    """
+
+    def __init__(self, progress, partial, strict_published, lock):
+        self.progress         = progress
+        self.partial          = partial
+        self.strict_published = strict_published
+        self.lock             = lock
+
+    def publish(self, update):
+        with self.lock:
+            if self.partial and self.strict_published.is_set():
+                return
+            if not self.partial:
+                self.strict_published.set()
+            self.progress.publish(update)
+
+    def stop_requested(self):
+        return self.progress.stop_requested()
+
+
+def _race_phase(problem, partial, timeout, outcomes, progress):
+    """
+    One racer process: builds and solves a single phase and reports
+    (partial, results, proven optimal, phase log) on the `outcomes` queue.
+    """
+    django.setup()
+    phase_log = []
+    name = "partial (raced)" if partial else "strict (raced)"
+    phase = _build_phase(problem, partial=partial)
+    status, results = _solve_phase(problem, phase, timeout, name, phase_log, progress)
+    outcomes.put((partial, results, status == cp_model.OPTIMAL, phase_log))
+
+
+# ----------------------------------------------------------------------
+# ROOM CLASSES
+# ----------------------------------------------------------------------
+def _class_capacity(problem):
+    """
+    Class representative → summed capacity of the class's rooms.
+    """
+    return {
+        rep: sum(problem.rooms[rm_id] for rm_id in members)
+        for rep, members in problem.room_classes.items()
+    }
+
+
+def _class_keys(problem, keys):
+    """
+    (day, start, room, worker, role) keys with each room replaced by its
+    class representative. Rooms outside the problem are dropped.
+    """
+    return {
+        (d, t, problem.room_class[rm_id], w_id, r_id)
+        for d, t, rm_id, w_id, r_id in keys
+        if rm_id in problem.room_class
+    }
+
+
+def _assign_class_rooms(problem, keys):
+    """
+    Turns class-level keys into concrete rooms. Per (day, class) shifts are
+    placed in start order on any free seat (one per unit of room capacity);
+    as when colouring an interval graph, this can't run out while the
+    class's pooled capacity holds. A shift keeps its hinted room if that
+    room has a free seat, so re-optimising moves as little as possible.
+    """
+    hinted_room = {(d, t, w_id, r_id): rm_id for d, t, rm_id, w_id, r_id in problem.hints}
+    seats = {}   # (d, class) → [[free from, room_id]], one per unit of capacity
+
+    assigned = []
+    for d, t, rep, w_id, r_id in sorted(keys, key=lambda key: (key[0], key[1])):
+        class_seats = seats.get((d, rep))
+        if class_seats is None:
+            class_seats = seats[(d, rep)] = [
+                [0, rm_id]
+                for rm_id in problem.room_classes[rep]
+                for _ in range(problem.rooms[rm_id])
+            ]
+        free = [seat for seat in class_seats if seat[0] <= t]
+        preferred = hinted_room.get((d, t, w_id, r_id))
+        seat = next((seat for seat in free if seat[1] == preferred), free[0])
+        seat[0] = t + problem.duration
+        assigned.append((d, t, seat[1], w_id, r_id))
+    return assigned
+
+
+# ----------------------------------------------------------------------
+# RESULT EXTRACTION
+# ----------------------------------------------------------------------
+def _result_row(problem, key):
+    d, t, rm_id, w_id, r_id = key
+    return {
+        "day": d,
+        "start_min": t,
+        "end_min": t + problem.duration,
+        "room_id": rm_id,
+        "user_id": w_id,
+        "role_id": r_id,
+    }
+
+
+def _extract(problem, solver, shifts):
+    chosen = [key for key, var in shifts.items() if solver.Value(var) == 1]
+    return [_result_row(problem, key) for key in _assign_class_rooms(problem, chosen)]
+
+
+def _compute_shortfalls(problem, results):
+    """
+    One entry per (worker, role) under quota. For a worker the pre-check
+    capped, "max_possible" (sessions across all their roles) is on their
+    first entry only, since it is not a per-role figure.
+    """
+    assigned_counts = {}
+    for r in results:
+        key = (r["user_id"], r["role_id"])
+        assigned_counts[key] = assigned_counts.get(key, 0) + 1
+
+    shortfalls = []
+    for w_id, r_ids in problem.worker_roles.items():
+        cap = problem.quota_caps.get(w_id)
+        for r_id in r_ids:
+            assigned = assigned_counts.get((w_id, r_id), 0)
+            if assigned < problem.weekly_quota:
+                shortfall = {
+                    "user_id":   w_id,
+                    "role_id":   r_id,
+                    "user_name": problem.user_name_map.get(w_id, f"Worker {w_id}"),
+                    "role_name": problem.role_name_map.get(r_id, f"Role {r_id}"),
+                    "assigned":  assigned,
+                    "quota":     problem.weekly_quota,
+                }
+                if cap is not None:
+                    shortfall["max_possible"] = cap
+                    cap = None
+                shortfalls.append(shortfall)
+    return shortfalls
+
+
+def generate_schedule(
+    team,
+    roles=None,
+    target_days=["sun", "mon", "tue", "wed", "thu", "fri"],
+    timeout=30.0,
+    config=None,
+    base_schedule_id=None,
+    diagnostics=None,
+    use_cache=True,
+    progress=None,
+):
+    """
+    Attempts to generate a full schedule. Falls back gracefully through three phases:
+
+    Phase 1 — Strict solve (original timeout):
+        Workers must meet exact weekly_quota. Fails fast if impossible.
+        Workers who can't reach it whatever the others do are capped at
+        their maximum up front and reported as shortfalls (see precheck).
+
+    Phase 2 — Extended solve (2x timeout, strict constraints):
+        Only runs if Phase 1 timed out (UNKNOWN). Skipped for INFEASIBLE.
+
+    Phase 3 — Partial solve (2x timeout, relaxed quota):
+        Runs if Phases 1+2 both failed. Quota becomes an upper bound instead of
+        a hard equality. The objective maximises total sessions scheduled first,
+        then quality — weighted into one objective, or with
+        config["partial_objective"] = "lexicographic" as two solves (sessions
+        with half the budget, then quality with at least that many sessions).
+        Returns a list of shortfalls describing what couldn't be filled.
+
+    If base_schedule_id is given, the shifts already on that schedule are
+    passed to every phase as solution hints, so a re-run after a small change
+    starts from the current schedule instead of from nothing.
+
+    With config["race_phases"], a team the pre-check can't rule out runs the
+    strict and partial models concurrently instead (see _race_phases), so an
+    infeasible team doesn't wait for Phases 1-2 before Phase 3 starts.
+
+    Roles that share no workers and no contested rooms are independent; each
+    such component runs through the three phases on its own, in parallel
+    processes, and the results and shortfalls are merged.
+
+    If a `diagnostics` dict is given it is filled with timings and sizes for
+    every stage: fetch (with query count), precompute, problem size,
+    decomposition, and per component the pre-check and each solved phase
+    (variables, constraints, presolve counts, status, objective, bound).
+    The same dict is logged at INFO level.
+
+    With config["coarse_interval"] (e.g. 60 with a 15-minute interval) each
+    component is first solved on the coarse grid, then re-solved on the
+    requested one near the coarse solution (see _refine_from_coarse).
+
+    With config["greedy_only"] the result comes from greedy_schedule() alone,
+    in well under a second, for quick previews. With config["greedy_hint"]
+    (and no base schedule) the greedy schedule seeds CP-SAT as its hint.
+
+    Results are cached by a fingerprint of the loaded inputs (see
+    solution_cache.py); an unchanged re-run returns the stored result
+    without solving. use_cache=False always solves (and refreshes the entry).
+
+    With a `progress` store (see PROGRESS), each improving solution is
+    published while solving, and a stop request ends the run early with the
+    best solution found so far; such a run is not cached.
+
+    Returns:
+        tuple(list[dict], list[dict]):
+            - results:    scheduled shifts (same schema as before)
+            - shortfalls: empty list on full success; otherwise one entry per
+                          worker/role that was under-quota, e.g.:
+                          {"user_name": "Alice", "role_name": "CHEM 151",
+                           "assigned": 1, "quota": 3}
+    """
+    if config is None:
+        config = DEFAULT_CONFIG
+    if diagnostics is None:
+        diagnostics = {}
+
+    started = time.perf_counter()
+    problem = load_problem(
+        team,
+        roles=roles,
+        target_days=target_days,
+        config=config,
+        base_schedule_id=base_schedule_id,
+        diagnostics=diagnostics,
+    )
+
+    if problem.greedy_only or (problem.greedy_hint and not problem.hints):
+        greedy_started = time.perf_counter()
+        greedy_keys = greedy_schedule(problem)
+        diagnostics["greedy"] = {
+            "seconds": time.perf_counter() - greedy_started,
+            "shifts": len(greedy_keys),
+        }
+        if problem.greedy_only:
+            results = [_result_row(problem, key) for key in greedy_keys]
+            diagnostics["total_seconds"] = time.perf_counter() - started
+            logger.info("auto-schedule team=%s diagnostics=%s", team.id, json.dumps(diagnostics))
+            return results, _compute_shortfalls(problem, results)
+        problem.hints = set(greedy_keys)
+
+    cache_key = solution_cache.fingerprint(problem, timeout)
+    cached = solution_cache.get(cache_key) if use_cache else None
+    diagnostics["cache"] = {"fingerprint": cache_key, "hit": cached is not None}
+    if cached is not None:
+        diagnostics["total_seconds"] = time.perf_counter() - started
+        logger.info("auto-schedule team=%s diagnostics=%s", team.id, json.dumps(diagnostics))
+        return cached
+
+    decompose_started = time.perf_counter()
+    components = find_components(problem)
+    diagnostics["decompose"] = {
+        "seconds": time.perf_counter() - decompose_started,
+        "components": len(components),
+    }
+
+    if len(components) > 1:
+        results, shortfalls, diagnostics["components"] = _solve_components(
+            problem, components, timeout, progress
+        )
+    else:
+        component_diagnostics = {}
+        results, shortfalls = solve_problem(problem, timeout, component_diagnostics, progress)
+        diagnostics["components"] = [component_diagnostics]
+
+    diagnostics["stopped"] = _stopped(progress)
+    if not diagnostics["stopped"]:
+        solution_cache.put(team.id, cache_key, results, shortfalls)
+
+    diagnostics["total_seconds"] = time.perf_counter() - started
+    logger.info("auto-schedule team=%s diagnostics=%s", team.id, json.dumps(diagnostics))
+    return results, shortfalls
+
+
+def solve_problem(problem, timeout=30.0, diagnostics=None, progress=None):
+    """
+    Runs the three solve phases described in generate_schedule() on an
+    already loaded problem. Touches no database, so it can run in a
+    worker process.
+
+    precheck() runs first. Workers it finds can't reach the quota are
+    capped at the most sessions they can take (problem.quota_caps), so
+    their shortfall is known up front and Phases 1 and 2 still solve
+    strictly for everyone else; each such worker's first shortfall carries a
+    "max_possible" entry. If a room or role issue proves the strict model
+    infeasible, Phases 1 and 2 are skipped.
+
+    If a `diagnostics` dict is given, the roles covered, the pre-check's
+    issues (rooms / role under "issues", capped workers under
+    "capped_workers") and every solved phase are recorded in it. After a stop request (see
+    PROGRESS) no further phase is started; if nothing had been found yet,
+    every worker is reported as a shortfall, so the run reads as partial.
+    """
+    if diagnostics is None:
+        diagnostics = {}
+    diagnostics["roles"] = list(problem.role_workers)
+
+    coarse = problem.coarse_interval
+    if coarse and coarse > problem.interval and coarse % problem.interval == 0:
+        problem, coarse_outcome = _refine_from_coarse(problem, timeout, diagnostics, progress)
+        if _stopped(progress):
+            # stopped during the coarse solve: its best is what was shown
+            return coarse_outcome
+
+    phase_log = diagnostics["phases"] = []
+
+    started = time.perf_counter()
+    issues = precheck(problem)
+    caps = {i["user_id"]: i["available"] for i in issues if i["kind"] == "worker"}
+    if caps:
+        problem = copy.copy(problem)
+        problem.quota_caps = caps
+    diagnostics["precheck"] = {
+        "seconds": time.perf_counter() - started,
+        "issues": [i for i in issues if i["kind"] != "worker"],
+        "capped_workers": [i for i in issues if i["kind"] == "worker"],
+    }
+    issues = diagnostics["precheck"]["issues"]
+
+    if not issues and problem.race_phases:
+        results = _race_phases(problem, timeout, phase_log, progress) or []
+        return results, _compute_shortfalls(problem, results)
+
+    if not issues:
+        # --- Phase 1: strict constraints, original timeout ---
+        phase = _build_phase(problem, partial=False)
+        status, results = _solve_phase(problem, phase, timeout, "strict", phase_log, progress)
+
+        if results is not None:
+            return results, _compute_shortfalls(problem, results)
+        if _stopped(progress):
+            return [], _compute_shortfalls(problem, [])
+
+        # --- Phase 2: strict constraints, extended timeout (only if we timed out) ---
+        # INFEASIBLE is provably unsolvable — extra time won't help. The model is
+        # unchanged from Phase 1, so it is simply solved again with more time.
+        if status == cp_model.UNKNOWN:
+            status, results = _solve_phase(
+                problem,
+                phase._replace(build_seconds=0.0),
+                timeout * 2,
+                "strict-extended",
+                phase_log,
+                progress,
+            )
+
+            if results is not None:
+                return results, _compute_shortfalls(problem, results)
+            if _stopped(progress):
+                return [], _compute_shortfalls(problem, [])
+
+    # --- Phase 3: relaxed constraints, maximise sessions scheduled ---
+    phase = _build_phase(problem, partial=True)
+    status, results = _solve_phase(problem, phase, timeout * 2, "partial", phase_log, progress)
+
+    if results is not None:
+        return results, _compute_shortfalls(problem, results)
 
-    # Truly unsolvable even partially (e.g., no rooms, no workers)
-    return [], []
\ No newline at end of file
+    # Stopped before a solution, or truly unsolvable even partially (e.g., no
+    # rooms): nobody got a session
+    return [], _compute_shortfalls(problem, [])
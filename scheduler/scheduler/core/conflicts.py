@@ -0,0 +1,84 @@
+'''
+conflicts.py
+
+In-memory conflict checks for saving a batch of shifts. The schedule's
+existing shifts are loaded once, and the batch is checked against them and
+against itself with a sweep line per (day, room) and per (day, user),
+instead of one capacity and one double-booking query per submitted shift.
+'''
+
+import heapq
+from collections import namedtuple
+
+# One shift on the sweep line, in minutes. `index` is the shift's position
+# in the submitted batch, or None for a shift already on the schedule.
+Booking = namedtuple("Booking", "day start end room_id user_id index")
+
+
+def _sweep(bookings):
+    '''
+    Yields (booking, active) in start order, where `active` is a list of
+    the earlier bookings still running when it starts. Bookings that end
+    exactly as another starts don't overlap it.
+    '''
+    running = []   # heap of (end, order, booking)
+    ordered = sorted(bookings, key=lambda b: (b.start, b.index is not None, b.index or 0))
+    for order, booking in enumerate(ordered):
+        while running and running[0][0] <= booking.start:
+            heapq.heappop(running)
+        yield booking, [entry[2] for entry in running]
+        heapq.heappush(running, (booking.end, order, booking))
+
+
+def _group(bookings, key):
+    groups = {}
+    for booking in bookings:
+        groups.setdefault(key(booking), []).append(booking)
+    return groups
+
+
+def over_capacity(existing, batch, capacities):
+    '''
+    Batch indexes of shifts that don't fit their room: one per shift that
+    arrives while the room already holds capacities[room_id] shifts. The
+    later arrival is blamed, ties going by submission order; when an
+    existing shift arrives in a full room, the latest-starting batch shift
+    running there is blamed instead.
+    '''
+    flagged = set()
+    rooms = _group(
+        [b for b in (*existing, *batch) if b.room_id in capacities],
+        key=lambda b: (b.day, b.room_id),
+    )
+    for (_, room_id), bookings in rooms.items():
+        capacity = capacities[room_id]
+        for booking, active in _sweep(bookings):
+            if len(active) < capacity:
+                continue
+            if booking.index is not None:
+                flagged.add(booking.index)
+                continue
+            blamed = [b for b in active if b.index is not None and b.index not in flagged]
+            if blamed:
+                flagged.add(max(blamed, key=lambda b: (b.start, b.index)).index)
+    return flagged
+
+
+def double_bookings(existing, batch):
+    '''
+    Batch index → another Booking for the same user that overlaps it
+    (an existing shift, or an earlier shift in the batch). At most one
+    clash is reported per batch shift.
+    '''
+    clashes = {}
+    users = _group((*existing, *batch), key=lambda b: (b.day, b.user_id))
+    for bookings in users.values():
+        if len(bookings) < 2:
+            continue
+        for booking, active in _sweep(bookings):
+            for other in active:
+                if booking.index is not None:
+                    clashes.setdefault(booking.index, other)
+                elif other.index is not None:
+                    clashes.setdefault(other.index, booking)
+    return clashes
@@ -0,0 +1,235 @@
+'''
+jobs.py
+
+Database-backed queue for auto-scheduler runs. Views enqueue an
+AutoScheduleJob and return immediately; the run_schedule_worker management
+command claims queued jobs one at a time and runs generate_schedule outside
+the gunicorn request cycle.
+
+Every run, inline or queued, is also recorded as a SolveRun. While a job
+runs, its best solution so far is kept in AutoScheduleProgress (see
+JobProgress), and a stop request ends it early with that solution.
+'''
+
+import threading
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import AutoScheduleJob, AutoScheduleProgress, SolveRun
+from .auto_scheduler import generate_schedule, DEFAULT_CONFIG
+
+# A job still marked running after this long belongs to a worker that died
+# mid-solve (three phases top out around 150s), so it is safe to hand out again.
+STALE_AFTER = timedelta(minutes=15)
+
+
+def enqueue_auto_schedule(team, user, engine_config, role=None, base_schedule=None):
+    '''
+    Queue an auto-schedule run and return the new job.
+    '''
+    return AutoScheduleJob.objects.create(
+        team=team,
+        requested_by=user,
+        config=engine_config,
+        role=role,
+        base_schedule=base_schedule,
+    )
+
+
+def request_stop(job):
+    '''
+    Ask for a job to finish early. A running job stops its solve and keeps
+    the best solution found so far; a queued one is failed straight away.
+    Returns the job as it stands afterwards.
+    '''
+    AutoScheduleJob.objects.filter(id=job.id).update(stop_requested=True)
+    AutoScheduleJob.objects.filter(id=job.id, status=AutoScheduleJob.STATUS_QUEUED).update(
+        status=AutoScheduleJob.STATUS_FAILED,
+        error="Stopped before it started",
+        finished_at=timezone.now(),
+    )
+    job.refresh_from_db()
+    return job
+
+
+def best_so_far(job):
+    '''
+    The running job's best solution so far, merged across components, or
+    None before the first solution.
+    '''
+    rows = list(job.progress.order_by("component"))
+    if not rows:
+        return None
+    return {
+        "phases": [row.phase for row in rows],
+        "objective": sum(row.objective for row in rows),
+        "gap": max(row.gap for row in rows),
+        "solutions": sum(row.solutions for row in rows),
+        "shifts": [shift for row in rows for shift in row.shifts],
+        "updated_at": max(row.updated_at for row in rows),
+    }
+
+
+class JobProgress:
+    '''
+    Database-backed progress store for generate_schedule (see the PROGRESS
+    section of auto_scheduler.py). Holds only ids, so it pickles into the
+    component worker processes; each component writes its own row.
+    '''
+
+    def __init__(self, job_id, component=0):
+        self.job_id = job_id
+        self.component = component
+
+    def for_component(self, component):
+        return JobProgress(self.job_id, component)
+
+    def publish(self, update):
+        AutoScheduleProgress.objects.update_or_create(
+            job_id=self.job_id, component=self.component, defaults=update
+        )
+
+    def stop_requested(self):
+        return AutoScheduleJob.objects.filter(id=self.job_id, stop_requested=True).exists()
+
+
+def claim_next_job():
+    '''
+    Atomically move the oldest queued job to running and return it, or None
+    if the queue is empty. The claim is a conditional UPDATE, so two workers
+    racing for the same row can't both win, on SQLite or PostgreSQL alike.
+    '''
+    while True:
+        job = (
+            AutoScheduleJob.objects.filter(status=AutoScheduleJob.STATUS_QUEUED)
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+
+        claimed = AutoScheduleJob.objects.filter(
+            id=job.id, status=AutoScheduleJob.STATUS_QUEUED
+        ).update(status=AutoScheduleJob.STATUS_RUNNING, started_at=timezone.now())
+
+        if claimed:
+            job.refresh_from_db()
+            return job
+        # another worker got there first; try the next one
+
+
+def requeue_stale_jobs():
+    '''
+    Put jobs left running by a crashed or restarted worker back in the queue.
+    Returns how many were requeued.
+    '''
+    cutoff = timezone.now() - STALE_AFTER
+    return AutoScheduleJob.objects.filter(
+        status=AutoScheduleJob.STATUS_RUNNING, started_at__lt=cutoff
+    ).update(status=AutoScheduleJob.STATUS_QUEUED, started_at=None)
+
+
+def run_job(job):
+    '''
+    Solve a claimed job and store its result (or error) on the row.
+    '''
+    roles = [job.role_id] if job.role_id else None
+    diagnostics = {}
+    results, shortfalls = [], []
+
+    try:
+        results, shortfalls = generate_schedule(
+            job.team,
+            roles=roles,
+            config=job.config,
+            base_schedule_id=job.base_schedule_id,
+            diagnostics=diagnostics,
+            progress=JobProgress(job.id),
+        )
+    except Exception as e:
+        job.status = AutoScheduleJob.STATUS_FAILED
+        job.error = str(e)
+    else:
+        job.status = AutoScheduleJob.STATUS_DONE
+        job.result = {
+            "shifts": results,
+            "partial": len(shortfalls) > 0,
+            "shortfalls": shortfalls,
+            "stopped": diagnostics.get("stopped", False),
+            "diagnostics": diagnostics,
+        }
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "result", "error", "finished_at"])
+    job.progress.all().delete()
+
+    # already off the request path, so recorded inline
+    record_solve_run(
+        job.team_id,
+        job.config,
+        diagnostics,
+        results,
+        shortfalls,
+        source=SolveRun.SOURCE_JOB,
+        error=job.error,
+    )
+    return job
+
+
+def record_solve_run(
+    team_id, engine_config, diagnostics, results, shortfalls, source=SolveRun.SOURCE_INLINE, error=""
+):
+    '''
+    Store one auto-scheduler invocation as a SolveRun.
+    '''
+    config = {**DEFAULT_CONFIG, **(engine_config or {})}
+    problem = diagnostics.get("problem", {})
+
+    if error:
+        status = SolveRun.STATUS_ERROR
+    elif not results:
+        status = SolveRun.STATUS_EMPTY
+    elif shortfalls:
+        status = SolveRun.STATUS_PARTIAL
+    else:
+        status = SolveRun.STATUS_COMPLETE
+
+    return SolveRun.objects.create(
+        team_id=team_id,
+        source=source,
+        duration=config["duration"],
+        interval=config["interval"],
+        weekly_quota=config["weekly_quota"],
+        daily_max=config["daily_max"],
+        max_concurrent=config["max_concurrent"],
+        config=config,
+        workers=problem.get("workers", 0),
+        roles=problem.get("roles", 0),
+        rooms=problem.get("rooms", 0),
+        start_times=problem.get("start_times", 0),
+        status=status,
+        shift_count=len(results),
+        shortfall_count=len(shortfalls),
+        total_seconds=diagnostics.get("total_seconds"),
+        diagnostics=diagnostics,
+        error=error,
+    )
+
+
+def record_solve_run_in_background(*args, **kwargs):
+    '''
+    record_solve_run() on a daemon thread, so an inline auto-schedule
+    response isn't held up by the insert. A failed insert only loses the
+    record; the thread closes its own database connection.
+    '''
+    def target():
+        try:
+            record_solve_run(*args, **kwargs)
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,55 @@
+'''
+management/commands/run_schedule_worker.py
+
+Long-running worker that drains the AutoScheduleJob queue:
+
+    python manage.py run_schedule_worker
+'''
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from ...jobs import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run queued auto-schedule jobs outside the web process."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between checks when the queue is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process whatever is queued, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        self.stdout.write("Auto-schedule worker started.")
+        try:
+            while True:
+                close_old_connections()
+                job = claim_next_job()
+
+                if job is None:
+                    if options["once"]:
+                        break
+                    requeue_stale_jobs()
+                    time.sleep(options["poll"])
+                    continue
+
+                self.stdout.write(f"Running job #{job.id} for {job.team.name}...")
+                run_job(job)
+                self.stdout.write(f"Job #{job.id} {job.status}.")
+        except KeyboardInterrupt:
+            self.stdout.write("Worker stopped.")
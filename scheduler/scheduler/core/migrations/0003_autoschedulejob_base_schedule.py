@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_autoschedulejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autoschedulejob',
+            name='base_schedule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.schedule'),
+        ),
+    ]
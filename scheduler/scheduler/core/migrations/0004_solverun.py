@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:57
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_autoschedulejob_base_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SolveRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('inline', 'Inline request'), ('job', 'Background job')], default='inline', max_length=10)),
+                ('duration', models.IntegerField()),
+                ('interval', models.IntegerField()),
+                ('weekly_quota', models.IntegerField()),
+                ('daily_max', models.IntegerField()),
+                ('max_concurrent', models.IntegerField()),
+                ('config', models.JSONField(default=dict)),
+                ('workers', models.IntegerField(default=0)),
+                ('roles', models.IntegerField(default=0)),
+                ('rooms', models.IntegerField(default=0)),
+                ('start_times', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('complete', 'Complete'), ('partial', 'Partial'), ('empty', 'No solution'), ('error', 'Error')], max_length=10)),
+                ('shift_count', models.IntegerField(default=0)),
+                ('shortfall_count', models.IntegerField(default=0)),
+                ('total_seconds', models.FloatField(blank=True, null=True)),
+                ('diagnostics', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='solve_runs', to='core.team')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
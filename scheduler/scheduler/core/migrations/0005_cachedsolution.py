@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:58
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_solverun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedSolution',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('results', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('shortfalls', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('hits', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('team', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cached_solutions', to='core.team')),
+            ],
+        ),
+    ]
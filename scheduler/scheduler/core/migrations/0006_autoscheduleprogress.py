@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:59
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_cachedsolution'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autoschedulejob',
+            name='stop_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='AutoScheduleProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('component', models.IntegerField(default=0)),
+                ('phase', models.CharField(max_length=30)),
+                ('objective', models.FloatField()),
+                ('best_bound', models.FloatField()),
+                ('gap', models.FloatField()),
+                ('solutions', models.IntegerField(default=0)),
+                ('shifts', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='core.autoschedulejob')),
+            ],
+            options={
+                'unique_together': {('job', 'component')},
+            },
+        ),
+    ]
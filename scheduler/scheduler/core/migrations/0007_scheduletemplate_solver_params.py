@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_autoscheduleprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scheduletemplate',
+            name='log_search_progress',
+            field=models.BooleanField(default=False, help_text="Log CP-SAT's search to the server log"),
+        ),
+        migrations.AddField(
+            model_name='scheduletemplate',
+            name='max_deterministic_time',
+            field=models.FloatField(blank=True, help_text='Work limit per phase in deterministic seconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduletemplate',
+            name='num_workers',
+            field=models.IntegerField(blank=True, help_text='Parallel search workers', null=True),
+        ),
+        migrations.AddField(
+            model_name='scheduletemplate',
+            name='random_seed',
+            field=models.IntegerField(blank=True, help_text='Fix for reproducible solves', null=True),
+        ),
+    ]
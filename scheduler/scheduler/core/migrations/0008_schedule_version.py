@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_scheduletemplate_solver_params'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedule',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
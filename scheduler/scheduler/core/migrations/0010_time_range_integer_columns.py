@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:33
+
+import scheduler.core.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_schedule_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fixedobstruction',
+            name='end_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('end_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='fixedobstruction',
+            name='start_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('start_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='obstructionday',
+            name='day_idx',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(day='sun', then=models.Value(0)), models.When(day='mon', then=models.Value(1)), models.When(day='tue', then=models.Value(2)), models.When(day='wed', then=models.Value(3)), models.When(day='thu', then=models.Value(4)), models.When(day='fri', then=models.Value(5)), models.When(day='sat', then=models.Value(6)), output_field=models.SmallIntegerField()), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='preferredtime',
+            name='day_idx',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(day='sun', then=models.Value(0)), models.When(day='mon', then=models.Value(1)), models.When(day='tue', then=models.Value(2)), models.When(day='wed', then=models.Value(3)), models.When(day='thu', then=models.Value(4)), models.When(day='fri', then=models.Value(5)), models.When(day='sat', then=models.Value(6)), output_field=models.SmallIntegerField()), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='preferredtime',
+            name='end_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('end_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='preferredtime',
+            name='start_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('start_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='roomavailability',
+            name='day_idx',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(day='sun', then=models.Value(0)), models.When(day='mon', then=models.Value(1)), models.When(day='tue', then=models.Value(2)), models.When(day='wed', then=models.Value(3)), models.When(day='thu', then=models.Value(4)), models.When(day='fri', then=models.Value(5)), models.When(day='sat', then=models.Value(6)), output_field=models.SmallIntegerField()), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='roomavailability',
+            name='end_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('end_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='roomavailability',
+            name='start_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('start_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='day_idx',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(day='sun', then=models.Value(0)), models.When(day='mon', then=models.Value(1)), models.When(day='tue', then=models.Value(2)), models.When(day='wed', then=models.Value(3)), models.When(day='thu', then=models.Value(4)), models.When(day='fri', then=models.Value(5)), models.When(day='sat', then=models.Value(6)), output_field=models.SmallIntegerField()), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='end_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('end_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='shift',
+            name='start_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('start_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='unavailabilityrange',
+            name='day_idx',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(day='sun', then=models.Value(0)), models.When(day='mon', then=models.Value(1)), models.When(day='tue', then=models.Value(2)), models.When(day='wed', then=models.Value(3)), models.When(day='thu', then=models.Value(4)), models.When(day='fri', then=models.Value(5)), models.When(day='sat', then=models.Value(6)), output_field=models.SmallIntegerField()), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='unavailabilityrange',
+            name='end_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('end_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='unavailabilityrange',
+            name='start_min',
+            field=models.GeneratedField(db_persist=True, expression=scheduler.core.models.MinuteOfDay('start_time'), output_field=models.SmallIntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='preferredtime',
+            index=models.Index(fields=['team', 'user', 'day_idx'], name='preferred_team_user_day'),
+        ),
+        migrations.AddIndex(
+            model_name='roomavailability',
+            index=models.Index(fields=['room', 'day_idx'], name='roomavail_room_day'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['schedule', 'day_idx', 'room'], name='shift_schedule_day_room'),
+        ),
+        migrations.AddIndex(
+            model_name='unavailabilityrange',
+            index=models.Index(fields=['team', 'user', 'day_idx'], name='unavail_team_user_day'),
+        ),
+    ]
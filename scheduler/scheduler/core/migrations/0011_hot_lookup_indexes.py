@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_time_range_integer_columns'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shift',
+            name='shift_schedule_day_room',
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['schedule', 'day_idx', 'room', 'start_min'], name='shift_sched_day_room_start'),
+        ),
+        migrations.AddIndex(
+            model_name='shift',
+            index=models.Index(fields=['schedule', 'user', 'day_idx', 'start_min'], name='shift_sched_user_day_start'),
+        ),
+        migrations.AddIndex(
+            model_name='teamroleassignment',
+            index=models.Index(fields=['team', 'role'], name='assignment_team_role'),
+        ),
+    ]
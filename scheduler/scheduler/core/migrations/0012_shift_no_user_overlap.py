@@ -0,0 +1,91 @@
+from django.db import migrations
+
+# PostgreSQL only: a GiST exclusion constraint so a user's shifts on one
+# schedule and day can never overlap, whoever writes them. The ranges are
+# built from the generated start_min / end_min columns (migration 0010), so
+# the times aren't stored a second time. SQLite (development) has no
+# exclusion constraints; there the views' check under the schedule lock is
+# the guard (see views/schedules.py). Done in RunPython rather than
+# django.contrib.postgres operations, which need psycopg even on SQLite.
+#
+# The constraint is DEFERRABLE INITIALLY IMMEDIATE: single writes are checked
+# as they happen, while a save that rewrites several shifts defers it to the
+# end (SET CONSTRAINTS ... DEFERRED), so two shifts can swap times.
+# Overlapping shifts already in the table would make ADD CONSTRAINT fail, so
+# the migration first looks for them and stops with a list to fix by hand.
+#
+# An earlier version of this migration, numbered 0009, kept its own generated
+# "minutes" range column for the constraint; a database that ran it loses
+# that column and gets the constraint rebuilt here.
+
+# pairs of one user's shifts that overlap on a schedule and day
+OVERLAPS_SQL = """
+    SELECT a.schedule_id, a.user_id, a.day, a.id, b.id
+    FROM core_shift a
+    JOIN core_shift b
+      ON b.schedule_id = a.schedule_id AND b.user_id = a.user_id AND b.day = a.day
+     AND b.id > a.id AND b.start_time < a.end_time AND a.start_time < b.end_time
+    ORDER BY a.schedule_id, a.user_id, a.day, a.id, b.id
+"""
+
+# how many pairs the error lists
+OVERLAPS_SHOWN = 20
+
+FORWARD_SQL = [
+    # for the = operators on plain columns in a GiST index
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    # left by the earlier 0009, see above
+    "ALTER TABLE core_shift DROP CONSTRAINT IF EXISTS core_shift_no_user_overlap",
+    "ALTER TABLE core_shift DROP COLUMN IF EXISTS minutes",
+    """
+    ALTER TABLE core_shift ADD CONSTRAINT core_shift_no_user_overlap EXCLUDE USING gist (
+        schedule_id WITH =, user_id WITH =, day WITH =, (int4range(start_min, end_min)) WITH &&
+    ) DEFERRABLE INITIALLY IMMEDIATE
+    """,
+]
+
+REVERSE_SQL = [
+    "ALTER TABLE core_shift DROP CONSTRAINT IF EXISTS core_shift_no_user_overlap",
+]
+
+
+def _check_no_overlaps(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(OVERLAPS_SQL)
+        overlaps = cursor.fetchall()
+    if not overlaps:
+        return
+    lines = [
+        f"  schedule {schedule_id}, user {user_id}, {day}: shifts {first} and {second}"
+        for schedule_id, user_id, day, first, second in overlaps[:OVERLAPS_SHOWN]
+    ]
+    if len(overlaps) > OVERLAPS_SHOWN:
+        lines.append(f"  ... and {len(overlaps) - OVERLAPS_SHOWN} more")
+    raise RuntimeError(
+        f"{len(overlaps)} pair(s) of shifts double-book a worker; move or delete one "
+        "of each pair, then run the migration again:\n" + "\n".join(lines)
+    )
+
+
+def _run_on_postgres(statements, check_overlaps=False):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        if check_overlaps:
+            _check_no_overlaps(schema_editor.connection)
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run_on_postgres(FORWARD_SQL, check_overlaps=True), _run_on_postgres(REVERSE_SQL)
+        ),
+    ]
@@ -7,6 +7,7 @@ the Coorda web-app
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 import uuid
 
 DAY_CHOICES = [
@@ -19,6 +20,57 @@ DAY_CHOICES = [
         ("sat", "Saturday"),
 ]
 
+
+class MinuteOfDay(models.Func):
+    '''
+    Minutes since midnight of a TimeField, written in plain SQL for each
+    backend so it can be a generated column expression (Django's Extract
+    functions call a Python-registered function on SQLite).
+    '''
+    arity = 1
+    output_field = models.SmallIntegerField()
+    template = (
+        "CAST(EXTRACT(HOUR FROM %(expressions)s) * 60 "
+        "+ EXTRACT(MINUTE FROM %(expressions)s) AS smallint)"
+    )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template=(
+                "(CAST(substr(%(expressions)s, 1, 2) AS integer) * 60 "
+                "+ CAST(substr(%(expressions)s, 4, 2) AS integer))"
+            ),
+            **extra_context,
+        )
+
+
+def day_index_field():
+    '''
+    Stored column holding `day` as 0 (sun) to 6 (sat), kept up to date by
+    the database on every write, bulk ones included.
+    '''
+    return models.GeneratedField(
+        expression=models.Case(
+            *[models.When(day=day, then=models.Value(i)) for i, (day, _) in enumerate(DAY_CHOICES)],
+            output_field=models.SmallIntegerField(),
+        ),
+        output_field=models.SmallIntegerField(),
+        db_persist=True,
+    )
+
+
+def minute_field(time_field):
+    '''
+    Stored column holding `time_field` as minutes since midnight.
+    '''
+    return models.GeneratedField(
+        expression=MinuteOfDay(time_field),
+        output_field=models.SmallIntegerField(),
+        db_persist=True,
+    )
+
 class Team(models.Model):
     '''
     Table for Team objects that are the backbone of the app. Each team
@@ -115,6 +167,10 @@ class Schedule(models.Model):
     # allows to have draft schedules
     is_active = models.BooleanField(default=False)
 
+    # bumped on every change to its shifts; patch saves send the version
+    # they started from and are rejected if it has moved on
+    version = models.PositiveIntegerField(default=0)
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -156,6 +212,25 @@ class Shift(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    # day and times as integers, derived by the database; read these
+    # instead of converting the times row by row
+    day_idx = day_index_field()
+    start_min = minute_field("start_time")
+    end_min = minute_field("end_time")
+
+    # the room and the user overlap lookups: equality on the first three
+    # columns, then a range on start_min. Also serve schedule+day and
+    # schedule+user prefixes (room bookings, warm-start shifts).
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["schedule", "day_idx", "room", "start_min"], name="shift_sched_day_room_start"
+            ),
+            models.Index(
+                fields=["schedule", "user", "day_idx", "start_min"], name="shift_sched_user_day_start"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.role} ({self.day})"
 
@@ -207,6 +282,16 @@ class PreferredTime(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    # derived by the database, as on Shift
+    day_idx = day_index_field()
+    start_min = minute_field("start_time")
+    end_min = minute_field("end_time")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["team", "user", "day_idx"], name="preferred_team_user_day"),
+        ]
+
     def __str__(self):
         return f"{self.user.username}: preferred {self.day} {self.start_time}-{self.end_time}"
 
@@ -229,6 +314,11 @@ class TeamRoleAssignment(models.Model):
         RoleSection, on_delete=models.SET_NULL, null=True, blank=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["team", "role"], name="assignment_team_role"),
+        ]
+
 
 class TeamEvent(models.Model):
     '''
@@ -265,6 +355,10 @@ class FixedObstruction(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    # derived by the database, as on Shift; the days are on ObstructionDay
+    start_min = minute_field("start_time")
+    end_min = minute_field("end_time")
+
     def __str__(self):
         return f"{self.name} ({self.role.name if self.role else 'No Role'})"
 
@@ -275,6 +369,7 @@ class ObstructionDay(models.Model):
     '''
     # limited choice for days
     day = models.CharField(max_length=3, choices=DAY_CHOICES)
+    day_idx = day_index_field()
     
     # obstruction it is associated with
     obstruction = models.ForeignKey(
@@ -301,6 +396,16 @@ class RoomAvailability(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+    # derived by the database, as on Shift
+    day_idx = day_index_field()
+    start_min = minute_field("start_time")
+    end_min = minute_field("end_time")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "day_idx"], name="roomavail_room_day"),
+        ]
+
     def __str__(self):
         return f"{self.room.name} ({self.day}): {self.start_time}-{self.end_time}"
 
@@ -321,11 +426,21 @@ class UnavailabilityRange(models.Model):
     # how long it they're busy for
     start_time = models.TimeField()
     end_time = models.TimeField()
+
+    # derived by the database, as on Shift
+    day_idx = day_index_field()
+    start_min = minute_field("start_time")
+    end_min = minute_field("end_time")
     
     # where and what they are doing at this time
     building = models.CharField(max_length=100, blank=True)
     eventName = models.CharField(max_length=100, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["team", "user", "day_idx"], name="unavail_team_user_day"),
+        ]
+
     def __str__(self):
         return f"{self.user.username}: {self.day} {self.start_time}-{self.end_time}"
     
@@ -346,9 +461,174 @@ class ScheduleTemplate(models.Model):
     daily_max = models.IntegerField(default=1, help_text="Max shifts per day per worker")
     max_concurrent = models.IntegerField(default=1, help_text="Max workers scheduled at the exact same time")
 
+    # Solver (CP-SAT) tuning; blank means the server default. The server caps
+    # workers and deterministic time (AUTO_SCHEDULER_MAX_* settings).
+    num_workers = models.IntegerField(null=True, blank=True, help_text="Parallel search workers")
+    random_seed = models.IntegerField(null=True, blank=True, help_text="Fix for reproducible solves")
+    max_deterministic_time = models.FloatField(
+        null=True, blank=True, help_text="Work limit per phase in deterministic seconds"
+    )
+    log_search_progress = models.BooleanField(default=False, help_text="Log CP-SAT's search to the server log")
+
     def __str__(self):
         return f"{self.name} ({self.team.name})"
 
+class AutoScheduleJob(models.Model):
+    '''
+    A queued auto-scheduler run. The web request only creates the row; a
+    separate worker process (manage.py run_schedule_worker) picks it up,
+    solves it, and stores the result here for the scheduler page to poll.
+    Because the queue lives in the database, jobs survive gunicorn restarts.
+    '''
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name="auto_schedule_jobs")
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name="auto_schedule_jobs"
+    )
+
+    # engine config as passed to generate_schedule, plus the role being scheduled
+    config = models.JSONField(default=dict)
+    role = models.ForeignKey(Role, on_delete=models.SET_NULL, null=True, blank=True)
+
+    # "reoptimize from current": existing schedule whose shifts seed the solver
+    base_schedule = models.ForeignKey(
+        Schedule, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    # set by the "accept current best" button; the worker stops the solve and
+    # finishes the job with the best solution found so far
+    stop_requested = models.BooleanField(default=False)
+
+    # {"shifts": [...], "partial": bool, "shortfalls": [...]} once done
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Auto-schedule #{self.id} ({self.team.name}) - {self.status}"
+
+
+class AutoScheduleProgress(models.Model):
+    '''
+    Best solution found so far by a running job, one row per independent
+    component (see auto_scheduler.find_components), overwritten each time
+    the solver improves on it. Lets the scheduler page show, and accept,
+    a schedule before the solve finishes.
+    '''
+    job = models.ForeignKey(AutoScheduleJob, on_delete=models.CASCADE, related_name="progress")
+    component = models.IntegerField(default=0)
+
+    phase = models.CharField(max_length=30)
+    objective = models.FloatField()
+    best_bound = models.FloatField()
+    # |bound - objective| / |objective|: how far from proven optimal
+    gap = models.FloatField()
+    solutions = models.IntegerField(default=0)
+    shifts = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [("job", "component")]
+
+    def __str__(self):
+        return f"Progress for job #{self.job_id}, component {self.component}"
+
+
+class SolveRun(models.Model):
+    '''
+    One auto-scheduler invocation, inline or queued, kept for tracking solve
+    times across teams and semesters. Written after the response has been
+    sent (see jobs.record_solve_run_in_background), never on the request path.
+    '''
+    STATUS_COMPLETE = "complete"
+    STATUS_PARTIAL = "partial"
+    STATUS_EMPTY = "empty"
+    STATUS_ERROR = "error"
+    STATUS_CHOICES = [
+        (STATUS_COMPLETE, "Complete"),
+        (STATUS_PARTIAL, "Partial"),
+        (STATUS_EMPTY, "No solution"),
+        (STATUS_ERROR, "Error"),
+    ]
+
+    SOURCE_INLINE = "inline"
+    SOURCE_JOB = "job"
+    SOURCE_CHOICES = [
+        (SOURCE_INLINE, "Inline request"),
+        (SOURCE_JOB, "Background job"),
+    ]
+
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name="solve_runs")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_INLINE)
+
+    # engine config, split out so runs can be filtered and compared
+    duration = models.IntegerField()
+    interval = models.IntegerField()
+    weekly_quota = models.IntegerField()
+    daily_max = models.IntegerField()
+    max_concurrent = models.IntegerField()
+    config = models.JSONField(default=dict)
+
+    # input sizes
+    workers = models.IntegerField(default=0)
+    roles = models.IntegerField(default=0)
+    rooms = models.IntegerField(default=0)
+    start_times = models.IntegerField(default=0)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    shift_count = models.IntegerField(default=0)
+    shortfall_count = models.IntegerField(default=0)
+    total_seconds = models.FloatField(null=True, blank=True)
+
+    # generate_schedule() diagnostics: per-stage timings and phase stats
+    diagnostics = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Solve run #{self.id} ({self.team.name}) - {self.status}"
+
+
+class CachedSolution(models.Model):
+    '''
+    A generate_schedule() result keyed by a fingerprint of everything it was
+    computed from (see solution_cache.py). Any change to assignments,
+    availability, rooms, preferences or config changes the fingerprint, so
+    entries are never invalidated explicitly; the least recently used are
+    evicted once the table is full.
+    '''
+    fingerprint = models.CharField(max_length=64, unique=True)
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name="cached_solutions")
+
+    results = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    shortfalls = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Cached solution {self.fingerprint[:12]} ({self.team.name})"
+
 class AttendeeResponseLink(models.Model):
     team = models.OneToOneField(Team, on_delete=models.CASCADE, related_name='response_link')
     token = models.UUIDField(default=uuid.uuid4, unique=True)
@@ -0,0 +1,109 @@
+'''
+solution_cache.py
+
+Result cache for generate_schedule. A run is keyed by a SHA-256 fingerprint
+of its normalised inputs (assignments, names, rooms and their availability,
+busy ranges, obstructions, preferred times, warm-start hints, config and
+timeout), so pressing "auto-schedule" again with unchanged data returns the
+stored result instead of paying for another CP-SAT solve. Editing any input
+changes the fingerprint, which is all the invalidation the cache needs.
+'''
+
+import hashlib
+import json
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CachedSolution
+
+# Bump when a solver change should make old results stale.
+ENGINE_VERSION = 4
+
+# Entries kept across all teams; the least recently used go first.
+MAX_ENTRIES = 200
+
+
+def fingerprint(problem, timeout):
+    '''
+    Stable hash of a loaded SchedulingProblem's raw inputs. Everything is
+    sorted, so the query order of the underlying rows doesn't matter.
+    '''
+    def ranges(mapping):
+        return sorted([*key, sorted(value)] for key, value in mapping.items())
+
+    payload = {
+        "engine": ENGINE_VERSION,
+        "timeout": timeout,
+        "config": {
+            "duration": problem.duration,
+            "interval": problem.interval,
+            "weekly_quota": problem.weekly_quota,
+            "daily_max": problem.daily_max,
+            "max_concurrent": problem.max_concurrent,
+            "two_stage": problem.two_stage,
+            "backend": problem.backend,
+            "race_phases": problem.race_phases,
+            "partial_objective": problem.partial_objective,
+            "greedy_hint": problem.greedy_hint,
+            "coarse_interval": problem.coarse_interval,
+            "refine_radius": problem.refine_radius,
+            # log_search_progress doesn't change the result
+            "num_workers": problem.num_workers,
+            "random_seed": problem.random_seed,
+            "max_deterministic_time": problem.max_deterministic_time,
+        },
+        "days": problem.target_days,
+        "assignments": sorted(
+            [w_id, r_id] for w_id, r_ids in problem.worker_roles.items() for r_id in r_ids
+        ),
+        "users": sorted(problem.user_name_map.items()),
+        "roles": sorted(problem.role_name_map.items()),
+        "rooms": sorted(problem.rooms.items()),
+        "room_windows": ranges(problem.room_windows),
+        "busy": ranges(problem.busy),
+        "preferred": ranges(problem.preferred),
+        "obstructions": sorted(
+            [r_id, sorted(days), start, end] for r_id, days, start, end in problem.obstructions
+        ),
+        "hints": sorted(problem.hints),
+        "warm_start": problem.warm_start,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def get(key):
+    '''
+    (results, shortfalls) stored under `key`, or None. A hit marks the entry
+    as recently used.
+    '''
+    entry = CachedSolution.objects.filter(fingerprint=key).first()
+    if entry is None:
+        return None
+
+    CachedSolution.objects.filter(id=entry.id).update(
+        hits=F("hits") + 1, last_used_at=timezone.now()
+    )
+    return entry.results, entry.shortfalls
+
+
+def put(team_id, key, results, shortfalls):
+    '''
+    Store a result, then evict the least recently used entries beyond
+    MAX_ENTRIES.
+    '''
+    CachedSolution.objects.update_or_create(
+        fingerprint=key,
+        defaults={
+            "team_id": team_id,
+            "results": results,
+            "shortfalls": shortfalls,
+            "last_used_at": timezone.now(),
+        },
+    )
+
+    stale = CachedSolution.objects.order_by("-last_used_at").values_list("id", flat=True)[MAX_ENTRIES:]
+    stale_ids = list(stale)
+    if stale_ids:
+        CachedSolution.objects.filter(id__in=stale_ids).delete()
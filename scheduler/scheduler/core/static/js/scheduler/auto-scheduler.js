@@ -65,15 +65,31 @@ function toggleTemplateNameInput (checkbox) {
 // TEMPLATE HANDLING
 // ---------------------------------------------------------
 
+/**
+ * Fills in the modal's solver settings inputs. A setting the template doesn't
+ * have (null or missing) leaves its input blank, i.e. the server default.
+ *
+ * @param {Object} settings - numWorkers, randomSeed, maxDeterministicTime and logSearchProgress.
+ */
+function setSolverSettings (settings) {
+  document.getElementById('configNumWorkers').value = settings.numWorkers ?? ''
+  document.getElementById('configRandomSeed').value = settings.randomSeed ?? ''
+  document.getElementById('configMaxDeterministicTime').value = settings.maxDeterministicTime ?? ''
+  document.getElementById('configLogSearchProgress').checked = !!settings.logSearchProgress
+}
+
 /**
  * Loads a specific configuration template into the modal's input fields.
- * If no valid template ID is provided (e.g., "Custom" is selected), it does nothing.
+ * If no valid template ID is provided (e.g., "Custom" is selected), the shift
+ * parameters are left for the user to edit and the solver settings are reset
+ * to the server defaults.
  *
  * @param {string|number} templateId - The unique identifier of the template to load from `SAVED_TEMPLATES`.
  */
 function loadTemplate (templateId) {
   if (!templateId || !SAVED_TEMPLATES[templateId]) {
-    // "Custom Configuration" selected, do nothing and let them edit
+    // "Custom Configuration" selected, let them edit
+    setSolverSettings({})
     return
   }
 
@@ -83,6 +99,7 @@ function loadTemplate (templateId) {
   document.getElementById('configWeeklyQuota').value = tpl.weeklyQuota
   document.getElementById('configDailyMax').value = tpl.dailyMax
   document.getElementById('configMaxConcurrent').value = tpl.maxConcurrent
+  setSolverSettings(tpl)
 
   // Uncheck the save box since they are using an existing template
   document.getElementById('saveAsTemplateCheck').checked = false
@@ -100,7 +117,11 @@ function setupCustomListeners () {
     'configInterval',
     'configWeeklyQuota',
     'configDailyMax',
-    'configMaxConcurrent'
+    'configMaxConcurrent',
+    'configNumWorkers',
+    'configRandomSeed',
+    'configMaxDeterministicTime',
+    'configLogSearchProgress'
   ]
   inputIds.forEach(id => {
     const el = document.getElementById(id)
@@ -119,11 +140,26 @@ document.addEventListener('DOMContentLoaded', setupCustomListeners)
 // EXECUTION LOGIC
 // ---------------------------------------------------------
 
+/**
+ * Reads an optional numeric input from the modal.
+ *
+ * @param {string} id - The input's element id.
+ * @returns {number|null} The value, or null when the input is blank.
+ */
+function optionalNumber (id) {
+  const value = document.getElementById(id).value
+  return value === '' ? null : Number(value)
+}
+
 /**
  * Formats the shortfall report returned from a partial schedule into a human-readable string.
  * Groups shortfalls by worker and lists sessions assigned vs. quota for each.
  *
- * @param {Array<{user_name: string, role_name: string, assigned: number, quota: number}>} shortfalls
+ * When the pre-check proved a worker's availability can't cover the quota, their first entry
+ * carries `max_possible`, the most sessions they can take across all their roles, and the line
+ * says so.
+ *
+ * @param {Array<{user_name: string, role_name: string, assigned: number, quota: number, max_possible?: number}>} shortfalls
  * @returns {string} A multi-line message ready to display in an alert or modal.
  */
 function formatShortfallMessage (shortfalls) {
@@ -131,7 +167,11 @@ function formatShortfallMessage (shortfalls) {
 
   const lines = shortfalls.map(s => {
     const missing = s.quota - s.assigned
-    return `  • ${s.user_name} (${s.role_name}): ${s.assigned}/${s.quota} sessions scheduled — ${missing} could not be placed`
+    let line = `  • ${s.user_name} (${s.role_name}): ${s.assigned}/${s.quota} sessions scheduled — ${missing} could not be placed`
+    if (s.max_possible !== undefined) {
+      line += ` (availability allows at most ${s.max_possible} across all their roles)`
+    }
+    return line
   })
 
   return (
@@ -142,9 +182,113 @@ function formatShortfallMessage (shortfalls) {
   )
 }
 
+/**
+ * Formats the room and role capacity issues the pre-check proved, if any, into a
+ * human-readable string. They are read from each component's `precheck` diagnostics.
+ *
+ * @param {Object} diagnostics - The `diagnostics` object of an auto-schedule response.
+ * @returns {string} A multi-line message, or '' if the pre-check found nothing.
+ */
+function formatPrecheckMessage (diagnostics) {
+  const issues = (diagnostics?.components || []).flatMap(c => c.precheck?.issues || [])
+  if (issues.length === 0) return ''
+
+  const lines = issues.map(i => {
+    const what = i.kind === 'role' ? `Role ${i.role_name}` : 'Rooms'
+    return `  • ${what}: room for ${i.available} of ${i.needed} sessions — ${i.shortfall} short`
+  })
+  return '🚫 Not every session fits, whatever the assignment:\n\n' + lines.join('\n')
+}
+
+/**
+ * How often (ms) the scheduler page asks the server whether a queued auto-schedule job has finished.
+ *
+ * @constant
+ * @type {number}
+ */
+const AUTO_SCHEDULE_POLL_MS = 2000
+
+/**
+ * Id of the auto-schedule job currently being polled, or null. Used by the "Accept current best" button.
+ *
+ * @type {number|null}
+ */
+let activeAutoScheduleJobId = null
+
+/**
+ * Asks the server to stop the running job and finish it with the best schedule found so far.
+ * The poll loop then picks up the finished job as usual.
+ *
+ * @async
+ * @returns {Promise<void>}
+ */
+async function acceptBestSchedule () {
+  if (!activeAutoScheduleJobId) return
+
+  const acceptBtn = document.getElementById('acceptBestScheduleBtn')
+  acceptBtn.disabled = true
+  acceptBtn.textContent = 'Stopping...'
+
+  await fetch(`/api/team/${window.TEAM_ID}/auto-schedule/jobs/${activeAutoScheduleJobId}/stop/`, {
+    method: 'POST',
+    headers: { 'X-CSRFToken': getCookie('csrftoken') }
+  })
+}
+
+/**
+ * Shows or hides the "Accept current best" button, resetting its label.
+ *
+ * @param {boolean} visible
+ */
+function toggleAcceptBestButton (visible) {
+  const acceptBtn = document.getElementById('acceptBestScheduleBtn')
+  if (!acceptBtn) return
+  acceptBtn.style.display = visible ? 'inline-block' : 'none'
+  if (!visible) {
+    acceptBtn.disabled = false
+    acceptBtn.textContent = 'Accept current best'
+  }
+}
+
+/**
+ * Polls the job status endpoint until the queued auto-schedule run finishes.
+ * Updates the button label so the supervisor can tell queued from running, and once the solver has
+ * found a schedule, shows its size and optimality gap and offers to accept it early.
+ *
+ * @async
+ * @param {number} jobId - The id returned by the submit endpoint.
+ * @param {HTMLButtonElement} btn - The modal's run button, used for progress feedback.
+ * @returns {Promise<{shifts: Array<Object>, partial: boolean, shortfalls: Array<Object>}>} The finished job's result.
+ * @throws {Error} If the job fails or the status request errors.
+ */
+async function pollAutoScheduleJob (jobId, btn) {
+  activeAutoScheduleJobId = jobId
+  while (true) {
+    await new Promise(resolve => setTimeout(resolve, AUTO_SCHEDULE_POLL_MS))
+
+    const res = await fetch(`/api/team/${window.TEAM_ID}/auto-schedule/jobs/${jobId}/`)
+    const data = await res.json()
+
+    if (!res.ok || !data.success) {
+      throw new Error(data.error || 'Failed to generate schedule')
+    }
+    if (data.status === 'done') {
+      return data
+    }
+
+    if (data.progress) {
+      const gapPct = (data.progress.gap * 100).toFixed(1)
+      btn.textContent = `⏳ Best so far: ${data.progress.shifts.length} shifts (within ${gapPct}% of optimal)`
+      toggleAcceptBestButton(!data.stop_requested)
+    } else {
+      btn.textContent = data.status === 'running' ? '⏳ Running Algorithm...' : '⏳ Queued...'
+    }
+  }
+}
+
 /**
  * Gathers current configuration constraints from the modal UI, optionally saves a new template,
- * and sends a request to the backend auto-scheduler API. Once shifts are generated,
+ * and queues a run with the backend auto-scheduler API, polling until the worker finishes. Once shifts are generated,
  * it enriches them with local data, groups them by role, caches them in local memory,
  * and finally renders the new shifts to the active grid view.
  *
@@ -157,10 +301,19 @@ function formatShortfallMessage (shortfalls) {
  */
 async function executeAutoScheduler () {
   // 1. Gather all configuration variables
+  const interval = parseInt(document.getElementById('configInterval').value, 10)
   const config = {
     roleId: typeof activeRoleId !== 'undefined' ? activeRoleId : null,
     duration: parseInt(document.getElementById('configDuration').value, 10),
-    interval: parseInt(document.getElementById('configInterval').value, 10),
+    interval: interval,
+    // Opt-in: solve on the hourly grid first, then refine around that schedule;
+    // only possible when the interval divides the hour
+    coarseInterval:
+      document.getElementById('configCoarseFirst').checked &&
+      interval < 60 &&
+      60 % interval === 0
+        ? 60
+        : null,
     weeklyQuota: parseInt(
       document.getElementById('configWeeklyQuota').value,
       10
@@ -169,7 +322,20 @@ async function executeAutoScheduler () {
     maxConcurrent: parseInt(
       document.getElementById('configMaxConcurrent').value,
       10
-    )
+    ),
+    // Solver settings; blank inputs fall back to the server defaults
+    numWorkers: optionalNumber('configNumWorkers'),
+    randomSeed: optionalNumber('configRandomSeed'),
+    maxDeterministicTime: optionalNumber('configMaxDeterministicTime'),
+    logSearchProgress: document.getElementById('configLogSearchProgress').checked,
+    // Greedy heuristic only: a rough schedule in well under a second
+    quickPreview: document.getElementById('configQuickPreview').checked,
+    // Seed the solver with the shifts already on the open schedule
+    reoptimizeFrom:
+      document.getElementById('configReoptimize').checked &&
+      typeof activeScheduleId !== 'undefined'
+        ? activeScheduleId
+        : null
   }
 
   // 2. Gather Template Saving Data
@@ -194,7 +360,7 @@ async function executeAutoScheduler () {
   btn.disabled = true
 
   try {
-    const res = await fetch(`/api/team/${window.TEAM_ID}/auto-schedule/`, {
+    const res = await fetch(`/api/team/${window.TEAM_ID}/auto-schedule/submit/`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -203,12 +369,14 @@ async function executeAutoScheduler () {
       body: JSON.stringify(payload)
     })
 
-    const data = await res.json()
+    const submitted = await res.json()
 
-    if (!res.ok || !data.success) {
-      throw new Error(data.error || 'Failed to generate schedule')
+    if (!res.ok || !submitted.success) {
+      throw new Error(submitted.error || 'Failed to queue the auto-scheduler')
     }
 
+    const data = await pollAutoScheduleJob(submitted.job_id, btn)
+
     if (data.shifts.length === 0) {
       alert(
         "The algorithm couldn't find any valid slots even in partial mode.\n\n" +
@@ -271,7 +439,9 @@ async function executeAutoScheduler () {
     if (isPartial && shortfalls.length > 0) {
       // Partial success — show shortfall detail
       const shortfallMsg = formatShortfallMessage(shortfalls)
+      const precheckMsg  = formatPrecheckMessage(data.diagnostics)
       let msg = `📅 ${enrichedShifts.length} session(s) scheduled (partial result).\n\n`
+      if (precheckMsg) msg += precheckMsg + '\n\n'
       msg += shortfallMsg
       if (payload.saveTemplate) {
         msg += `\n\n(Template "${payload.templateName}" was also saved for next time.)`
@@ -293,6 +463,8 @@ async function executeAutoScheduler () {
     console.error(err)
     alert('Error running auto-scheduler: ' + err.message)
   } finally {
+    activeAutoScheduleJobId = null
+    toggleAcceptBestButton(false)
     if (btn) {
       btn.textContent = originalText
       btn.disabled    = false
@@ -67,10 +67,47 @@ function initFilters () {
   }
 }
 
+/**
+ * Reads the shift a rendered grid block stands for.
+ * Times come from the block's dataset attributes, falling back to its pixel offsets;
+ * a block rendered from a saved shift keeps that shift's `id`.
+ *
+ * @param {HTMLElement} block - A `.shift-block` element on the main grid.
+ * @returns {Object} The shift data object for the block.
+ */
+function shiftFromBlock (block) {
+  const col = block.parentElement
+  const dayIndex = parseInt(col.dataset.day)
+  const topPx = parseFloat(block.style.top)
+  const heightPx = parseFloat(block.style.height)
+  let startMin, endMin
+  if (block.dataset.startMin && block.dataset.endMin) {
+    startMin = parseInt(block.dataset.startMin)
+    endMin = parseInt(block.dataset.endMin)
+  } else {
+    startMin = Math.round(topPx / SLOT_HEIGHT) * 15 + START_HOUR * 60
+    endMin = startMin + Math.round(heightPx / SLOT_HEIGHT) * 15
+  }
+
+  const finalWorkerId = col.dataset.workerId || block.dataset.workerId
+
+  return {
+    id: block.dataset.shiftId || undefined,
+    user_id: finalWorkerId,
+    user_name: block.querySelector('.event-title').textContent,
+    role_id: block.dataset.roleId || activeRoleId,
+    room_id: block.dataset.roomId || null,
+    room_name: block.querySelector('.event-loc')?.textContent || null,
+    day: DAY_KEYS[dayIndex],
+    start_min: startMin,
+    end_min: endMin,
+    isSaved: block.classList.contains('saved')
+  }
+}
+
 /**
  * Captures the current state of the grid for the active role before a view switch occurs.
- * Iterates through all rendered shift blocks on the grid, calculates their start and end 
- * times based on dataset attributes or visual pixel offsets, and caches them locally 
+ * Reads every rendered shift block with `shiftFromBlock` and caches them locally
  * via the `localSchedule` utility so unsaved work isn't lost during navigation.
  */
 function snapshotCurrentGrid () {
@@ -81,32 +118,7 @@ function snapshotCurrentGrid () {
   document
     .querySelectorAll('#mainGrid .shift-block:not(.temp)')
     .forEach(block => {
-      const col = block.parentElement
-      const dayIndex = parseInt(col.dataset.day)
-      const topPx = parseFloat(block.style.top)
-      const heightPx = parseFloat(block.style.height)
-      let startMin, endMin
-      if (block.dataset.startMin && block.dataset.endMin) {
-        startMin = parseInt(block.dataset.startMin)
-        endMin = parseInt(block.dataset.endMin)
-      } else {
-        startMin = Math.round(topPx / SLOT_HEIGHT) * 15 + START_HOUR * 60
-        endMin = startMin + Math.round(heightPx / SLOT_HEIGHT) * 15
-      }
-
-      const finalWorkerId = col.dataset.workerId || block.dataset.workerId
-
-      shifts.push({
-        user_id: finalWorkerId,
-        user_name: block.querySelector('.event-title').textContent,
-        role_id: activeRoleId,
-        room_id: block.dataset.roomId || null,
-        room_name: block.querySelector('.event-loc')?.textContent || null,
-        day: DAY_KEYS[dayIndex],
-        start_min: startMin,
-        end_min: endMin,
-        isSaved: block.classList.contains('saved')
-      })
+      shifts.push({ ...shiftFromBlock(block), role_id: activeRoleId })
     })
 
   localSchedule.save(activeRoleId, shifts)
@@ -8,20 +8,28 @@
  *
  * @namespace
  * @property {Object.<string, Object>} shifts - A dictionary storing shift objects, indexed by a composite string key (`${roleId}-${day}-${start_min}-${user_id}`).
+ * @property {Set<string>} removed - IDs of saved shifts dropped by a bulk replacement (e.g. an auto-schedule run), deleted on the next save.
  */
 const localSchedule = {
   shifts: {},
+  removed: new Set(),
 
   /**
    * Replaces all currently stored local shifts for a specific role with a new array of shifts.
+   * Saved shifts of the role that aren't in the new array are added to `removed`.
    *
    * @param {string|number} roleId - The ID of the role whose shifts are being bulk-saved.
    * @param {Array<Object>} shifts - An array of shift objects to save for this role.
    */
   save (roleId, shifts) {
+    const keptIds = new Set(shifts.filter(s => s.id).map(s => String(s.id)))
     Object.keys(this.shifts).forEach(key => {
-      if (key.startsWith(`${roleId}-`)) delete this.shifts[key]
+      if (!key.startsWith(`${roleId}-`)) return
+      const old = this.shifts[key]
+      if (old.id && !keptIds.has(String(old.id))) this.removed.add(String(old.id))
+      delete this.shifts[key]
     })
+    keptIds.forEach(id => this.removed.delete(id))
     shifts.forEach(s => {
       // FIX: Added user_id to the key so shifts don't overwrite each other
       const key = `${roleId}-${s.day}-${s.start_min}-${s.user_id}`
@@ -31,10 +39,16 @@ const localSchedule = {
 
   /**
    * Saves or updates a single shift in the local store.
+   * A saved shift (one with an `id`) that was edited replaces its entry under the old key.
    *
    * @param {Object} shift - The shift object to save.
    */
   saveOne (shift) {
+    if (shift.id) {
+      Object.keys(this.shifts).forEach(key => {
+        if (String(this.shifts[key].id) === String(shift.id)) delete this.shifts[key]
+      })
+    }
     // FIX: Added user_id to the key
     const key = `${shift.role_id}-${shift.day}-${shift.start_min}-${shift.user_id}`
     this.shifts[key] = shift
@@ -82,6 +96,7 @@ const localSchedule = {
       })
     } else {
       this.shifts = {}
+      this.removed.clear()
     }
   },
 
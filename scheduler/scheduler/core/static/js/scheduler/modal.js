@@ -272,6 +272,8 @@ function saveEvent () {
     activeEvent.dataset.workerId = workerId
     activeEvent.dataset.roleId = roleId
     activeEvent.dataset.roomId = roomId
+    activeEvent.dataset.startMin = currentStartMin
+    activeEvent.dataset.endMin = currentEndMin
 
     if (activeCol && activeCol.classList.contains('worker-sub-col')) {
       const dayIndex = activeCol.dataset.day
@@ -294,6 +296,7 @@ function saveEvent () {
 
     activeEvent.innerHTML = html
     localSchedule.saveOne({
+      id: activeEvent.dataset.shiftId || undefined,
       day: DAY_KEYS[parseInt(activeCol.dataset.day)],
       start_min: currentStartMin,
       end_min: currentEndMin,
@@ -353,10 +356,15 @@ async function removeEventBlock (e, xButton) {
   const shiftId = block.dataset.shiftId
   if (shiftId) {
     try {
-      await fetch(`/api/team/${activeScheduleId}/shifts/${shiftId}/delete/`, {
+      const res = await fetch(`/api/team/${activeScheduleId}/shifts/${shiftId}/delete/`, {
         method: 'POST',
         headers: { 'X-CSRFToken': getCookie('csrftoken') }
       })
+      if (res.ok) {
+        scheduleVersions[activeScheduleId] = (await res.json()).version
+        const cached = scheduleShiftCache[activeScheduleId]
+        if (cached) cached.shifts = cached.shifts.filter(s => String(s.id) !== String(shiftId))
+      }
     } catch (err) {
       console.error('Failed to delete shift from server:', err)
     }
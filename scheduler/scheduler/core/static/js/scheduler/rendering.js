@@ -147,6 +147,8 @@ async function deleteShifts (withConfirm = true) {
       return
     }
 
+    scheduleVersions[activeScheduleId] = (await response.json()).version
+
     // Only clear UI after server confirms success
     document
       .querySelectorAll('#mainGrid .shift-block')
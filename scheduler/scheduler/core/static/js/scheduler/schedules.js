@@ -1,6 +1,13 @@
 /** @file Handles API interactions and UI state for creating, loading, saving, and exporting schedules. */
 /** @module Scheduler */
 
+/**
+ * Last known version of each schedule's shifts, keyed by schedule ID.
+ * Sent as the base version of a patch save; the server bumps it on every change.
+ * @type {Object.<string, number>}
+ */
+const scheduleVersions = {}
+
 /**
  * Initializes the schedules dropdown by fetching team schedules from the server.
  * Automatically selects the active schedule if one exists and populates the dropdown.
@@ -16,6 +23,7 @@ async function initSchedules () {
   select.innerHTML = '<option value="">Select schedule...</option>'
 
   data.schedules.forEach(s => {
+    scheduleVersions[s.id] = s.version
     const option = document.createElement('option')
     option.value = s.id
     option.textContent = s.is_active ? `${s.name} ✓` : s.name
@@ -124,6 +132,7 @@ async function loadScheduleShifts () {
       `/api/team/${window.TEAM_ID}/schedules/${activeScheduleId}/shifts/${roleParam}`
     )
     const data = await res.json()
+    scheduleVersions[activeScheduleId] = data.version
 
     const workers =
       typeof window.WORKERS === 'string'
@@ -203,7 +212,8 @@ async function setActiveSchedule () {
 /**
  * Saves the current shift configurations to the server.
  * Prompts the user to save either all roles or just the currently filtered role.
- * Merges local unsaved shifts with previously cached shifts and alerts the user of any conflicts.
+ * Only the changes since the schedule was loaded are sent, in one patch, so the
+ * save is applied as a whole or not at all; the user is alerted of any conflicts.
  * Allows multiple shifts to exist in the same time slot as long as they belong to different workers.
  *
  * @async
@@ -228,88 +238,25 @@ async function saveAllPreferences () {
 
   snapshotCurrentGrid()
 
-  const cachedShifts = scheduleShiftCache[activeScheduleId]?.shifts || []
-
-  // FIX 1: Include the user_name in the unique key so different people 
-  // at the exact same time don't overwrite each other.
-  function mergeSavedAndLocal (saved, local) {
-    const map = {}
-    saved.forEach(s => { map[`${s.day}-${s.start_min}-${s.user_name}`] = s })
-    local.forEach(s => { map[`${s.day}-${s.start_min}-${s.user_name}`] = s })
-    return Object.values(map)
-  }
+  const roleId = activeRoleId
+  const inScope = saveAll ? () => true : s => String(s.role_id) === String(roleId)
 
   const btn = document.getElementById('saveAllBtn')
   btn.disabled = true
   btn.textContent = 'Saving...'
 
   try {
-    let totalSaved = 0
-    let allConflicts = []
-
-    if (!saveAll) {
-      // --- SAVE SINGLE ROLE ---
-      const localShifts = localSchedule.getForRole(activeRoleId) || []
-      const savedShifts = cachedShifts.filter(s => String(s.role_id) === String(activeRoleId))
-      const merged = mergeSavedAndLocal(savedShifts, localShifts)
-
-      const data = await saveRoleShifts(activeRoleId, merged)
-      totalSaved = data.saved || 0
-      if (data.conflicts) allConflicts.push(...data.conflicts)
-    } else {
-      // --- SAVE ALL ROLES ---
-      const allLocalShifts = localSchedule.getAll()
-
-      // Build role buckets starting from cached (already saved) shifts
-      const shiftsByRole = {}
-      cachedShifts.forEach(shift => {
-        const rId = String(shift.role_id)
-        if (!shiftsByRole[rId]) shiftsByRole[rId] = []
-        shiftsByRole[rId].push(shift)
-      })
-
-      // Merge local shifts in on top
-      allLocalShifts.forEach(shift => {
-        const rId = String(shift.role_id)
-        if (!shiftsByRole[rId]) shiftsByRole[rId] = []
-        
-        // FIX 2: Only overwrite if it's the exact same day, time, AND user.
-        // This allows overlapping shifts for different users to coexist.
-        shiftsByRole[rId] = shiftsByRole[rId].filter(
-          s => !(s.day === shift.day && s.start_min === shift.start_min && s.user_name === shift.user_name)
-        )
-        shiftsByRole[rId].push(shift)
-      })
-
-      const promises = Object.entries(shiftsByRole).map(
-        async ([rId, shifts]) => {
-          const data = await saveRoleShifts(rId, shifts)
-          totalSaved += data.saved || 0
-          if (data.conflicts && data.conflicts.length > 0) {
-            allConflicts.push(...data.conflicts)
-          }
-        }
-      )
+    const data = await saveShiftChanges(inScope)
 
-      await Promise.all(promises)
-    }
-
-    if (allConflicts.length > 0) {
-      const messages = allConflicts.map(c => `⚠️ ${c.message}`).join('\n')
-      alert(`Saved ${totalSaved} total shifts, but with conflicts:\n\n${messages}`)
+    if (data.conflicts.length > 0) {
+      const messages = data.conflicts.map(c => `⚠️ ${c.message}`).join('\n')
+      alert(`Saved ${data.saved} shift changes, but with conflicts:\n\n${messages}`)
     } else {
-      alert(`✓ Successfully saved ${totalSaved} shifts!`)
+      alert(`✓ Successfully saved ${data.saved} shift changes!`)
     }
-
-    document
-      .querySelectorAll('#mainGrid .shift-block.local')
-      .forEach(block => {
-        block.classList.remove('local')
-        block.classList.add('saved')
-      })
   } catch (err) {
     console.error('Error saving shifts:', err)
-    alert('An error occurred while saving. Check the console.')
+    alert(`An error occurred while saving:\n\n${err.message}`)
   } finally {
     btn.disabled = false
     btn.textContent = 'Save Schedule'
@@ -328,17 +275,140 @@ function setSavingState(isSaving) {
 }
 
 /**
- * Helper function to save a specific list of shifts for a given role via the API.
+ * Key identifying a shift's slot: role, day, start time and worker.
+ * The same key `localSchedule` stores shifts under.
+ *
+ * @param {Object} shift - A shift data object.
+ * @returns {string} The slot key.
+ */
+function shiftSlotKey (shift) {
+  return `${shift.role_id}-${shift.day}-${shift.start_min}-${shift.user_id}`
+}
+
+/**
+ * Works out the patch that turns the saved shifts into the local ones, for the shifts in scope.
+ * A local shift is matched to a saved one by its `id`, or failing that by its slot:
+ * unchanged ones are left out, ones with a new day, time or room are moved, and ones
+ * given to another worker or role are removed and added again. Local shifts with no
+ * match are added; saved shifts listed in `localSchedule.removed` are removed.
+ *
+ * @param {Array<Object>} saved - The schedule's saved shifts, as returned by the server.
+ * @param {function(Object): boolean} inScope - Picks the shifts being saved.
+ * @returns {{added: Array<Object>, removed: Array<number>, moved: Array<Object>}} The changes; `added` holds the local shift objects themselves.
+ */
+function pendingShiftChanges (saved, inScope) {
+  saved = saved.filter(inScope)
+  const savedById = new Map(saved.map(s => [String(s.id), s]))
+  const savedBySlot = new Map(saved.map(s => [shiftSlotKey(s), s]))
+  const claimed = new Set()
+  const changes = { added: [], removed: [], moved: [] }
+
+  localSchedule.getAll().filter(inScope).forEach(shift => {
+    const base = shift.id
+      ? savedById.get(String(shift.id))
+      : savedBySlot.get(shiftSlotKey(shift))
+    if (!base || claimed.has(String(base.id))) {
+      changes.added.push(shift)
+      return
+    }
+    claimed.add(String(base.id))
+
+    if (String(base.user_id) !== String(shift.user_id) || String(base.role_id) !== String(shift.role_id)) {
+      changes.removed.push(base.id)
+      changes.added.push(shift)
+    } else if (
+      base.day !== shift.day ||
+      Number(base.start_min) !== Number(shift.start_min) ||
+      Number(base.end_min) !== Number(shift.end_min) ||
+      String(base.room_id || '') !== String(shift.room_id || '')
+    ) {
+      changes.moved.push({
+        id: base.id,
+        day: shift.day,
+        start_min: shift.start_min,
+        end_min: shift.end_min,
+        room_id: shift.room_id || null
+      })
+    }
+  })
+
+  saved.forEach(s => {
+    if (localSchedule.removed.has(String(s.id)) && !claimed.has(String(s.id))) {
+      changes.removed.push(s.id)
+    }
+  })
+  return changes
+}
+
+/**
+ * Saves the local changes to the shifts in scope with a single `patchScheduleShifts` call.
+ * The diff is taken against a fresh copy of the saved shifts, while the patch is still
+ * based on the version the user loaded, so changes made by someone else in between are
+ * caught as a 409 rather than overwritten. On success the added shifts take their new
+ * IDs, and the grid's unsaved blocks in scope are marked saved.
  *
  * @async
- * @param {string|number} roleId - The ID of the role being saved.
- * @param {Array<Object>} shifts - The array of shift data objects to be saved.
- * @returns {Promise<Object>} The parsed JSON response detailing the save count and any conflicts.
- * @throws {Error} Throws if the network request fails or returns an error status.
+ * @param {function(Object): boolean} inScope - Picks the shifts being saved.
+ * @returns {Promise<{saved: number, conflicts: Array<Object>}>} The number of changes saved and any room conflicts.
+ * @throws {Error} Throws if the patch is rejected or the request fails.
  */
-async function saveRoleShifts (roleId, shifts) {
+async function saveShiftChanges (inScope) {
+  const url = `/api/team/${window.TEAM_ID}/schedules/${activeScheduleId}/shifts/`
+  const current = await (await fetch(url)).json()
+  const changes = pendingShiftChanges(current.shifts, inScope)
+  const count = changes.added.length + changes.removed.length + changes.moved.length
+  if (count === 0) return { saved: 0, conflicts: [] }
+
+  const data = await patchScheduleShifts({
+    ...changes,
+    added: changes.added.map(s => ({
+      user_id: s.user_id,
+      role_id: s.role_id,
+      room_id: s.room_id || null,
+      day: s.day,
+      start_min: s.start_min,
+      end_min: s.end_min
+    }))
+  })
+
+  changes.added.forEach((shift, i) => { shift.id = data.added[i] })
+  changes.removed.forEach(id => localSchedule.removed.delete(String(id)))
+  localSchedule.getAll().filter(inScope).forEach(shift => { shift.isSaved = true })
+
+  const fresh = await (await fetch(url)).json()
+  scheduleShiftCache[activeScheduleId] = fresh
+  const idsBySlot = new Map(fresh.shifts.map(s => [shiftSlotKey(s), s.id]))
+  document
+    .querySelectorAll('#mainGrid .shift-block.local')
+    .forEach(block => {
+      const shift = shiftFromBlock(block)
+      if (!inScope(shift)) return
+      block.dataset.shiftId = idsBySlot.get(shiftSlotKey(shift)) || ''
+      block.classList.remove('local')
+      block.classList.add('saved')
+    })
+
+  return { saved: count, conflicts: data.conflicts || [] }
+}
+
+/**
+ * Sends only the changes to the active schedule's shifts, against the last loaded version.
+ * If someone else has saved since, the server answers 409 with its current version; the
+ * schedule is reloaded and the error is thrown so the caller can tell the user to redo
+ * their changes. A patch that would double-book a worker is also refused with 409, listing
+ * the clashes, and nothing is saved.
+ *
+ * @async
+ * @param {Object} changes - The shift changes to apply.
+ * @param {Array<Object>} [changes.added] - New shifts: user_id, role_id, room_id, day, start_min, end_min.
+ * @param {Array<number>} [changes.removed] - IDs of saved shifts to delete.
+ * @param {Array<Object>} [changes.moved] - Saved shifts to move: id, day, start_min, end_min, room_id.
+ * @returns {Promise<Object>} The parsed JSON response with the new version, the added shift IDs, and any conflicts.
+ * @throws {Error} Throws if the schedule changed since it was loaded or the request fails.
+ */
+async function patchScheduleShifts (changes) {
   const res = await fetch(
-    `/api/team/${window.TEAM_ID}/schedules/save-shifts/`,
+    `/api/team/${window.TEAM_ID}/schedules/${activeScheduleId}/shifts/patch/`,
     {
       method: 'POST',
       headers: {
@@ -347,19 +417,31 @@ async function saveRoleShifts (roleId, shifts) {
           typeof csrfToken !== 'undefined' ? csrfToken : getCookie('csrftoken')
       },
       body: JSON.stringify({
-        schedule_id: activeScheduleId,
-        role_id: roleId,
-        shifts: shifts || []
+        base_version: scheduleVersions[activeScheduleId],
+        added: changes.added || [],
+        removed: changes.removed || [],
+        moved: changes.moved || []
       })
     }
   )
 
+  const data = await res.json().catch(() => ({}))
+  if (res.status === 409 && data.version !== undefined) {
+    delete scheduleShiftCache[activeScheduleId]
+    await loadScheduleShifts()
+    throw new Error('This schedule was changed by someone else. It has been reloaded; please redo your changes.')
+  }
   if (!res.ok) {
-    const errData = await res.json().catch(() => ({}))
-    throw new Error(errData.error || `Failed to save role ${roleId}`)
+    // 409 with conflicts: the patch would double-book a worker
+    const details = (data.conflicts || [])
+      .filter(c => c.type === 'worker')
+      .map(c => `\n⚠️ ${c.message}`)
+      .join('')
+    throw new Error((data.error || 'Failed to save changes') + details)
   }
 
-  return await res.json()
+  scheduleVersions[activeScheduleId] = data.version
+  return data
 }
 
 /** * Exports the currently active schedule by opening the corresponding export endpoint in a new tab. 
@@ -630,13 +630,12 @@ document.addEventListener('DOMContentLoaded', () => {
 /**
  * Saves all shifts for the currently active worker to the server.
  * Reads `activeScheduleId` and `activeWorkerId` to scope the operation.
- * Merges cached (server-side) shifts with local (unsaved) shifts, with local
- * winning on any slot conflict. Groups the merged set by role and calls
- * `saveRoleShifts` for each group in parallel. On success, promotes all local
- * shift blocks on the grid from `.local` to `.saved`.
+ * Sends only the worker's changes, as one patch via `saveShiftChanges`, so
+ * the other workers' shifts in the same roles are left alone. On success,
+ * promotes the worker's local shift blocks on the grid from `.local` to `.saved`.
  *
  * @async
- * @requires saveRoleShifts
+ * @requires saveShiftChanges
  * @requires localSchedule
  */
 async function saveWorkerShifts () {
@@ -651,39 +650,10 @@ async function saveWorkerShifts () {
   btn.textContent = 'Saving...'
 
   try {
-    const cachedShifts = (scheduleShiftCache[activeScheduleId]?.shifts || [])
-      .filter(s => String(s.user_id) === String(activeWorkerId))
-
-    const localShifts = localSchedule.getForWorker(activeWorkerId)
-
-    // Merge — local wins on same slot
-    const map = {}
-    cachedShifts.forEach(s => { map[`${s.day}-${s.start_min}`] = s })
-    localShifts.forEach(s => { map[`${s.day}-${s.start_min}`] = s })
-    const merged = Object.values(map)
-
-    // Group by role since saveRoleShifts expects a role bucket
-    const byRole = {}
-    merged.forEach(s => {
-      const rId = s.role_id
-      if (!byRole[rId]) byRole[rId] = []
-      byRole[rId].push(s)
-    })
-
-    let totalSaved = 0
-    await Promise.all(
-      Object.entries(byRole).map(async ([rId, shifts]) => {
-        const data = await saveRoleShifts(rId, shifts)
-        totalSaved += data.saved || 0
-      })
-    )
-
-    document.querySelectorAll('#mainGrid .shift-block.local').forEach(block => {
-      block.classList.remove('local')
-      block.classList.add('saved')
-    })
+    const workerId = activeWorkerId
+    const data = await saveShiftChanges(s => String(s.user_id) === String(workerId))
 
-    btn.textContent = `✓ Saved ${totalSaved} shifts`
+    btn.textContent = `✓ Saved ${data.saved} changes`
     setTimeout(() => { btn.textContent = 'Save Shifts' }, 2500)
   } catch (err) {
     console.error(err)
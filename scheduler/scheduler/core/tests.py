@@ -0,0 +1,486 @@
+'''
+tests.py
+Tests for the auto-scheduler and the schedule save path, on a small seeded
+team (SeededTeamTestCase). Run with:
+
+    python manage.py test scheduler.core.tests
+
+HotLookupIndexTests checks that the hot lookups use the composite indexes
+meant for them. The queries are the ones the views and
+auto_scheduler.load_problem() actually issue, captured as they run; each
+is then EXPLAINed and every read of a hot table must go through an index
+rather than a full scan. On PostgreSQL sequential scans are disabled for
+the check, so the tiny test tables can't hide an index the planner
+couldn't use.
+'''
+
+import json
+import re
+import uuid
+from datetime import time
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .auto_scheduler import (
+    DEFAULT_CONFIG,
+    SchedulingProblem,
+    _precompute_grid,
+    _build_phase,
+    _new_solver,
+    _quality_terms,
+    _refine_from_coarse,
+    _solve_model,
+    load_problem,
+    solve_problem,
+)
+from .conflicts import Booking, double_bookings, over_capacity
+from .models import (
+    PreferredTime,
+    Role,
+    Room,
+    RoomAvailability,
+    Schedule,
+    Shift,
+    Team,
+    TeamRoleAssignment,
+    UnavailabilityRange,
+)
+
+# tables whose lookups have a composite index (migration 0011)
+HOT_TABLES = [
+    Shift._meta.db_table,
+    UnavailabilityRange._meta.db_table,
+    PreferredTime._meta.db_table,
+    RoomAvailability._meta.db_table,
+    TeamRoleAssignment._meta.db_table,
+]
+
+
+def _explain(sql):
+    '''
+    The query plan for `sql` (a captured query, parameters filled in) as text.
+    '''
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return "\n".join(row[-1] for row in cursor.fetchall())
+
+
+def _full_scans(plan):
+    '''
+    The hot tables `plan` reads without an index.
+    '''
+    if connection.vendor == "postgresql":
+        pattern = r"Seq Scan on {}\b"
+    else:
+        # SQLite: "SCAN t" is a full scan, "SCAN t USING (COVERING) INDEX i" isn't
+        pattern = r"SCAN {}(?! USING)\b"
+    return [
+        table for table in HOT_TABLES
+        if re.search(pattern.format(re.escape(table)), plan)
+    ]
+
+
+class SeededTeamTestCase(TestCase):
+    '''
+    One role with three workers and one room, open Monday and Tuesday 8:00
+    to 17:00. Each worker is busy for an hour on Monday, prefers two hours
+    on Tuesday and has one Tuesday shift on the schedule.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner   = User.objects.create_user("owner")
+        cls.workers = [User.objects.create_user(f"worker{i}") for i in range(3)]
+
+        cls.team = Team.objects.create(name="Team", owner=cls.owner)
+        cls.team.members.add(*cls.workers)
+        cls.role = Role.objects.create(name="CHEM 151", team=cls.team)
+        cls.room = Room.objects.create(name="Room A", team=cls.team, capacity=1)
+        cls.schedule = Schedule.objects.create(team=cls.team, name="Default")
+
+        for day in ["mon", "tue"]:
+            RoomAvailability.objects.create(
+                room=cls.room, day=day, start_time=time(8), end_time=time(17)
+            )
+        for hour, worker in enumerate(cls.workers, start=9):
+            TeamRoleAssignment.objects.create(team=cls.team, user=worker, role=cls.role)
+            UnavailabilityRange.objects.create(
+                user=worker, team=cls.team, day="mon", start_time=time(hour), end_time=time(hour + 1)
+            )
+            PreferredTime.objects.create(
+                user=worker, team=cls.team, day="tue", start_time=time(hour), end_time=time(hour + 2)
+            )
+            Shift.objects.create(
+                schedule=cls.schedule, user=worker, role=cls.role, room=cls.room,
+                day="tue", start_time=time(hour), end_time=time(hour, 50),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+
+class HotLookupIndexTests(SeededTeamTestCase):
+
+    def assertLookupsUseIndexes(self, run):
+        '''
+        Run `run()`, then EXPLAIN each query it issued that reads a hot
+        table; fails unless there is one and none is a full scan.
+        '''
+        with CaptureQueriesContext(connection) as captured:
+            run()
+
+        checked = 0
+        for query in captured.captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or not any(f'"{t}"' in sql for t in HOT_TABLES):
+                continue
+            plan = _explain(sql)
+            self.assertEqual(_full_scans(plan), [], f"{sql}\n\n{plan}")
+            checked += 1
+        self.assertGreater(checked, 0, "no hot-table lookups were issued")
+
+    def get(self, path):
+        response = self.client.get(f"/api/team/{self.team.id}/{path}")
+        self.assertEqual(response.status_code, 200)
+
+    def test_schedule_shifts(self):
+        self.assertLookupsUseIndexes(lambda: self.get(f"schedules/{self.schedule.id}/shifts/"))
+
+    def test_room_bookings(self):
+        self.assertLookupsUseIndexes(
+            lambda: self.get(f"schedules/{self.schedule.id}/room-bookings/?day=tue")
+        )
+
+    def test_room_availability(self):
+        self.assertLookupsUseIndexes(lambda: self.get("room-availability/?day=mon"))
+
+    def test_worker_availability(self):
+        self.assertLookupsUseIndexes(lambda: self.get(f"get-availability/{self.workers[0].id}/"))
+
+    def test_role_view(self):
+        self.assertLookupsUseIndexes(lambda: self.get(f"roles/{self.role.id}"))
+
+    def test_patch_shifts(self):
+        shift = Shift.objects.filter(schedule=self.schedule).first()
+        patch = {
+            "base_version": self.schedule.version,
+            "moved": [{"id": shift.id, "day": "mon", "start_min": 780, "end_min": 830,
+                       "room_id": str(self.room.id)}],
+        }
+
+        def run():
+            response = self.client.post(
+                f"/api/team/{self.team.id}/schedules/{self.schedule.id}/shifts/patch/",
+                data=json.dumps(patch), content_type="application/json",
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assertLookupsUseIndexes(run)
+
+    def test_load_problem(self):
+        self.assertLookupsUseIndexes(
+            lambda: load_problem(self.team, roles=[self.role], base_schedule_id=self.schedule.id)
+        )
+
+
+class CoarseToFineTests(SeededTeamTestCase):
+
+    def test_fine_stage_treats_coarse_hints_as_rough(self):
+        config  = dict(DEFAULT_CONFIG, weekly_quota=2, coarse_interval=60)
+        problem = load_problem(self.team, config=config, base_schedule_id=self.schedule.id)
+        self.assertTrue(problem.warm_start)
+
+        fine, _ = _refine_from_coarse(problem, 5.0, {})
+        self.assertFalse(fine.warm_start)
+        self.assertTrue(problem.warm_start)
+        self.assertNotEqual(_new_solver(fine, 1.0).parameters.cp_model_probing_level, 0)
+
+        results, shortfalls = solve_problem(problem, 5.0)
+        self.assertEqual(shortfalls, [])
+        self.assertEqual(len(results), 6)
+
+
+class LexicographicQualityTests(SeededTeamTestCase):
+
+    def test_quality_step_never_worse_than_sessions_step(self):
+        # quota 3 on two open days with one shift a day: a partial schedule
+        config  = dict(DEFAULT_CONFIG, partial_objective="lexicographic")
+        problem = load_problem(self.team, config=config)
+
+        for max_time in (0.05, 5.0):
+            with self.subTest(max_time=max_time):
+                phase     = _build_phase(problem, partial=True)
+                phase_log = []
+                _, solver = _solve_model(problem, phase, max_time, "partial", phase_log)
+                if len(phase_log) < 2:
+                    continue  # the sessions step found nothing in time
+
+                obj_vars, obj_coeffs = _quality_terms(problem, phase.variables)
+                chosen   = [solver.BooleanValue(var) for var in obj_vars]
+                quality  = sum(c for c, on in zip(obj_coeffs, chosen) if on)
+                self.assertGreaterEqual(quality, phase_log[-1]["hint_quality"])
+                self.assertGreaterEqual(sum(chosen), round(phase_log[0]["objective"]))
+        self.assertEqual(len(phase_log), 2)
+
+
+class StartGridTests(SimpleTestCase):
+
+    def grid(self, interval, windows):
+        problem = SchedulingProblem(dict(DEFAULT_CONFIG, interval=interval), ["mon", "tue"])
+        problem.rooms = {room: 1 for room, _, _ in windows}
+        for room, day, window in windows:
+            problem.room_windows.setdefault((room, day), []).append(window)
+        _precompute_grid(problem)
+        return {
+            day: [problem.start_times[i] for i in slots]
+            for day, slots in problem.day_slots.items()
+        }
+
+    def test_grid_starts_at_the_days_opening(self):
+        grid = self.grid(45, [("a", "mon", (480, 720))])
+        self.assertEqual(grid["mon"], [480, 525, 570, 615, 660])
+        self.assertEqual(grid["tue"], [])
+
+    def test_misaligned_windows_share_the_days_grid(self):
+        grid = self.grid(30, [
+            ("a", "mon", (480, 720)),
+            ("b", "mon", (490, 720)),   # opens between grid points
+            ("b", "tue", (495, 600)),   # the day's only window sets its grid
+        ])
+        self.assertEqual(grid["mon"], [480, 510, 540, 570, 600, 630, 660])
+        self.assertEqual(grid["tue"], [495, 525])
+
+
+class PrecheckReportTests(SeededTeamTestCase):
+
+    def auto_schedule(self, **config):
+        # the run record is written on a thread, outside the test's transaction
+        with mock.patch("scheduler.core.views.auto_scheduler.record_solve_run_in_background"):
+            response = self.client.post(
+            f"/api/team/{self.team.id}/auto-schedule/",
+                data=json.dumps({"config": config}), content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_capped_workers_are_listed(self):
+        # quota 3 but one session a day on two open days
+        data     = self.auto_schedule(weeklyQuota=3, dailyMax=1)
+        precheck = data["diagnostics"]["components"][0]["precheck"]
+        self.assertEqual(precheck["issues"], [])
+        self.assertEqual(
+            sorted((i["user_name"], i["available"], i["shortfall"]) for i in precheck["capped_workers"]),
+            [(w.username, 2, 1) for w in self.workers],
+        )
+        self.assertTrue(data["partial"])
+
+    def test_room_and_role_issues_are_listed(self):
+        # five sessions a day each, but one room with nine disjoint starts a day
+        data     = self.auto_schedule(weeklyQuota=10, dailyMax=5)
+        precheck = data["diagnostics"]["components"][0]["precheck"]
+        issues   = {i["kind"]: i for i in precheck["issues"]}
+        self.assertEqual(set(issues), {"rooms", "role"})
+        self.assertEqual(issues["role"]["role_name"], self.role.name)
+        for issue in issues.values():
+            self.assertEqual((issue["available"], issue["needed"], issue["shortfall"]), (18, 30, 12))
+
+
+class ConflictSweepTests(SimpleTestCase):
+    '''
+    over_capacity() and double_bookings() on hand-built bookings: rooms
+    "a" and "b", users 1 and 2, times in minutes.
+    '''
+
+    def existing(self, start, end, room_id="a", user_id=1, day="mon"):
+        return Booking(day, start, end, room_id, user_id, None)
+
+    def batch(self, *shifts):
+        return [
+            Booking(day, start, end, room_id, user_id, index)
+            for index, (day, start, end, room_id, user_id) in enumerate(shifts)
+        ]
+
+    def test_touching_end_times_dont_conflict(self):
+        existing = [self.existing(540, 600)]
+        batch    = self.batch(("mon", 600, 660, "a", 1), ("mon", 480, 540, "a", 1))
+        self.assertEqual(over_capacity(existing, batch, {"a": 1}), set())
+        self.assertEqual(double_bookings(existing, batch), {})
+
+    def test_batch_shift_overlapping_an_existing_one(self):
+        existing = [self.existing(540, 600)]
+        later    = self.batch(("mon", 570, 630, "a", 2))
+        earlier  = self.batch(("mon", 500, 560, "a", 2))
+        self.assertEqual(over_capacity(existing, later, {"a": 1}), {0})
+        # the existing shift arrives second, but the batch shift is blamed
+        self.assertEqual(over_capacity(existing, earlier, {"a": 1}), {0})
+        # the same times on another day or in another room are fine
+        self.assertEqual(over_capacity(existing, self.batch(("tue", 570, 630, "a", 2)), {"a": 1}), set())
+        self.assertEqual(over_capacity(existing, self.batch(("mon", 570, 630, "b", 2)), {"a": 1, "b": 1}), set())
+
+    def test_room_with_capacity_above_one(self):
+        batch = self.batch(
+            ("mon", 540, 600, "a", 1),
+            ("mon", 550, 610, "a", 2),
+            ("mon", 560, 620, "a", 3),
+            ("mon", 610, 670, "a", 4),   # starts as the first two are gone
+        )
+        self.assertEqual(over_capacity([], batch, {"a": 2}), {2})
+        self.assertEqual(over_capacity([], batch, {"a": 3}), set())
+        self.assertEqual(over_capacity([self.existing(500, 560, user_id=5)], batch, {"a": 2}), {1, 2})
+
+    def test_user_double_booked_across_rooms(self):
+        existing = [self.existing(540, 600, room_id="a")]
+        batch    = self.batch(
+            ("mon", 570, 630, "b", 1),   # clashes with the existing shift
+            ("mon", 620, 680, "a", 1),   # clashes with batch shift 0
+            ("mon", 570, 630, "a", 2),   # another user: no clash
+        )
+        self.assertEqual(double_bookings(existing, batch), {0: existing[0], 1: batch[0]})
+        self.assertEqual(over_capacity(existing, batch[:2], {"a": 1, "b": 1}), set())
+
+
+class PatchShiftsTests(SeededTeamTestCase):
+
+    def patch(self, body):
+        return self.client.post(
+            f"/api/team/{self.team.id}/schedules/{self.schedule.id}/shifts/patch/",
+            data=json.dumps(body), content_type="application/json",
+        )
+
+    def version(self):
+        return Schedule.objects.get(id=self.schedule.id).version
+
+    def shift_of(self, worker):
+        return Shift.objects.get(schedule=self.schedule, user=worker)
+
+    def test_apply_bumps_the_version(self):
+        base  = self.version()
+        moved = self.shift_of(self.workers[0])
+        response = self.patch({
+            "base_version": base,
+            "moved": [{"id": moved.id, "day": "mon", "start_min": 780, "end_min": 830,
+                       "room_id": str(self.room.id)}],
+            "removed": [self.shift_of(self.workers[1]).id],
+            "added": [{"user_id": self.workers[1].id, "role_id": self.role.id, "day": "mon",
+                       "start_min": 840, "end_min": 890, "room_id": str(self.room.id)}],
+        })
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["version"], self.version()), (base + 1, base + 1))
+        self.assertEqual(data["conflicts"], [])
+
+        moved.refresh_from_db()
+        self.assertEqual((moved.day, moved.start_time, moved.end_time), ("mon", time(13), time(13, 50)))
+        added = Shift.objects.get(id=data["added"][0])
+        self.assertEqual((added.user, added.day, added.start_time), (self.workers[1], "mon", time(14)))
+        self.assertEqual(Shift.objects.filter(schedule=self.schedule).count(), 3)
+
+    def test_stale_base_version_is_rejected(self):
+        base = self.version()
+        self.assertEqual(self.patch({"base_version": base}).status_code, 200)
+
+        shift    = self.shift_of(self.workers[0])
+        response = self.patch({"base_version": base, "removed": [shift.id]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["version"], base + 1)
+        self.assertEqual(self.version(), base + 1)
+        self.assertTrue(Shift.objects.filter(id=shift.id).exists())
+
+    def test_bad_payload_is_rejected(self):
+        base  = self.version()
+        shift = self.shift_of(self.workers[0])
+        bad = {
+            "not an object": [],
+            "no base_version": {"removed": []},
+            "removed id not an integer": {"base_version": base, "removed": ["x"]},
+            "unknown day": {"base_version": base, "moved": [{"id": shift.id, "day": "sun?",
+                                                               "start_min": 60, "end_min": 120}]},
+            "end before start": {"base_version": base, "moved": [{"id": shift.id, "day": "mon",
+                                                                    "start_min": 120, "end_min": 60}]},
+            "removed and moved": {"base_version": base, "removed": [shift.id],
+                                  "moved": [{"id": shift.id, "day": "mon",
+                                             "start_min": 60, "end_min": 120}]},
+            "unknown room": {"base_version": base, "moved": [{"id": shift.id, "day": "mon",
+                                                                "start_min": 60, "end_min": 120,
+                                                                "room_id": str(uuid.uuid4())}]},
+            "unknown shift": {"base_version": base, "removed": [shift.id + 1000]},
+        }
+        for case, body in bad.items():
+            with self.subTest(case):
+                self.assertEqual(self.patch(body).status_code, 400)
+        self.assertEqual(self.version(), base)
+        self.assertTrue(Shift.objects.filter(id=shift.id).exists())
+
+    def test_double_booking_is_rejected(self):
+        base  = self.version()
+        shift = self.shift_of(self.workers[0])
+        response = self.patch({
+            "base_version": base,
+            "added": [{"user_id": self.workers[0].id, "day": "tue", "start_min": 560, "end_min": 610}],
+        })
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.version(), base)
+        self.assertEqual(Shift.objects.filter(schedule=self.schedule, user=self.workers[0]).get(), shift)
+
+
+@skipUnless(connection.vendor == "postgresql", "exclusion constraints are PostgreSQL only")
+class ShiftOverlapConstraintTests(PatchShiftsTests):
+    '''
+    The core_shift_no_user_overlap constraint (migration 0012), over the
+    generated start_min / end_min columns. The inherited PatchShiftsTests
+    run again with it in place.
+    '''
+
+    def test_constraint_uses_the_minute_columns(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint"
+                " WHERE conname = 'core_shift_no_user_overlap'"
+            )
+            (definition,), = cursor.fetchall()
+            cursor.execute(
+                "SELECT count(*) FROM information_schema.columns"
+                " WHERE table_name = 'core_shift' AND column_name = 'minutes'"
+            )
+            (minutes_columns,), = cursor.fetchall()
+        self.assertRegex(definition, r"int4range\(.*start_min.*end_min.*\)")
+        self.assertEqual(minutes_columns, 0)
+
+    def test_overlapping_shift_is_refused(self):
+        shift = self.shift_of(self.workers[0])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Shift.objects.create(
+                schedule=self.schedule, user=self.workers[0], role=self.role,
+                day="tue", start_time=time(9, 30), end_time=time(10, 20),
+            )
+        # touching end times are fine
+        Shift.objects.create(
+            schedule=self.schedule, user=self.workers[0], role=self.role,
+            day="tue", start_time=shift.end_time, end_time=time(10, 40),
+        )
+
+    def test_patch_can_swap_a_workers_shifts(self):
+        first  = self.shift_of(self.workers[0])
+        second = Shift.objects.create(
+            schedule=self.schedule, user=self.workers[0], role=self.role,
+            day="tue", start_time=time(13), end_time=time(13, 50),
+        )
+        room = str(self.room.id)
+        response = self.patch({
+            "base_version": self.version(),
+            "moved": [
+                {"id": first.id, "day": "tue", "start_min": 780, "end_min": 830, "room_id": room},
+                {"id": second.id, "day": "tue", "start_min": 540, "end_min": 590, "room_id": room},
+            ],
+        })
+        self.assertEqual(response.status_code, 200)
+        first.refresh_from_db()
+        self.assertEqual(first.start_time, time(13))
@@ -22,6 +22,7 @@ urlpatterns = [
     path('api/team/<uuid:team_id>/schedules/save-shifts/', views.save_role_shifts, name='save_role_shifts'),
     path('api/team/<uuid:team_id>/schedules/set-active/', views.set_active_schedule, name='set_active_schedule'),
     path('api/team/<uuid:team_id>/schedules/<int:schedule_id>/shifts/', views.get_schedule_shifts, name='get_schedule_shifts'),
+    path('api/team/<uuid:team_id>/schedules/<int:schedule_id>/shifts/patch/', views.patch_schedule_shifts, name='patch_schedule_shifts'),
     path('api/team/<uuid:team_id>/schedules/<int:schedule_id>/room-bookings/', views.get_room_bookings, name='get_room_bookings'),
     path('api/team/<uuid:team_id>/room-availability/', views.get_room_availability, name='get_room_availability'),
     path('api/team/<uuid:team_id>/members/remove/', views.remove_member_from_team, name='remove_member'),
@@ -93,6 +94,10 @@ urlpatterns = [
 
     # AUTOMATIC SCHEDULING
     path('api/team/<uuid:team_id>/auto-schedule/', views.auto_schedule_role, name='auto_schedule_role'),
+    path('api/team/<uuid:team_id>/auto-schedule/submit/', views.submit_auto_schedule, name='submit_auto_schedule'),
+    path('api/team/<uuid:team_id>/auto-schedule/jobs/<int:job_id>/', views.auto_schedule_job_status, name='auto_schedule_job_status'),
+    path('api/team/<uuid:team_id>/auto-schedule/jobs/<int:job_id>/stop/', views.stop_auto_schedule_job, name='stop_auto_schedule_job'),
+    path('api/team/<uuid:team_id>/auto-schedule/runs/', views.solve_run_summary, name='solve_run_summary'),
 
     # EXPORT
     path('api/team/<uuid:team_id>/schedules/<int:schedule_id>/export/', views.export_schedule, name='export_schedule'),
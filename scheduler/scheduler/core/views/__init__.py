@@ -7,7 +7,7 @@ and `views.function_name` without any changes.
 '''
 
 # --- Shared helpers (not views, but used across modules) ---
-from .utils import DAY_MAP, time_to_minutes, minutes_to_time, minutes_to_string
+from .utils import DAY_MAP, DAY_INDEX, time_to_minutes, minutes_to_time, minutes_to_string
 
 # --- Auth ---
 from .auth import signup, auth_ping, account_details
@@ -26,6 +26,7 @@ from .schedules import (
     get_schedules,
     create_schedule,
     save_role_shifts,
+    patch_schedule_shifts,
     set_active_schedule,
     get_schedule_shifts,
     get_room_bookings,
@@ -68,6 +69,12 @@ from .events import (
 )
 
 # --- API: Auto Scheduler ---
-from .auto_scheduler import auto_schedule_role
+from .auto_scheduler import (
+    auto_schedule_role,
+    submit_auto_schedule,
+    auto_schedule_job_status,
+    stop_auto_schedule_job,
+    solve_run_summary,
+)
 
 from .attendee import attendee_form, submit_attendee_preferences, get_or_create_response_link, get_preference_density
\ No newline at end of file
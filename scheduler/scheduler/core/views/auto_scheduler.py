@@ -1,37 +1,68 @@
 '''
 views/auto_scheduler.py
-API endpoint that runs the automatic scheduling engine.
+API endpoints that run the automatic scheduling engine, either inline or
+through the background job queue.
 '''
 
 import json
 
+from django.conf import settings
+from django.db.models import Avg, Count, Max
 from django.shortcuts import get_object_or_404
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 
-from ..models import Team, ScheduleTemplate
-from ..auto_scheduler import generate_schedule
+from ..models import Team, Role, Schedule, ScheduleTemplate, AutoScheduleJob, SolveRun
+from ..auto_scheduler import DEFAULT_CONFIG, generate_schedule
+from ..jobs import enqueue_auto_schedule, record_solve_run_in_background, request_stop, best_so_far
 
+# How many recent runs the summary endpoint lists
+RECENT_RUNS = 20
 
-@require_POST
-@login_required
-def auto_schedule_role(request, team_id):
+
+def _optional_number(config_data, key, cast, upper=None):
     '''
-    Run the OR-Tools scheduling engine with the provided configuration.
-    Optionally saves the config as a reusable template.
+    An optional numeric config value: None if missing or blank, else cast
+    and clamped to [0, upper]. Raises ValueError if it isn't a number.
     '''
-    team = get_object_or_404(Team, id=team_id)
-
+    value = config_data.get(key)
+    if value in (None, ""):
+        return None
     try:
-        data = json.loads(request.body)
-    except json.JSONDecodeError:
-        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number")
+    value = max(value, 0)
+    if upper is not None:
+        value = min(value, upper)
+    return value
+
+
+def _parse_config(request, team):
+    '''
+    Read the auto-schedule payload, saving it as a template if asked.
+    Returns (config_data, engine_config). Raises json.JSONDecodeError for a
+    bad body and ValueError for a non-numeric solver setting.
+
+    Solver settings are clamped to the server caps here as well as in the
+    engine, so saved templates and stored job configs show what will run.
+    '''
+    data = json.loads(request.body)
 
     config_data   = data.get("config", {})
     save_template = data.get("saveTemplate", False)
     template_name = data.get("templateName", "")
 
+    num_workers = _optional_number(
+        config_data, "numWorkers", int, settings.AUTO_SCHEDULER_MAX_WORKERS
+    )
+    random_seed = _optional_number(config_data, "randomSeed", int)
+    max_deterministic_time = _optional_number(
+        config_data, "maxDeterministicTime", float, settings.AUTO_SCHEDULER_MAX_DETERMINISTIC_TIME
+    )
+    log_search_progress = bool(config_data.get("logSearchProgress", False))
+
     if save_template and template_name:
         ScheduleTemplate.objects.create(
             team=team,
@@ -41,26 +72,187 @@ def auto_schedule_role(request, team_id):
             weekly_quota=config_data.get("weeklyQuota", 3),
             daily_max=config_data.get("dailyMax", 1),
             max_concurrent=config_data.get("maxConcurrent", 1),
+            num_workers=num_workers,
+            random_seed=random_seed,
+            max_deterministic_time=max_deterministic_time,
+            log_search_progress=log_search_progress,
         )
 
-    role_id           = config_data.get("roleId")
-    roles_to_schedule = [role_id] if role_id else None
-
     engine_config = {
         "duration":      config_data.get("duration", 50),
         "interval":      config_data.get("interval", 30),
         "weekly_quota":  config_data.get("weeklyQuota", 3),
         "daily_max":     config_data.get("dailyMax", 1),
         "max_concurrent": config_data.get("maxConcurrent", 1),
+        "two_stage":     bool(config_data.get("twoStage", False)),
+        "backend":       config_data.get("backend", "linear"),
+        "race_phases":   bool(config_data.get("racePhases", False)),
+        "partial_objective": config_data.get("partialObjective", "weighted"),
+        "greedy_only":   bool(config_data.get("quickPreview", False)),
+        "greedy_hint":   bool(config_data.get("greedyHint", DEFAULT_CONFIG["greedy_hint"])),
+        "coarse_interval": _optional_number(config_data, "coarseInterval", int),
+        "refine_radius": _optional_number(config_data, "refineRadius", int),
+        "num_workers":   num_workers,
+        "random_seed":   random_seed,
+        "max_deterministic_time": max_deterministic_time,
+        "log_search_progress": log_search_progress,
     }
+    return config_data, engine_config
+
+
+def _base_schedule(config_data, team):
+    '''
+    The schedule to re-optimise from when "reoptimizeFrom" is set, else None.
+    '''
+    schedule_id = config_data.get("reoptimizeFrom")
+    if not schedule_id:
+        return None
+    return get_object_or_404(Schedule, id=schedule_id, team=team)
+
+
+@require_POST
+@login_required
+def auto_schedule_role(request, team_id):
+    '''
+    Run the OR-Tools scheduling engine with the provided configuration.
+    Optionally saves the config as a reusable template, and optionally
+    re-optimises from an existing schedule ("reoptimizeFrom": schedule id).
+    The response carries per-stage timings and model sizes under "diagnostics".
+    '''
+    team = get_object_or_404(Team, id=team_id)
 
     try:
-        results, shortfalls = generate_schedule(team, roles=roles_to_schedule, config=engine_config)
-        return JsonResponse({
-            "success": True,
-            "shifts": results,
-            "partial": len(shortfalls) > 0,
-            "shortfalls": shortfalls,
-        })
+        config_data, engine_config = _parse_config(request, team)
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+
+    role_id           = config_data.get("roleId")
+    roles_to_schedule = [role_id] if role_id else None
+    base_schedule     = _base_schedule(config_data, team)
+
+    diagnostics = {}
+    try:
+        results, shortfalls = generate_schedule(
+            team,
+            roles=roles_to_schedule,
+            config=engine_config,
+            base_schedule_id=base_schedule.id if base_schedule else None,
+            diagnostics=diagnostics,
+        )
     except Exception as e:
-        return JsonResponse({"success": False, "error": str(e)}, status=500)
\ No newline at end of file
+        record_solve_run_in_background(team.id, engine_config, diagnostics, [], [], error=str(e))
+        return JsonResponse({"success": False, "error": str(e)}, status=500)
+
+    record_solve_run_in_background(team.id, engine_config, diagnostics, results, shortfalls)
+    return JsonResponse({
+        "success": True,
+        "shifts": results,
+        "partial": len(shortfalls) > 0,
+        "shortfalls": shortfalls,
+        "diagnostics": diagnostics,
+    })
+
+
+@require_POST
+@login_required
+def submit_auto_schedule(request, team_id):
+    '''
+    Queue an auto-schedule run and return its job id straight away.
+    The scheduler page polls auto_schedule_job_status for the result.
+    '''
+    team = get_object_or_404(Team, id=team_id)
+
+    try:
+        config_data, engine_config = _parse_config(request, team)
+    except json.JSONDecodeError:
+        return JsonResponse({"success": False, "error": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"success": False, "error": str(e)}, status=400)
+
+    role_id = config_data.get("roleId")
+    role    = get_object_or_404(Role, id=role_id, team=team) if role_id else None
+
+    job = enqueue_auto_schedule(
+        team,
+        request.user,
+        engine_config,
+        role=role,
+        base_schedule=_base_schedule(config_data, team),
+    )
+    return JsonResponse({"success": True, "job_id": job.id, "status": job.status}, status=202)
+
+
+@require_GET
+@login_required
+def auto_schedule_job_status(request, team_id, job_id):
+    '''
+    Report a queued job's status, and its shifts/shortfalls once it is done.
+    While it runs, "progress" holds the best schedule found so far (shifts,
+    objective, gap), or null before the first solution.
+    '''
+    job = get_object_or_404(AutoScheduleJob, id=job_id, team_id=team_id)
+
+    payload = {"success": True, "job_id": job.id, "status": job.status}
+
+    if job.status == AutoScheduleJob.STATUS_RUNNING:
+        payload["progress"] = best_so_far(job)
+        payload["stop_requested"] = job.stop_requested
+    elif job.status == AutoScheduleJob.STATUS_DONE:
+        payload.update(job.result or {})
+    elif job.status == AutoScheduleJob.STATUS_FAILED:
+        payload["success"] = False
+        payload["error"] = job.error
+
+    return JsonResponse(payload)
+
+
+@require_POST
+@login_required
+def stop_auto_schedule_job(request, team_id, job_id):
+    '''
+    Accept the best schedule found so far: the worker stops the solve and
+    finishes the job with it. Poll auto_schedule_job_status for the result.
+    '''
+    job = get_object_or_404(AutoScheduleJob, id=job_id, team_id=team_id)
+    job = request_stop(job)
+    return JsonResponse({"success": True, "job_id": job.id, "status": job.status})
+
+
+@require_GET
+@login_required
+def solve_run_summary(request, team_id):
+    '''
+    Solve-time summary for a team: totals and timings per status, plus the
+    most recent runs with their config and input sizes.
+    '''
+    team = get_object_or_404(Team, id=team_id)
+    runs = SolveRun.objects.filter(team=team)
+
+    by_status = {
+        row["status"]: {
+            "count": row["count"],
+            "avg_seconds": row["avg_seconds"],
+            "max_seconds": row["max_seconds"],
+        }
+        for row in runs.values("status").annotate(
+            count=Count("id"),
+            avg_seconds=Avg("total_seconds"),
+            max_seconds=Max("total_seconds"),
+        ).order_by()
+    }
+
+    recent = runs.values(
+        "id", "created_at", "source", "status",
+        "duration", "interval", "weekly_quota", "daily_max", "max_concurrent",
+        "workers", "roles", "rooms", "start_times",
+        "shift_count", "shortfall_count", "total_seconds",
+    )[:RECENT_RUNS]
+
+    return JsonResponse({
+        "success": True,
+        "total": runs.count(),
+        "by_status": by_status,
+        "recent": list(recent),
+    })
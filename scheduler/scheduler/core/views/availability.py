@@ -22,7 +22,7 @@ from ..models import (
     UserRolePreference,
     FixedObstruction,
 )
-from .utils import DAY_MAP, minutes_to_string, time_to_minutes
+from .utils import DAY_MAP, minutes_to_string
 
 
 @login_required
@@ -122,8 +122,8 @@ def get_worker_availability(request, team_id, worker_id):
     availability_list = [
         {
             "day": r.day.lower(),
-            "start_min": time_to_minutes(r.start_time),
-            "end_min": time_to_minutes(r.end_time),
+            "start_min": r.start_min,
+            "end_min": r.end_min,
             "building": r.building,
             "eventName": r.eventName,
             "label": f"{r.start_time.strftime('%H:%M')} - {r.end_time.strftime('%H:%M')}",
@@ -135,8 +135,8 @@ def get_worker_availability(request, team_id, worker_id):
     preferred_list = [
         {
             "day": p.day.lower(),
-            "start_min": time_to_minutes(p.start_time),
-            "end_min": time_to_minutes(p.end_time),
+            "start_min": p.start_min,
+            "end_min": p.end_min,
             "label": f"{p.start_time.strftime('%H:%M')} - {p.end_time.strftime('%H:%M')}",
         }
         for p in preferred
@@ -162,8 +162,8 @@ def get_worker_availability(request, team_id, worker_id):
                 {
                     "name": o.name,
                     "section": o.section,
-                    "start_min": time_to_minutes(o.start_time),
-                    "end_min": time_to_minutes(o.end_time),
+                    "start_min": o.start_min,
+                    "end_min": o.end_min,
                     "days": [d.day for d in o.days.all()],
                 }
                 for o in pRole.role.fixedobstruction_set.all()
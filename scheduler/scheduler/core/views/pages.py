@@ -25,7 +25,6 @@ from ..models import (
     UserRolePreference,
     Shift,
 )
-from .utils import time_to_minutes
 
 
 @login_required
@@ -209,8 +208,8 @@ def scheduler_view(request, team_id):
                 "availabilityData": [
                     {
                         "day": a.day,
-                        "start_min": time_to_minutes(a.start_time),
-                        "end_min": time_to_minutes(a.end_time),
+                        "start_min": a.start_min,
+                        "end_min": a.end_min,
                         "eventName": getattr(a, "eventName", ""),
                         "building": getattr(a, "building", ""),
                     }
@@ -219,8 +218,8 @@ def scheduler_view(request, team_id):
                 "preferredData": [
                     {
                         "day": p.day,
-                        "start_min": time_to_minutes(p.start_time),
-                        "end_min": time_to_minutes(p.end_time),
+                        "start_min": p.start_min,
+                        "end_min": p.end_min,
                     }
                     for p in w.preferred
                 ],
@@ -239,8 +238,8 @@ def scheduler_view(request, team_id):
                     {
                         "id": s.id,
                         "day": s.day,
-                        "start_min": time_to_minutes(s.start_time),
-                        "end_min": time_to_minutes(s.end_time),
+                        "start_min": s.start_min,
+                        "end_min": s.end_min,
                         "role_id": s.role_id,
                         "role_name": s.role.name if s.role else None,
                         "room_id": str(s.room_id) if s.room_id else None,
@@ -279,8 +278,8 @@ def scheduler_view(request, team_id):
                 "role_id": o.role_id,
                 "section": o.section,
                 "location": o.location,
-                "start_min": time_to_minutes(o.start_time),
-                "end_min": time_to_minutes(o.end_time),
+                "start_min": o.start_min,
+                "end_min": o.end_min,
                 "days": [d.day for d in o.days.all()],
             }
             for o in obstructions
@@ -296,6 +295,10 @@ def scheduler_view(request, team_id):
             "weeklyQuota": t.weekly_quota,
             "dailyMax": t.daily_max,
             "maxConcurrent": t.max_concurrent,
+            "numWorkers": t.num_workers,
+            "randomSeed": t.random_seed,
+            "maxDeterministicTime": t.max_deterministic_time,
+            "logSearchProgress": t.log_search_progress,
         }
         for t in templates
     }
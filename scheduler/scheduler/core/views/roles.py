@@ -18,7 +18,6 @@ from ..models import (
     Team,
     TeamRoleAssignment,
 )
-from .utils import time_to_minutes
 
 
 @login_required
@@ -111,8 +110,8 @@ def filter_view(request, team_id, role_id):
             "availability": [
                 {
                     "day": r.day.lower(),
-                    "start_min": time_to_minutes(r.start_time),
-                    "end_min": time_to_minutes(r.end_time),
+                    "start_min": r.start_min,
+                    "end_min": r.end_min,
                     "label": f"{r.start_time.strftime('%H:%M')} - {r.end_time.strftime('%H:%M')}",
                 }
                 for r in user.team_avail
@@ -13,7 +13,7 @@ from django.views.decorators.http import require_http_methods
 from django.db import transaction
 
 from ..models import Room, RoomAvailability, Team
-from .utils import DAY_MAP, minutes_to_string, time_to_minutes
+from .utils import DAY_INDEX, DAY_MAP, minutes_to_string
 
 
 @login_required
@@ -137,7 +137,7 @@ def get_room_availability(request, team_id):
 
     slots = RoomAvailability.objects.filter(room__team=team)
     if day:
-        slots = slots.filter(day=day)
+        slots = slots.filter(day_idx=DAY_INDEX.get(day))
 
     availability = {}
     for slot in slots:
@@ -145,8 +145,8 @@ def get_room_availability(request, team_id):
         if room_id not in availability:
             availability[room_id] = []
         availability[room_id].append({
-            "start_min": time_to_minutes(slot.start_time),
-            "end_min": time_to_minutes(slot.end_time),
+            "start_min": slot.start_min,
+            "end_min": slot.end_min,
         })
 
     return JsonResponse({"availability": availability})
\ No newline at end of file
@@ -6,8 +6,11 @@ set active, get room bookings, and export to Excel.
 
 import json
 import io
+import uuid
 
 from datetime import time
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponseForbidden, JsonResponse, HttpResponse
 from django.contrib.auth.decorators import login_required
@@ -17,8 +20,9 @@ from django.views.decorators.csrf import csrf_exempt
 
 import pandas as pd
 
+from ..conflicts import Booking, over_capacity, double_bookings
 from ..models import Room, Role, Schedule, Shift, Team, RoomAvailability
-from .utils import time_to_minutes, minutes_to_time
+from .utils import DAY_INDEX, time_to_minutes, minutes_to_time
 
 
 @login_required
@@ -27,7 +31,7 @@ def get_schedules(request, team_id):
     Get all saved schedules for a team.
     '''
     team = get_object_or_404(Team, id=team_id)
-    schedules = Schedule.objects.filter(team=team).values("id", "name", "is_active")
+    schedules = Schedule.objects.filter(team=team).values("id", "name", "is_active", "version")
     return JsonResponse({"schedules": list(schedules)})
 
 
@@ -54,89 +58,403 @@ def create_schedule(request, team_id):
     )
 
 
+def _booking(shift, index=None):
+    '''
+    A Shift as a conflicts.Booking; `index` is its position in the batch
+    being saved, None for a shift already on the schedule. Works from the
+    times, since the minute columns of an unsaved or moved shift are stale.
+    '''
+    return Booking(
+        shift.day,
+        time_to_minutes(shift.start_time),
+        time_to_minutes(shift.end_time),
+        str(shift.room_id) if shift.room_id else None,
+        shift.user_id,
+        index,
+    )
+
+
+def _existing_bookings(schedule, exclude_ids=()):
+    '''
+    Bookings for every shift on the schedule except `exclude_ids`, in one query.
+    '''
+    return [
+        Booking(day, start_min, end_min, str(room_id) if room_id else None, user_id, None)
+        for room_id, user_id, day, start_min, end_min in Shift.objects.filter(
+            schedule=schedule
+        ).exclude(id__in=exclude_ids).values_list("room_id", "user_id", "day", "start_min", "end_min")
+    ]
+
+
+def _find_conflicts(existing, shifts):
+    '''
+    Room-capacity and double-booking messages for `shifts` (unsaved or
+    changed Shift objects, with room and user loaded) against `existing`
+    bookings and each other.
+    '''
+    batch = [_booking(shift, index) for index, shift in enumerate(shifts)]
+    capacities = {str(shift.room.id): shift.room.capacity for shift in shifts if shift.room}
+    full    = over_capacity(existing, batch, capacities)
+    clashes = double_bookings(existing, batch)
+
+    conflicts = []
+    for index, shift in enumerate(shifts):
+        if index in full:
+            room = shift.room
+            conflicts.append({
+                "type": "room_capacity",
+                "message": f"{room.name} is at full capacity ({room.capacity}) on {shift.day} from {shift.start_time} to {shift.end_time}",
+            })
+
+        if index in clashes:
+            other = clashes[index]
+            user  = shift.user
+            conflicts.append({
+                "type": "worker",
+                "message": f"{user.get_full_name() or user.username} is already scheduled on {shift.day} from {minutes_to_time(other.start)} to {minutes_to_time(other.end)}",
+            })
+    return conflicts
+
+
+def _bump_version(schedule):
+    '''
+    Record a change to the schedule's shifts; returns the new version.
+
+    Called first in a transaction, the UPDATE also serialises writers: it
+    locks the schedule row on PostgreSQL and takes SQLite's write lock, so
+    the conflict check that follows sees every committed shift.
+    '''
+    Schedule.objects.filter(id=schedule.id).update(version=F("version") + 1)
+    return Schedule.objects.values_list("version", flat=True).get(id=schedule.id)
+
+
+def _double_booked(conflicts):
+    '''
+    409 response refusing a save that would double-book a worker, or None.
+    Room capacity conflicts alone are only reported.
+    '''
+    if not any(c["type"] == "worker" for c in conflicts):
+        return None
+    return JsonResponse(
+        {"error": "A worker would be double-booked", "conflicts": conflicts}, status=409
+    )
+
+
+def _defer_overlap_check():
+    '''
+    On PostgreSQL, put off the core_shift_no_user_overlap constraint (see
+    migration 0012) until _check_overlaps() for the rest of the transaction,
+    so a save can rewrite several of a worker's shifts, e.g. swap two, with
+    only the end result checked.
+    '''
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS core_shift_no_user_overlap DEFERRED")
+
+
+def _check_overlaps():
+    '''
+    Run the deferred overlap check on everything written so far; returns a
+    409 response if a worker is double-booked (a writer that went around
+    the schedule lock), else None.
+    '''
+    if connection.vendor != "postgresql":
+        return None
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS core_shift_no_user_overlap IMMEDIATE")
+    except IntegrityError as e:
+        if "core_shift_no_user_overlap" not in str(e):
+            raise
+        return JsonResponse({"error": "A worker would be double-booked", "conflicts": []}, status=409)
+    return None
+
+
+def _claim_version(schedule, base_version):
+    '''
+    Compare-and-swap the schedule's version from base_version to the next;
+    returns a 409 response with the current version if the schedule has
+    changed since, else None. Called first in a transaction, the UPDATE
+    also locks the schedule, as in _bump_version().
+    '''
+    if Schedule.objects.filter(id=schedule.id, version=base_version).update(
+        version=F("version") + 1
+    ):
+        return None
+    schedule.refresh_from_db(fields=["version"])
+    return JsonResponse(
+        {"error": "Schedule has changed, reload it", "version": schedule.version},
+        status=409,
+    )
+
+
+def _as_int(value, name):
+    '''
+    `value` as an int. This and the _parse helpers below raise ValueError
+    with a message for the client, which the views return as a 400 before
+    touching the database.
+    '''
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+
+
+def _as_list(data, key):
+    value = data.get(key, [])
+    if not isinstance(value, list):
+        raise ValueError(f"{key} must be a list")
+    return value
+
+
+def _parse_placement(entry):
+    '''
+    The day, times and room of a shift entry, checked and normalised.
+    '''
+    if not isinstance(entry, dict):
+        raise ValueError("Each shift must be an object")
+    day = entry.get("day")
+    if day not in DAY_INDEX:
+        raise ValueError(f"Unknown day: {day!r}")
+    start_min = _as_int(entry.get("start_min"), "start_min")
+    end_min   = _as_int(entry.get("end_min"), "end_min")
+    if not 0 <= start_min < end_min < 24 * 60:
+        raise ValueError(f"Bad shift times: {start_min}-{end_min}")
+
+    room_id = entry.get("room_id") or None
+    if room_id is not None:
+        try:
+            room_id = str(uuid.UUID(str(room_id)))
+        except ValueError:
+            raise ValueError(f"Bad room_id: {room_id!r}")
+    return {"day": day, "start_min": start_min, "end_min": end_min, "room_id": room_id}
+
+
+def _parse_new_shift(entry):
+    '''
+    A shift to create: its placement plus user_id and optional role_id.
+    '''
+    shift = _parse_placement(entry)
+    shift["user_id"] = _as_int(entry.get("user_id"), "user_id")
+    role_id = entry.get("role_id")
+    shift["role_id"] = _as_int(role_id, "role_id") if role_id else None
+    return shift
+
+
+def _parse_patch(data):
+    '''
+    (base_version, added, removed, moved) from a patch body, with moved
+    keyed by shift id. A shift may only be removed or moved once.
+    '''
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    base_version = _as_int(data.get("base_version"), "base_version")
+    added        = [_parse_new_shift(entry) for entry in _as_list(data, "added")]
+    removed      = [_as_int(shift_id, "removed id") for shift_id in _as_list(data, "removed")]
+
+    moved = {}
+    for entry in _as_list(data, "moved"):
+        shift_id = _as_int(entry.get("id") if isinstance(entry, dict) else None, "moved id")
+        if shift_id in moved:
+            raise ValueError(f"Shift {shift_id} is moved twice")
+        moved[shift_id] = _parse_placement(entry)
+
+    if len(set(removed)) != len(removed):
+        raise ValueError("A shift is removed twice")
+    both = set(removed) & set(moved)
+    if both:
+        raise ValueError(f"Shift {min(both)} is both removed and moved")
+    return base_version, added, removed, moved
+
+
+def _rooms_for(team, entries):
+    '''
+    {room id: Room} for the rooms `entries` use; ValueError if one isn't the team's.
+    '''
+    room_ids = {s["room_id"] for s in entries if s["room_id"]}
+    rooms    = {str(r.id): r for r in Room.objects.filter(id__in=room_ids, team=team)}
+    if len(rooms) != len(room_ids):
+        raise ValueError("Unknown room")
+    return rooms
+
+
 @login_required
 @csrf_exempt
 @require_http_methods(["POST"])
 def save_role_shifts(request, team_id):
     '''
-    Replace all shifts for a given role within a schedule, checking for conflicts first.
+    Replace all shifts for a given role within a schedule, reporting conflicts.
+
+    The body carries the schedule version the client loaded (base_version);
+    if the schedule has changed since, the save is rejected with 409 and
+    the current version, as in patch_schedule_shifts(), rather than
+    overwriting the newer changes.
+
+    The schedule's other shifts are loaded once and the whole batch is
+    checked against them (and itself) in memory, see conflicts.py; the
+    replacement is then written with a single bulk_create in a transaction.
+    Room capacity conflicts are reported but don't stop the save; a worker
+    double-booking rejects it with 409 (enforced by an exclusion constraint
+    on PostgreSQL, see migration 0012).
     '''
     team = get_object_or_404(Team, id=team_id)
-    data = json.loads(request.body)
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        base_version = _as_int(data.get("base_version"), "base_version")
+        shifts       = [_parse_new_shift(entry) for entry in _as_list(data, "shifts")]
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
     schedule_id = data.get("schedule_id")
     role_id     = data.get("role_id")
-    shifts      = data.get("shifts", [])
 
     schedule = get_object_or_404(Schedule, id=schedule_id, team=team)
     role     = get_object_or_404(Role, id=role_id, team=team) if role_id else None
 
-    Shift.objects.filter(schedule=schedule, role=role).delete()
+    users = {u.id: u for u in User.objects.filter(id__in=[s["user_id"] for s in shifts])}
+    try:
+        rooms = _rooms_for(team, shifts)
+        if any(s["user_id"] not in users for s in shifts):
+            raise ValueError("Unknown user")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
 
-    user_ids = [s["user_id"] for s in shifts]
-    room_ids = [s["room_id"] for s in shifts if s.get("room_id")]
-    users    = {u.id: u for u in User.objects.filter(id__in=user_ids)}
-    rooms    = {str(r.id): r for r in Room.objects.filter(id__in=room_ids)}
+    new_shifts = [
+        Shift(
+            schedule=schedule,
+            user=users[s["user_id"]],
+            role=role,
+            room=rooms[s["room_id"]] if s["room_id"] else None,
+            day=s["day"],
+            start_time=minutes_to_time(s["start_min"]),
+            end_time=minutes_to_time(s["end_min"]),
+        )
+        for s in shifts
+    ]
 
-    conflicts = []
-    created_shifts = []
+    with transaction.atomic():
+        stale = _claim_version(schedule, base_version)
+        if stale:
+            return stale
+        _defer_overlap_check()
+        Shift.objects.filter(schedule=schedule, role=role).delete()
+        conflicts = _find_conflicts(_existing_bookings(schedule), new_shifts)
+        rejected  = _double_booked(conflicts)
+        if not rejected:
+            Shift.objects.bulk_create(new_shifts)
+            rejected = _check_overlaps()
+        if rejected:
+            transaction.set_rollback(True)
+            return rejected
 
-    for s in shifts:
-        start_time = minutes_to_time(s["start_min"])
-        end_time   = minutes_to_time(s["end_min"])
-        day        = s["day"]
-        user       = users[int(s["user_id"])]
-        room       = rooms.get(str(s["room_id"])) if s.get("room_id") else None
-
-        # Check room capacity
-        if room:
-            overlapping_count = Shift.objects.filter(
-                schedule=schedule,
-                room=room,
-                day=day,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
-            ).count()
-
-            if overlapping_count >= room.capacity:
-                conflicts.append({
-                    "type": "room_capacity",
-                    "message": f"{room.name} is at full capacity ({room.capacity}) on {day} from {start_time} to {end_time}",
-                })
-
-        # Check worker double-booking
-        worker_conflict = (
-            Shift.objects.filter(
-                schedule=schedule,
-                user=user,
-                day=day,
-                start_time__lt=end_time,
-                end_time__gt=start_time,
-            )
-            .exclude(role=role)
-            .first()
-        )
+    return JsonResponse({
+        "status": "ok",
+        "saved": len(new_shifts),
+        "version": base_version + 1,
+        "conflicts": conflicts,
+    })
 
-        if worker_conflict:
-            conflicts.append({
-                "type": "worker",
-                "message": f"{user.get_full_name() or user.username} is already scheduled on {day} from {worker_conflict.start_time} to {worker_conflict.end_time}",
-            })
 
-        shift = Shift.objects.create(
-            schedule=schedule,
-            user=user,
-            role=role,
-            room=room,
-            day=day,
-            start_time=start_time,
-            end_time=end_time,
-        )
-        created_shifts.append(shift.id)
+@login_required
+@csrf_exempt
+@require_http_methods(["POST"])
+def patch_schedule_shifts(request, team_id, schedule_id):
+    '''
+    Apply a set of shift changes made against a known schedule version:
+
+        {"base_version": 3,
+         "added":   [{"user_id", "role_id", "room_id", "day", "start_min", "end_min"}],
+         "removed": [shift_id, ...],
+         "moved":   [{"id", "day", "start_min", "end_min", "room_id"}]}
+
+    All changes are applied in one transaction, or none are. A malformed
+    patch (see _parse_patch()) or one naming an unknown user, role, room
+    or shift is rejected with 400. If the schedule has changed since
+    base_version the patch is rejected with 409 and the current version,
+    so the client can reload and retry; so is a patch that would
+    double-book a worker, with its conflicts. Responds with the new
+    version, the ids of the added shifts (in order) and any room capacity
+    conflicts, which are reported but don't stop the save.
+    '''
+    team     = get_object_or_404(Team, id=team_id)
+    schedule = get_object_or_404(Schedule, id=schedule_id, team=team)
+    try:
+        base_version, added, removed, moved = _parse_patch(json.loads(request.body))
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    role_ids = {s["role_id"] for s in added if s["role_id"]}
+    users    = {u.id: u for u in User.objects.filter(id__in=[s["user_id"] for s in added])}
+    roles    = {r.id: r for r in Role.objects.filter(id__in=role_ids, team=team)}
+    try:
+        rooms = _rooms_for(team, [*added, *moved.values()])
+        if any(s["user_id"] not in users for s in added) or len(roles) != len(role_ids):
+            raise ValueError("Unknown user or role")
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    with transaction.atomic():
+        stale = _claim_version(schedule, base_version)
+        if stale:
+            return stale
+
+        touched = Shift.objects.filter(
+            schedule=schedule, id__in=[*removed, *moved]
+        ).select_related("user", "room")
+        moved_shifts = [shift for shift in touched if shift.id in moved]
+        if len(touched) != len(removed) + len(moved):
+            transaction.set_rollback(True)
+            return JsonResponse({"error": "Unknown shift id"}, status=400)
+
+        for shift in moved_shifts:
+            change = moved[shift.id]
+            shift.day        = change["day"]
+            shift.start_time = minutes_to_time(change["start_min"])
+            shift.end_time   = minutes_to_time(change["end_min"])
+            shift.room       = rooms[change["room_id"]] if change["room_id"] else None
+
+        new_shifts = [
+            Shift(
+                schedule=schedule,
+                user=users[s["user_id"]],
+                role=roles[s["role_id"]] if s["role_id"] else None,
+                room=rooms[s["room_id"]] if s["room_id"] else None,
+                day=s["day"],
+                start_time=minutes_to_time(s["start_min"]),
+                end_time=minutes_to_time(s["end_min"]),
+            )
+            for s in added
+        ]
+
+        existing  = _existing_bookings(schedule, exclude_ids=[*removed, *moved])
+        conflicts = _find_conflicts(existing, [*moved_shifts, *new_shifts])
+        rejected  = _double_booked(conflicts)
+        if rejected:
+            transaction.set_rollback(True)
+            return rejected
+
+        _defer_overlap_check()
+        Shift.objects.filter(schedule=schedule, id__in=removed).delete()
+        Shift.objects.bulk_update(moved_shifts, ["day", "start_time", "end_time", "room"])
+        Shift.objects.bulk_create(new_shifts)
+        rejected = _check_overlaps()
+        if rejected:
+            transaction.set_rollback(True)
+            return rejected
 
     return JsonResponse({
         "status": "ok",
-        "saved": len(created_shifts),
+        "version": base_version + 1,
+        "added": [shift.id for shift in new_shifts],
         "conflicts": conflicts,
     })
 
@@ -162,7 +480,8 @@ def set_active_schedule(request, team_id):
 
 def get_schedule_shifts(request, team_id, schedule_id):
     '''
-    Return all shifts for a schedule, optionally filtered by role.
+    Return all shifts for a schedule, optionally filtered by role, with the
+    schedule's version (the base for patch_schedule_shifts).
     '''
     team = get_object_or_404(Team, id=team_id)
     schedule = get_object_or_404(Schedule, id=schedule_id, team=team)
@@ -182,13 +501,13 @@ def get_schedule_shifts(request, team_id, schedule_id):
             "room_id": str(s.room.id) if s.room else None,
             "room_name": s.room.name if s.room else None,
             "day": s.day,
-            "start_min": s.start_time.hour * 60 + s.start_time.minute,
-            "end_min": s.end_time.hour * 60 + s.end_time.minute,
+            "start_min": s.start_min,
+            "end_min": s.end_min,
         }
         for s in shifts
     ]
 
-    return JsonResponse({"shifts": data})
+    return JsonResponse({"shifts": data, "version": schedule.version})
 
 
 @login_required
@@ -205,7 +524,7 @@ def get_room_bookings(request, team_id, schedule_id):
     ).select_related("room", "user")
 
     if day:
-        shifts = shifts.filter(day=day)
+        shifts = shifts.filter(day_idx=DAY_INDEX.get(day))
 
     bookings = {}
     for s in shifts:
@@ -214,8 +533,8 @@ def get_room_bookings(request, team_id, schedule_id):
             bookings[room_id] = {"capacity": s.room.capacity, "shifts": []}
         bookings[room_id]["shifts"].append({
             "user_name": s.user.get_full_name() or s.user.username,
-            "start_min": time_to_minutes(s.start_time),
-            "end_min": time_to_minutes(s.end_time),
+            "start_min": s.start_min,
+            "end_min": s.end_min,
             "day": s.day,
         })
 
@@ -262,12 +581,16 @@ def export_schedule(request, team_id, schedule_id):
 @require_http_methods(["POST"])
 def delete_shifts(request, team_id, schedule_id):
     schedule = get_object_or_404(Schedule, id=schedule_id, team_id=team_id)
-    schedule.shifts.all().delete()
-    return JsonResponse({"status": "ok"})
+    with transaction.atomic():
+        schedule.shifts.all().delete()
+        version = _bump_version(schedule)
+    return JsonResponse({"status": "ok", "version": version})
 
 @login_required
 @require_http_methods(["POST"])
 def delete_shift(request, schedule_id, shift_id):
     shift = get_object_or_404(Shift, id=shift_id, schedule_id=schedule_id)
-    shift.delete()
-    return JsonResponse({"status": "ok"})
\ No newline at end of file
+    with transaction.atomic():
+        shift.delete()
+        version = _bump_version(shift.schedule)
+    return JsonResponse({"status": "ok", "version": version})
\ No newline at end of file
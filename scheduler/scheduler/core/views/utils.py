@@ -7,6 +7,9 @@ from datetime import time
 
 DAY_MAP = {0: "sun", 1: "mon", 2: "tue", 3: "wed", 4: "thu", 5: "fri", 6: "sat"}
 
+# day name -> the models' day_idx
+DAY_INDEX = {name: index for index, name in DAY_MAP.items()}
+
 
 def time_to_minutes(t):
     if t is None:
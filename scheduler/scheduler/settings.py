@@ -134,6 +134,32 @@ EMAIL_HOST_USER = 'your-email@gmail.com'
 EMAIL_HOST_PASSWORD = 'your-16-character-app-password' 
 DEFAULT_FROM_EMAIL = 'Scheduler Team <your-email@gmail.com>'
 
+# Auto-scheduler resource caps. Per-run "numWorkers" / "maxDeterministicTime"
+# requests are clamped to these; by default a run may use half the cores,
+# leaving the rest for gunicorn and other runs.
+AUTO_SCHEDULER_MAX_WORKERS = int(
+    os.environ.get('AUTO_SCHEDULER_MAX_WORKERS', max(1, (os.cpu_count() or 1) // 2))
+)
+AUTO_SCHEDULER_MAX_DETERMINISTIC_TIME = float(
+    os.environ.get('AUTO_SCHEDULER_MAX_DETERMINISTIC_TIME', 600)
+)
+
+# Auto-scheduler diagnostics (one INFO line per run) go to the console,
+# i.e. the gunicorn / worker journal in production.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'scheduler.core.auto_scheduler': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = "/dashboard2/"
 LOGOUT_REDIRECT_URL = "/login/"
\ No newline at end of file